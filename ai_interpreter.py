@@ -1,36 +1,51 @@
 import json
-from openai import OpenAI
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from config_loader import cfg
 from logger import log
+from metrics import Counter, Histogram
+from signals import Signal
 
 # --- 使用新的配置 ---
 GEMINI_API_KEY = cfg['gemini']['api_key']
 GEMINI_MODEL_NAME = cfg['gemini']['model_name']
 GEMINI_API_BASE_URL = cfg['gemini'].get('base_url') # Use .get() for optional keys
+GEMINI_TIMEOUT_SECONDS = cfg['gemini'].get('timeout_seconds', 30)
+GEMINI_DEADLINE_SECONDS = cfg['gemini'].get('deadline_seconds', 45)
+GEMINI_MAX_CONCURRENCY = cfg['gemini'].get('max_concurrency', 4)
+GEMINI_CACHE_TTL_SECONDS = cfg['gemini'].get('cache_ttl_seconds', 1800)
+GEMINI_CACHE_SIZE = cfg['gemini'].get('cache_size', 256)
+
+# 只有在提供了API密钥时才启用 AI 解读
+CLIENT_CONFIGURED = bool(GEMINI_API_KEY and GEMINI_API_KEY != "YOUR_GEMINI_API_KEY")
 
-# 只有在提供了API密钥和基础URL时才初始化客户端
 client = None
-if GEMINI_API_KEY and GEMINI_API_KEY != "YOUR_GEMINI_API_KEY" and GEMINI_API_BASE_URL:
-    client = OpenAI(
-        api_key=GEMINI_API_KEY,
-        base_url=GEMINI_API_BASE_URL,
-    )
-elif GEMINI_API_KEY and GEMINI_API_KEY != "YOUR_GEMINI_API_KEY":
-    client = OpenAI(api_key=GEMINI_API_KEY)
+_client_lock = threading.Lock()
 
-def get_gemini_interpretation(symbol: str, timeframe: str, signal_data: dict, previous_signal: dict = None):
+def get_client():
     """
-    使用自定义的 OpenAI 兼容 API 解读指标异动信号及其市场背景
+    首次使用时才导入 openai 并创建客户端 (导入 openai 需要数百毫秒，不应拖慢启动)。
+    未配置 API 密钥时返回 None。
     """
-    if not client:
-        log.warning("Gemini client not initialized. Check API key. Returning default message.")
-        return "AI interpretation is disabled because the Gemini API key is not configured."
+    global client
+    if client is None and CLIENT_CONFIGURED:
+        with _client_lock:
+            if client is None:
+                from openai import OpenAI
+                if GEMINI_API_BASE_URL:
+                    client = OpenAI(api_key=GEMINI_API_KEY, base_url=GEMINI_API_BASE_URL, timeout=GEMINI_TIMEOUT_SECONDS)
+                else:
+                    client = OpenAI(api_key=GEMINI_API_KEY, timeout=GEMINI_TIMEOUT_SECONDS)
+    return client
 
-    # 为了可读性，将数据包拆分
-    primary_signal = signal_data.get('primary_signal', {})
-    market_context = signal_data.get('market_context', {})
+def preload_client():
+    """在后台线程中提前导入 openai，避免第一条告警等待导入"""
+    if CLIENT_CONFIGURED and client is None:
+        threading.Thread(target=get_client, name="llm-preload", daemon=True).start()
 
-    system_prompt = """You are a world-class crypto market analyst. Your analysis is concise, data-driven, and directly actionable for experienced traders. You avoid generic advice and focus on interpreting the provided data to form a coherent market thesis. Do not use emojis. Never give financial advice.
+SYSTEM_PROMPT = """You are a world-class crypto market analyst. Your analysis is concise, data-driven, and directly actionable for experienced traders. You avoid generic advice and focus on interpreting the provided data to form a coherent market thesis. Do not use emojis. Never give financial advice.
 
 Your Task is to analyze the primary signal in conjunction with the broader market context provided. Structure your interpretation in the following format, and your entire analysis must be in Chinese:
 
@@ -39,8 +54,42 @@ Your Task is to analyze the primary signal in conjunction with the broader marke
 【潜在影响与后续关注】What is the most likely short-term impact, and what specific price levels or indicator behaviors should be monitored for confirmation or invalidation? (e.g., \"Potential for a short-term reversal. Watch for a price rejection at the $68,200 level. Confirmation would be a bearish divergence on the RSI on the next price swing.\")
 """
 
+FAILED_MESSAGE = "AI interpretation failed due to an API error."
+TIMEOUT_MESSAGE = "AI interpretation timed out; showing the raw alert only."
+
+def _format_optional(value, fmt: str):
+    return "N/A" if value is None else fmt.format(value)
+
+def _format_key_indicators(values: dict):
+    return {
+        "oi": _format_optional(values.get('oi'), "${:,.0f}"),
+        "price": _format_optional(values.get('price'), "{:.2f}"),
+        "volume": _format_optional(values.get('volume'), "{:,.0f}"),
+        "cvd": _format_optional(values.get('cvd'), "{:,.0f}"),
+        "long_short_ratio": _format_optional(values.get('long_short_ratio'), "{:.3f}"),
+    }
+
+def _build_user_prompt(symbol: str, timeframe: str, signals, previous_signal: Signal = None):
+    # 第一个为主信号，市场背景来自主信号的快照
+    primary_signal = signals[0]
+    market_context = primary_signal.context
+    key_indicators = _format_key_indicators(market_context.key_indicators)
+    technical_indicators = {name: f"{value:.2f}" for name, value in market_context.technical_indicators.items()}
+
     # 将K线数据格式化为更易读的字符串
-    klines_str = "\n".join([f"  - O:{k['open']:.2f} H:{k['high']:.2f} L:{k['low']:.2f} C:{k['close']:.2f} V:{k['volume']:,.0f}" for k in market_context.get('recent_klines', [])])
+    klines_str = "\n".join([f"  - O:{k['open']:.2f} H:{k['high']:.2f} L:{k['low']:.2f} C:{k['close']:.2f} V:{k['volume']:,.0f}" for k in market_context.recent_klines])
+
+    # 同一轮检查中同时触发的其他信号
+    related_signals = signals[1:]
+    if related_signals:
+        related_context = f"""
+**1b. Other Signals Triggered For This Asset In The Same Check:**
+```json
+{json.dumps([signal.to_display() for signal in related_signals], indent=2, ensure_ascii=False)}
+```
+"""
+    else:
+        related_context = ""
 
     # 构建历史信号部分
     if previous_signal:
@@ -48,7 +97,7 @@ Your Task is to analyze the primary signal in conjunction with the broader marke
 This is an update to a previously triggered signal. Your task is to analyze if the new signal represents a continuation, acceleration, or potential reversal of the situation.
 Previous Signal:
 ```json
-{json.dumps(previous_signal, indent=2)}
+{json.dumps(previous_signal.to_display(), indent=2, ensure_ascii=False)}
 ```
 """
     else:
@@ -62,35 +111,178 @@ This is a new signal alert.
 
 **1. Primary Signal Detected:**
 ```json
-{json.dumps(primary_signal, indent=2)}
+{json.dumps(primary_signal.to_display(), indent=2, ensure_ascii=False)}
 ```
-
+{related_context}
 **2. Market Context Snapshot:**
 *   **Key On-Chain & Market Indicators:**
     ```json
-    {json.dumps(market_context.get('key_indicators', {}), indent=2)}
+    {json.dumps(key_indicators, indent=2)}
     ```
 *   **Key Technical Indicators:**
     ```json
-    {json.dumps(market_context.get('technical_indicators', {}), indent=2)}
+    {json.dumps(technical_indicators, indent=2)}
     ```
 *   **Recent Price Action (Last 16 periods, newest first):**
 {klines_str}
 """
 
+    return user_prompt
+
+def _build_cluster_prompt(timeframe: str, cluster):
+    """
+    市场整体异动的提示词: 代表币种 (cluster.leader) 的完整市场背景，
+    加上同组所有币种触发的信号，只请求一次解读。
+    """
+    leader = cluster.leader
+    leader_signals = [signal for signal, _ in cluster.alerts[leader]]
+    leader_previous = cluster.alerts[leader][0][1]
+    leader_prompt = _build_user_prompt(leader, timeframe, leader_signals, leader_previous)
+
+    others = {symbol: [signal.to_display() for signal, _ in items]
+              for symbol, items in cluster.alerts.items() if symbol != leader}
+    return f"""**Market-Wide Event:**
+{len(cluster)} correlated assets triggered signals in the same check as part of one market-wide move. Treat them together: interpret the move as a whole, using {leader} (the strongest signal) as the reference asset, and point out any asset in the list that diverges from the group.
+
+**Signals On The Other Assets:**
+```json
+{json.dumps(others, indent=2, ensure_ascii=False)}
+```
+
+**Reference Asset Detail:**
+{leader_prompt}"""
+
+def _request_interpretation(symbol: str, user_prompt: str):
+    log.debug(f"Calling Gemini API for {symbol}...")
+    response = get_client().chat.completions.create(
+        model=GEMINI_MODEL_NAME,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        temperature=0.6, # 稍微提高一点创造性以进行更好的分析
+    )
+    interpretation = response.choices[0].message.content
+    log.debug(f"Successfully received Gemini interpretation for {symbol}.")
+    return interpretation
+
+interpretation_outcomes = Counter("bot_interpretations_total", "AI interpretation calls by outcome (cached / ok / timeout / failed)", ["outcome"])
+interpretation_duration = Histogram("bot_interpretation_request_seconds", "Duration of AI interpretation API requests")
+
+def _timed_request(symbol: str, user_prompt: str):
+    start = time.perf_counter()
     try:
-        log.debug(f"Calling Gemini API for {symbol}...")
-        response = client.chat.completions.create(
-            model=GEMINI_MODEL_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.6, # 稍微提高一点创造性以进行更好的分析
-        )
-        interpretation = response.choices[0].message.content
-        log.debug(f"Successfully received Gemini interpretation for {symbol}.")
-        return interpretation
-    except Exception as e:
-        log.error(f"Error calling Gemini API for {symbol}: {e}", exc_info=True)
-        return "AI interpretation failed due to an API error."
+        return _request_interpretation(symbol, user_prompt)
+    finally:
+        interpretation_duration.observe(time.perf_counter() - start)
+
+def signal_fingerprint(symbol: str, timeframe: str, signals, previous_signal: Signal = None):
+    """根据币种、周期和信号数值 (两位有效数字) 生成指纹，用于复用近似信号的解读结果"""
+    return (symbol, timeframe, tuple(signal.fingerprint() for signal in signals), previous_signal is not None)
+
+def cluster_fingerprint(timeframe: str, cluster):
+    return ("cluster", timeframe, tuple(signal.fingerprint() for signal, _ in cluster.signals))
+
+class InterpretationService:
+    """
+    AI 解读服务：请求在有界线程池中并发执行，每次调用有总的截止时间，
+    超时后返回默认提示，请求完成后结果仍会进入缓存。
+    指纹相同的信号在 TTL 内共享同一次请求的结果 (包括仍在进行中的请求)。
+    """
+    def __init__(self, max_concurrency: int = GEMINI_MAX_CONCURRENCY, deadline_seconds: float = GEMINI_DEADLINE_SECONDS,
+                 cache_ttl_seconds: float = GEMINI_CACHE_TTL_SECONDS, cache_size: int = GEMINI_CACHE_SIZE):
+        self.deadline_seconds = deadline_seconds
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_size = cache_size
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="llm")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        """调用方需持有 self._lock"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, future = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return future
+
+    def _store(self, key, future):
+        """调用方需持有 self._lock"""
+        self._cache[key] = (time.monotonic() + self.cache_ttl_seconds, future)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _get_or_submit(self, label: str, key, build_prompt):
+        """
+        返回 (future, 是否复用)。查找和提交在同一个锁内完成，
+        同时到达的相同指纹只会发出一个请求。
+        """
+        with self._lock:
+            future = self._lookup(key)
+            if future is not None:
+                return future, True
+            future = self._executor.submit(_timed_request, label, build_prompt())
+            self._store(key, future)
+        future.add_done_callback(lambda f: self._evict_on_failure(key, f))
+        return future, False
+
+    def _evict_on_failure(self, key, future):
+        if future.exception() is not None:
+            with self._lock:
+                entry = self._cache.get(key)
+                if entry is not None and entry[1] is future:
+                    del self._cache[key]
+
+    def interpret(self, symbol: str, timeframe: str, signals, previous_signal: Signal = None):
+        key = signal_fingerprint(symbol, timeframe, signals, previous_signal)
+        return self._interpret(symbol, key, lambda: _build_user_prompt(symbol, timeframe, signals, previous_signal))
+
+    def interpret_cluster(self, timeframe: str, cluster):
+        """市场整体异动: 整组信号只请求一次解读"""
+        key = cluster_fingerprint(timeframe, cluster)
+        return self._interpret(cluster.label, key, lambda: _build_cluster_prompt(timeframe, cluster))
+
+    def _interpret(self, label: str, key, build_prompt):
+        future, cached = self._get_or_submit(label, key, build_prompt)
+        if cached:
+            log.info(f"复用 {label} 近似信号的 AI 解读结果。")
+
+        try:
+            result = future.result(timeout=self.deadline_seconds)
+            interpretation_outcomes.inc(outcome="cached" if cached else "ok")
+            return result
+        except FutureTimeoutError:
+            log.warning(f"Gemini interpretation for {label} exceeded {self.deadline_seconds}s deadline.")
+            interpretation_outcomes.inc(outcome="timeout")
+            return TIMEOUT_MESSAGE
+        except Exception as e:
+            # 异常信息中可能含有花括号 (例如 API 返回的 JSON)，不能作为格式化参数传给 loguru
+            log.opt(exception=e).error(f"Error calling Gemini API for {label}: {e}")
+            interpretation_outcomes.inc(outcome="failed")
+            return FAILED_MESSAGE
+
+interpretation_service = InterpretationService()
+
+def get_gemini_interpretation(symbol: str, timeframe: str, signals, previous_signal: Signal = None):
+    """
+    使用自定义的 OpenAI 兼容 API 解读指标异动信号及其市场背景。
+    signals 的第一个为主信号，其余为同一轮检查中同时触发的信号。
+    """
+    if not CLIENT_CONFIGURED:
+        log.warning("Gemini client not initialized. Check API key. Returning default message.")
+        return "AI interpretation is disabled because the Gemini API key is not configured."
+
+    return interpretation_service.interpret(symbol, timeframe, signals, previous_signal)
+
+def get_cluster_interpretation(timeframe: str, cluster):
+    """对一组同时触发的相关币种 (SignalCluster) 做一次整体解读"""
+    if not CLIENT_CONFIGURED:
+        log.warning("Gemini client not initialized. Check API key. Returning default message.")
+        return "AI interpretation is disabled because the Gemini API key is not configured."
+
+    return interpretation_service.interpret_cluster(timeframe, cluster)
@@ -0,0 +1,176 @@
+import time
+import queue
+import threading
+from config_loader import cfg
+from logger import log
+from ai_interpreter import get_gemini_interpretation, get_cluster_interpretation
+from alerter import send_lark_alert, send_lark_cluster_alert, LARK_WEBHOOK_URL
+from signals import SignalCluster
+from metrics import Counter, Gauge, Histogram, span
+
+# --- 使用新的配置 ---
+_alerts_cfg = cfg.get('alerts', {})
+ALERT_WORKERS = _alerts_cfg.get('workers', 2)
+ALERT_QUEUE_SIZE = _alerts_cfg.get('queue_size', 100)
+ALERT_ENQUEUE_TIMEOUT_SECONDS = _alerts_cfg.get('enqueue_timeout_seconds', 5)
+WEBHOOK_MIN_INTERVAL_SECONDS = _alerts_cfg.get('webhook_min_interval_seconds', 1)
+MERGE_SAME_SYMBOL = _alerts_cfg.get('merge_same_symbol', True)
+
+alert_outcomes = Counter("bot_alerts_total", "Alerts by outcome (delivered / failed / dropped)", ["outcome"])
+alert_latency = Histogram("bot_alert_latency_seconds", "Time from enqueue to delivery, including AI interpretation")
+alert_queue_depth = Gauge("bot_alert_queue_depth", "Alerts waiting in the dispatch queue")
+
+
+def merge_signals(signals):
+    """
+    将同一币种在同一轮检查中触发的多个信号合并为一条告警：
+    第一个信号作为主信号 (使用它的市场背景和上一次信号)，其余作为关联信号。
+    signals: [(signal, previous_signal), ...]，返回 ([signal, ...], previous_signal)
+    """
+    return [signal for signal, _ in signals], signals[0][1]
+
+
+class WebhookRateLimiter:
+    """保证发往同一个 webhook 的两条消息之间至少间隔 min_interval 秒"""
+
+    def __init__(self, min_interval: float = WEBHOOK_MIN_INTERVAL_SECONDS):
+        self.min_interval = min_interval
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+
+    def wait(self, webhook_url: str):
+        with self._lock:
+            now = time.monotonic()
+            send_at = max(now, self._next_allowed.get(webhook_url, now))
+            self._next_allowed[webhook_url] = send_at + self.min_interval
+        if send_at > now:
+            time.sleep(send_at - now)
+
+
+class AlertDispatcher:
+    """
+    告警分发队列。检查循环只负责把需要发送的信号放入有界队列，
+    AI 解读和 Lark 发送由后台工作线程完成，不再阻塞后续币种的检查。
+    """
+
+    def __init__(self, timeframe: str, workers: int = ALERT_WORKERS, queue_size: int = ALERT_QUEUE_SIZE,
+                 merge_same_symbol: bool = MERGE_SAME_SYMBOL, webhook_url: str = LARK_WEBHOOK_URL):
+        self.timeframe = timeframe
+        self.merge_same_symbol = merge_same_symbol
+        self.webhook_url = webhook_url
+        self.rate_limiter = WebhookRateLimiter()
+        self._queue = queue.Queue(maxsize=queue_size)
+        alert_queue_depth.function = self._queue.qsize
+        self._workers = [threading.Thread(target=self._run, name=f"alert-worker-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        self._stats_lock = threading.Lock()
+        self._delivered = 0
+        self._dropped = 0
+        self._failed = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, symbol: str, signals):
+        """
+        提交一个币种在本轮检查中允许发送的信号列表 [(signal, previous_signal), ...]。
+        开启合并时整个列表作为一条告警发送，否则每个信号单独发送。
+        """
+        if not signals:
+            return
+        batches = [signals] if self.merge_same_symbol else [[item] for item in signals]
+        for batch in batches:
+            self._enqueue(symbol, batch)
+
+    def submit_clusters(self, clusters):
+        """
+        提交一轮检查聚类后的告警 (SignalCluster 列表)：市场整体异动整组作为一条告警，
+        只做一次 AI 解读；单个币种的组与 submit 相同。
+        """
+        for cluster in clusters:
+            if cluster.market_wide:
+                self._enqueue(cluster.label, cluster)
+            else:
+                for symbol, signals in cluster.alerts.items():
+                    self.submit(symbol, signals)
+
+    def _enqueue(self, label: str, job):
+        try:
+            self._queue.put((label, job, time.monotonic()), timeout=ALERT_ENQUEUE_TIMEOUT_SECONDS)
+        except queue.Full:
+            with self._stats_lock:
+                self._dropped += 1
+            alert_outcomes.inc(outcome="dropped")
+            log.error(f"告警队列已满 ({self._queue.maxsize})，丢弃 {label} 的告警。")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            symbol, job, enqueued_at = item
+            try:
+                if isinstance(job, SignalCluster):
+                    self._deliver_cluster(job)
+                else:
+                    self._deliver(symbol, job)
+                latency = time.monotonic() - enqueued_at
+                with self._stats_lock:
+                    self._delivered += 1
+                    self._latency_total += latency
+                    self._latency_max = max(self._latency_max, latency)
+                alert_outcomes.inc(outcome="delivered")
+                alert_latency.observe(latency)
+                log.info(f"{symbol} 告警处理完成，排队+发送耗时 {latency:.2f}s，队列剩余 {self._queue.qsize()}")
+            except Exception as e:
+                with self._stats_lock:
+                    self._failed += 1
+                alert_outcomes.inc(outcome="failed")
+                # 异常信息中可能包含 webhook 返回的 JSON，不能作为格式化字符串交给 loguru
+                log.opt(exception=e).error(f"Error dispatching alert for {symbol}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, symbol: str, signals):
+        merged, previous_signal = merge_signals(signals)
+        # 获取 AI 解读
+        timeframe = merged[0].timeframe or self.timeframe
+        with span("interpretation"):
+            ai_insight = get_gemini_interpretation(symbol, timeframe, merged, previous_signal=previous_signal)
+        # 按 webhook 限速后发送通知
+        self.rate_limiter.wait(self.webhook_url)
+        with span("webhook"):
+            send_lark_alert(symbol, merged, ai_insight)
+
+    def _deliver_cluster(self, cluster: SignalCluster):
+        timeframe = cluster.signals[0][0].timeframe or self.timeframe
+        with span("interpretation"):
+            ai_insight = get_cluster_interpretation(timeframe, cluster)
+        self.rate_limiter.wait(self.webhook_url)
+        with span("webhook"):
+            send_lark_cluster_alert(cluster, ai_insight)
+
+    def stats(self):
+        """队列深度和发送延迟统计"""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "delivered": self._delivered,
+                "failed": self._failed,
+                "dropped": self._dropped,
+                "avg_latency_seconds": self._latency_total / self._delivered if self._delivered else 0.0,
+                "max_latency_seconds": self._latency_max,
+            }
+
+    def shutdown(self, timeout: float = 30):
+        """等待队列中的告警处理完毕后停止工作线程"""
+        for _ in self._workers:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0, deadline - time.monotonic()))
@@ -3,58 +3,84 @@ import json
 from datetime import datetime
 from config_loader import cfg
 from logger import log
+from http_client import http_client
 
 # --- 使用新的配置 ---
 LARK_WEBHOOK_URL = cfg['lark']['webhook_url']
 
-def send_lark_alert(symbol: str, signal_data: dict, ai_interpretation: str):
+color_map = {
+    "Volume": "orange",
+    "Open Interest": "blue",
+    "Long/Short Ratio": "red"
+}
+
+def send_lark_alert(symbol: str, signals, ai_interpretation: str):
     """
-    构建并发送一个精美的 Lark 卡片消息
+    构建并发送一个精美的 Lark 卡片消息。signals 的第一个为主信号，
+    其余是同一轮检查中合并进来的其他信号。
     """
-    webhook_url = LARK_WEBHOOK_URL
-    if not webhook_url or webhook_url == "YOUR_LARK_WEBHOOK_URL":
-        log.warning("Lark webhook URL not set or is a placeholder. Skipping alert.")
-        return
-
-    primary_signal = signal_data.get('primary_signal', {})
-    indicator_name = primary_signal.get('indicator', 'N/A')
-    
-    color_map = {
-        "Volume": "orange",
-        "Open Interest": "blue",
-        "Long/Short Ratio": "red"
-    }
-    
     details_list = []
-    for key, value in primary_signal.items():
-        if key not in ['indicator', 'signal_type']:
-            details_list.append(f"**{key.replace('_', ' ').title()}:** {value}")
+    for signal in signals:
+        if len(signals) > 1:
+            details_list.append(f"**【{signal.indicator} · {signal.signal_type}】**")
+        for key, value in signal.to_display().items():
+            if key not in ['indicator', 'signal_type']:
+                details_list.append(f"**{key.replace('_', ' ').title()}:** {value}")
     details_string = "\n".join(details_list)
 
+    card = _build_card(f"🚨 {symbol} 市场异动告警 🚨", color_map.get(signals[0].indicator, "grey"),
+                       details_string, ai_interpretation)
+    _post_card(card, symbol)
+
+def send_lark_cluster_alert(cluster, ai_interpretation: str):
+    """
+    市场整体异动的汇总卡片：同一组相关币种在同一轮触发的信号合并为一条消息，
+    每个币种一行，代表币种 (cluster.leader) 排在最前。
+    """
+    leader = cluster.leader
+    symbols = [leader] + [symbol for symbol in cluster.symbols if symbol != leader]
+    details_list = [f"**{len(symbols)} 个相关币种同时触发信号**"]
+    for symbol in symbols:
+        parts = []
+        for signal, _ in cluster.alerts[symbol]:
+            fields = dict(signal.display_fields())
+            summary = ", ".join(f"{key.replace('_', ' ')} {fields[key]}" for key in ('z_score', 'change_1_period', 'price_change')
+                                if key in fields)
+            parts.append(f"{signal.indicator} · {signal.signal_type}" + (f" ({summary})" if summary else ""))
+        details_list.append(f"**{symbol}:** " + "; ".join(parts))
+    details_string = "\n".join(details_list)
+
+    indicators = {signal.indicator for signal, _ in cluster.signals}
+    template = color_map.get(indicators.pop(), "grey") if len(indicators) == 1 else "purple"
+    card = _build_card(f"🚨 市场整体异动告警 ({leader} 等 {len(symbols)} 个币种) 🚨", template,
+                       details_string, ai_interpretation)
+    _post_card(card, cluster.label)
+
+def _build_card(title: str, template: str, details_string: str, ai_interpretation: str):
     fields = []
     sections = ai_interpretation.split('【')
     for section in sections:
         if '】' in section:
             parts = section.split('】', 1)
-            title = "🤖 " + parts[0]
+            section_title = "🤖 " + parts[0]
             content = parts[1].strip()
             if content:
                 fields.append({
                     "is_short": False,
                     "text": {
-                        "content": f"**{title}**\n{content}",
+                        "content": f"**{section_title}**\n{content}",
                         "tag": "lark_md"
                     }
                 })
 
-    card = {
+    return {
         "config": {
             "wide_screen_mode": True
         },
         "header": {
-            "template": color_map.get(indicator_name, "grey"),
+            "template": template,
             "title": {
-                "content": f"🚨 {symbol} 市场异动告警 🚨",
+                "content": title,
                 "tag": "plain_text"
             }
         },
@@ -82,14 +108,34 @@ def send_lark_alert(symbol: str, signal_data: dict, ai_interpretation: str):
         ]
     }
 
+class LarkDeliveryError(Exception):
+    """Lark 拒绝了告警消息 (HTTP 状态正常，但响应中的 code 不为 0，例如签名错误或触发频率限制)"""
+
+
+def _post_card(card: dict, label: str):
+    """发送卡片；请求失败或被 Lark 拒绝时抛出异常，由调用方计为发送失败"""
+    webhook_url = LARK_WEBHOOK_URL
+    if not webhook_url or webhook_url == "YOUR_LARK_WEBHOOK_URL":
+        log.warning("Lark webhook URL not set or is a placeholder. Skipping alert.")
+        return
+
     payload = {
         "msg_type": "interactive",
         "card": card
     }
 
     try:
-        response = requests.post(webhook_url, data=json.dumps(payload), headers={'Content-Type': 'application/json'})
-        response.raise_for_status()
-        log.info(f"Lark alert for {symbol} sent successfully.")
+        response = http_client.post(webhook_url, data=json.dumps(payload), headers={'Content-Type': 'application/json'})
     except requests.exceptions.RequestException as e:
-        log.error(f"Error sending Lark alert for {symbol}: {e}")
+        log.error(f"Error sending Lark alert for {label}: {e}")
+        raise
+    try:
+        result = response.json()
+    except ValueError:
+        result = {}
+    # 新版接口返回 code，旧版返回 StatusCode，成功时均为 0
+    code = result.get('code', result.get('StatusCode', 0))
+    if code:
+        log.error(f"Lark rejected alert for {label}: code {code}, {result.get('msg', result.get('StatusMessage'))}")
+        raise LarkDeliveryError(f"Lark rejected alert for {label}: code {code}")
+    log.info(f"Lark alert for {label} sent successfully.")
@@ -0,0 +1,312 @@
+"""
+历史回放 / 回测引擎。
+
+把本地保存的 K线 / OI / 多空比历史数据 (CSV 或 Parquet，每个币种一个文件) 按模拟时钟
+依次送入与线上相同的指标检查器和 SignalStateManager 去重逻辑，统计告警数量、
+抑制率和各阶段吞吐量，用于调整 thresholds 和 resend_interval_minutes。
+
+历史文件格式: <data_dir>/<SYMBOL>.csv 或 <SYMBOL>.parquet，需包含列
+timestamp (毫秒时间戳或时间字符串), open, high, low, close, volume，
+可选列 taker_buy_base_asset_volume, oi, ls_ratio。
+
+加上 --prefilter 时，再用历史K线模拟每轮的全市场 ticker，按 TickerPrefilter 的筛选结果
+统计深度获取的比例、估算的 API 权重，以及全量扫描发出的告警中有多少落在被选中的周期上 (召回率)。
+
+--workers N 时检查器在 N 个进程中运行 (数据通过共享内存传递)，主进程只做按时间顺序的去重。
+
+用法:
+    python backtest.py --data-dir history/ --volume-z 3.5 --resend-minutes 60
+    python backtest.py --data-dir history/ --workers 0
+    python backtest.py --data-dir history/ --prefilter --prefilter-z 2.0 --refresh-cycles 6
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config_loader import cfg
+from logger import log
+import indicators
+import state_manager
+from indicators import create_checkers
+from batch_scan import candidate_positions, scan_params
+from state_manager import SignalStateManager
+from state_store import MemoryStateStore
+from prefilter import TickerPrefilter
+from process_pool import SharedMemoryPool
+from data_fetcher import TIMEFRAME, DATA_FETCH_LIMIT, interval_to_ms
+
+
+def load_history(path: Path) -> pd.DataFrame:
+    """读取一个币种的历史数据文件，返回与线上数据结构一致的 DataFrame"""
+    df = pd.read_parquet(path) if path.suffix == '.parquet' else pd.read_csv(path)
+    timestamps = df.pop('timestamp')
+    unit = 'ms' if pd.api.types.is_numeric_dtype(timestamps) else None
+    df.index = pd.DatetimeIndex(pd.to_datetime(timestamps, unit=unit), name='timestamp')
+    df = df.sort_index().astype(np.float64)
+    if 'cvd' not in df.columns and 'taker_buy_base_asset_volume' in df.columns:
+        taker_buy = df['taker_buy_base_asset_volume']
+        df['cvd'] = (taker_buy - (df['volume'] - taker_buy)).cumsum()
+    return df
+
+
+def _column(df: pd.DataFrame, name: str):
+    return df[name].to_numpy(dtype=np.float64) if name in df.columns else None
+
+
+def find_candidates(df: pd.DataFrame, checkers: dict):
+    """
+    向量化地找出整段历史中每个指标可能触发的K线位置，返回 {indicator: bar 位置数组}。
+    计算方式、回看周期和阈值与 checkers ({indicator: 检查器}) 相同，之后只需在这些位置上调用检查器。
+    """
+    return candidate_positions(_column(df, 'volume'), _column(df, 'oi'), _column(df, 'ls_ratio'),
+                               scan_params(checkers.values()))
+
+
+class ReplayEngine:
+    """把候选信号按时间顺序送入检查器和去重逻辑，使用K线收盘时间作为模拟时钟"""
+
+    def __init__(self, window: int = DATA_FETCH_LIMIT, interval_ms: int = interval_to_ms(TIMEFRAME), pool=None):
+        self.window = window
+        # 可选的 SharedMemoryPool: 在多个进程中运行检查器，主进程只按时间顺序做去重
+        self.pool = pool
+        self.interval_seconds = interval_ms / 1000
+        self.checkers = {checker.indicator: checker for checker in create_checkers()}
+        self._now = 0.0
+        self.state_manager = SignalStateManager(store=MemoryStateStore(), clock=lambda: self._now)
+        self.stage_seconds = {"load": 0.0, "scan": 0.0, "check": 0.0, "dedup": 0.0}
+        self.counts = {"symbols": 0, "bars": 0, "candidates": 0, "signals": 0, "sent": 0, "suppressed": 0}
+        self.per_indicator = {name: {"candidates": 0, "signals": 0, "sent": 0, "suppressed": 0} for name in self.checkers}
+        self.frames = {}
+        # 发出的告警 (symbol, bar 位置, indicator) 和各指标的候选位置，用于和预筛选结果对比
+        self.sent_events = []
+        self.candidates = {}
+
+    def run(self, files):
+        frames, events = {}, []
+
+        start = time.perf_counter()
+        for path in files:
+            frames[path.stem] = load_history(path)
+        self.stage_seconds["load"] = time.perf_counter() - start
+        self.frames = frames
+
+        start = time.perf_counter()
+        for symbol, df in frames.items():
+            self.counts["symbols"] += 1
+            self.counts["bars"] += len(df)
+            bar_times = df.index.values.astype('datetime64[ms]').astype(np.int64)
+            for indicator, positions in find_candidates(df, self.checkers).items():
+                self.per_indicator[indicator]["candidates"] += len(positions)
+                self.candidates[(symbol, indicator)] = positions
+                events.extend((bar_times[pos], symbol, int(pos), indicator) for pos in positions)
+        # 所有币种的候选信号按时间排序，保证模拟时钟单调递增
+        events.sort()
+        self.counts["candidates"] = len(events)
+        self.stage_seconds["scan"] = time.perf_counter() - start
+
+        if self.pool is not None:
+            signals = self._check_in_pool(frames, events)
+            for bar_time, symbol, pos, indicator in events:
+                self._dedup_event(symbol, bar_time, pos, indicator, signals.get((symbol, pos, indicator)))
+        else:
+            for bar_time, symbol, pos, indicator in events:
+                self._replay_event(frames[symbol], symbol, bar_time, pos, indicator)
+        return self.report()
+
+    def _check_in_pool(self, frames, events):
+        start = time.perf_counter()
+        by_symbol = {}
+        for _, symbol, pos, indicator in events:
+            by_symbol.setdefault(symbol, []).append((pos, indicator))
+        settings = {indicator: (checker.lookback, checker.thresholds) for indicator, checker in self.checkers.items()}
+        results = self.pool.check(frames, by_symbol, settings, self.window)
+        self.stage_seconds["check"] = time.perf_counter() - start
+        return {(symbol, pos, indicator): signal for symbol, pos, indicator, signal in results}
+
+    def _replay_event(self, df, symbol, bar_time, pos, indicator):
+        start = time.perf_counter()
+        window = df.iloc[max(0, pos + 1 - self.window):pos + 1]
+        signal = self.checkers[indicator].check(window, symbol)
+        self.stage_seconds["check"] += time.perf_counter() - start
+        self._dedup_event(symbol, bar_time, pos, indicator, signal)
+
+    def _dedup_event(self, symbol, bar_time, pos, indicator, signal):
+        if not signal:
+            return
+
+        start = time.perf_counter()
+        # 模拟时钟: 该K线收盘的时刻
+        self._now = bar_time / 1000 + self.interval_seconds
+        should_send, _ = self.state_manager.should_send_alert(symbol, signal)
+        self.stage_seconds["dedup"] += time.perf_counter() - start
+
+        outcome = "sent" if should_send else "suppressed"
+        if should_send:
+            self.sent_events.append((symbol, pos, indicator))
+        for counts in (self.counts, self.per_indicator[indicator]):
+            counts["signals"] += 1
+            counts[outcome] += 1
+
+    def report(self):
+        def rate(numerator, denominator):
+            return round(numerator / denominator, 4) if denominator else 0.0
+
+        throughput = {
+            "scan_bars_per_second": rate(self.counts["bars"], self.stage_seconds["scan"]),
+            "check_candidates_per_second": rate(self.counts["candidates"], self.stage_seconds["check"]),
+            "dedup_signals_per_second": rate(self.counts["signals"], self.stage_seconds["dedup"]),
+        }
+        return {
+            "counts": self.counts,
+            "suppression_rate": rate(self.counts["suppressed"], self.counts["signals"]),
+            "per_indicator": {
+                name: {**counts, "suppression_rate": rate(counts["suppressed"], counts["signals"])}
+                for name, counts in self.per_indicator.items()
+            },
+            "stage_seconds": {name: round(seconds, 4) for name, seconds in self.stage_seconds.items()},
+            "throughput": throughput,
+        }
+
+
+def simulate_tickers(df: pd.DataFrame, interval_ms: int):
+    """由K线模拟每个周期的 ticker/24hr：最新价和最近24小时的成交额"""
+    bars_per_day = max(1, 86_400_000 // interval_ms)
+    if 'quote_asset_volume' in df.columns:
+        quote_volume = df['quote_asset_volume']
+    else:
+        quote_volume = df['volume'] * df['close']
+    return pd.DataFrame({
+        'lastPrice': df['close'],
+        'quoteVolume': quote_volume.rolling(bars_per_day, min_periods=1).sum(),
+    })
+
+
+def replay_prefilter(frames: dict, sent_events, candidates: dict, prefilter: TickerPrefilter,
+                     interval_ms: int = interval_to_ms(TIMEFRAME), deep_weight: float = 3, ticker_weight: float = 40):
+    """
+    按时间顺序模拟每一轮的预筛选，与全量扫描对比:
+    深度获取的 (币种, 周期) 比例、估算的 API 权重，以及全量扫描发出的告警中
+    落在被选中周期上的比例 (召回率，按指标分别统计)。
+    没有当场选中、但在之后 refresh_cycles 个周期内某个被选中的周期上仍满足触发
+    条件的告警计为延迟发现 (candidates: {(symbol, indicator): 候选位置数组})。
+    """
+    start = time.perf_counter()
+    tickers = {symbol: simulate_tickers(df, interval_ms) for symbol, df in frames.items()}
+    panel_index = sorted(set().union(*(df.index for df in tickers.values())))
+    # 每个时间点: [(symbol, bar 位置, ticker), ...]
+    rows_by_time = {}
+    for symbol, df in tickers.items():
+        prices, volumes = df['lastPrice'].to_numpy(), df['quoteVolume'].to_numpy()
+        for pos, ts in enumerate(df.index):
+            rows_by_time.setdefault(ts, []).append(
+                (symbol, pos, {'symbol': symbol, 'lastPrice': prices[pos], 'quoteVolume': volumes[pos]}))
+
+    symbols = list(frames)
+    selected = set()
+    deep = screened = 0
+    for ts in panel_index:
+        rows = rows_by_time[ts]
+        chosen = set(prefilter.screen([symbol for symbol, _, _ in rows], [ticker for _, _, ticker in rows]))
+        deep += len(chosen)
+        screened += len(rows)
+        selected.update((symbol, pos) for symbol, pos, _ in rows if symbol in chosen)
+
+    per_indicator = {}
+    for symbol, pos, indicator in sent_events:
+        counts = per_indicator.setdefault(indicator, {"alerts": 0, "caught": 0, "delayed": 0})
+        counts["alerts"] += 1
+        if (symbol, pos) in selected:
+            counts["caught"] += 1
+            continue
+        positions = candidates.get((symbol, indicator), ())
+        later = positions[np.searchsorted(positions, pos):np.searchsorted(positions, pos + prefilter.refresh_cycles)]
+        counts["delayed"] += any((symbol, int(later_pos)) in selected for later_pos in later)
+    alerts = sum(counts["alerts"] for counts in per_indicator.values())
+    caught = sum(counts["caught"] for counts in per_indicator.values())
+    delayed = sum(counts["delayed"] for counts in per_indicator.values())
+
+    def rate(numerator, denominator):
+        return round(numerator / denominator, 4) if denominator else 0.0
+
+    exhaustive_weight = screened * deep_weight
+    prefilter_weight = deep * deep_weight + len(panel_index) * ticker_weight
+    return {
+        "cycles": len(panel_index),
+        "symbols": len(symbols),
+        "deep_fetch_ratio": rate(deep, screened),
+        "api_weight": {"exhaustive": exhaustive_weight, "prefilter": prefilter_weight,
+                       "reduction": rate(exhaustive_weight, prefilter_weight)},
+        "recall": rate(caught, alerts),
+        "recall_with_delayed": rate(caught + delayed, alerts),
+        "per_indicator": {name: {**counts, "recall": rate(counts["caught"], counts["alerts"]),
+                                 "recall_with_delayed": rate(counts["caught"] + counts["delayed"], counts["alerts"])}
+                          for name, counts in per_indicator.items()},
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def apply_overrides(args):
+    """用命令行参数覆盖配置中的阈值和重发间隔"""
+    thresholds = dict(cfg['trading']['thresholds'])
+    for key, value in [('volume_z_score', args.volume_z), ('oi_sudden_change', args.oi_change),
+                       ('ls_ratio_z_score', args.ls_z), ('z_score_change', args.z_change),
+                       ('percentage_change', args.pct_change)]:
+        if value is not None:
+            thresholds[key] = value
+    indicators.THRESHOLDS = thresholds
+    state_manager.Z_SCORE_CHANGE_THRESHOLD = thresholds['z_score_change']
+    state_manager.PERCENTAGE_CHANGE_THRESHOLD = thresholds['percentage_change']
+    if args.resend_minutes is not None:
+        state_manager.RESEND_INTERVAL_MINUTES = args.resend_minutes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', required=True, type=Path)
+    parser.add_argument('--symbols', nargs='*', help="只回放这些币种 (默认目录下全部)")
+    parser.add_argument('--volume-z', type=float)
+    parser.add_argument('--oi-change', type=float)
+    parser.add_argument('--ls-z', type=float)
+    parser.add_argument('--z-change', type=float)
+    parser.add_argument('--pct-change', type=float)
+    parser.add_argument('--resend-minutes', type=float)
+    parser.add_argument('--prefilter', action='store_true', help="与 ticker 预筛选模式对比")
+    parser.add_argument('--prefilter-z', type=float, help="预筛选的 Z-Score 阈值")
+    parser.add_argument('--prefilter-price-change', type=float, help="预筛选的价格变化阈值")
+    parser.add_argument('--refresh-cycles', type=int, help="未触发预筛选的币种每隔多少轮仍深度获取一次")
+    parser.add_argument('--deep-weight', type=float, default=3, help="一次增量深度获取 (K线+OI+多空比) 的估算权重")
+    parser.add_argument('--workers', type=int, help="在多个进程中运行检查器 (0 = CPU 核数)")
+    parser.add_argument('--report', type=Path, help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    apply_overrides(args)
+    # 回测中每个信号都会经过去重判断，关闭逐条日志
+    log.disable("state_manager")
+    files = sorted(p for p in args.data_dir.iterdir() if p.suffix in ('.csv', '.parquet'))
+    if args.symbols:
+        files = [p for p in files if p.stem in set(args.symbols)]
+    if not files:
+        parser.error(f"No history files found in {args.data_dir}")
+
+    pool = SharedMemoryPool(args.workers) if args.workers is not None else None
+    engine = ReplayEngine(pool=pool)
+    report = engine.run(files)
+    if pool is not None:
+        pool.shutdown()
+    if args.prefilter:
+        prefilter = TickerPrefilter()
+        for name, value in [('z_threshold', args.prefilter_z), ('price_change_threshold', args.prefilter_price_change),
+                            ('refresh_cycles', args.refresh_cycles)]:
+            if value is not None:
+                setattr(prefilter, name, value)
+        report["prefilter"] = replay_prefilter(engine.frames, engine.sent_events, engine.candidates, prefilter,
+                                               deep_weight=args.deep_weight)
+    log.info(f"回测完成: {json.dumps(report, ensure_ascii=False)}")
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import numpy as np
+from logger import log
+from rolling_stats import latest_z_score, rolling_z_score
+from indicators import VolumeSignal, OpenInterestSignal, LSRatioSignal, create_checkers
+
+# scan_matrices 产出结果的指标顺序
+INDICATORS = (VolumeSignal.indicator, OpenInterestSignal.indicator, LSRatioSignal.indicator)
+
+
+def stack_metric(frames: dict, column: str, length: int, out: np.ndarray = None):
+    """
+    将所有币种某一列最近 length 根K线堆叠成 (币种数 × length) 的二维数组。
+    每行以该币种最新一根K线右对齐，数据不足或缺少该列的位置填 NaN。
+    out 可以是预先分配好的数组 (例如共享内存)。
+    """
+    matrix = np.full((len(frames), length), np.nan) if out is None else out
+    if out is not None:
+        matrix.fill(np.nan)
+    for row, df in enumerate(frames.values()):
+        if column not in df.columns:
+            continue
+        values = df[column].to_numpy(dtype=np.float64)[-length:]
+        if len(values):
+            matrix[row, length - len(values):] = values
+    return matrix
+
+
+def scan_params(checkers) -> dict:
+    """扫描所需的回看周期和阈值 (只包含基本类型，可以传给子进程)"""
+    checkers = {type(checker): checker for checker in checkers or create_checkers()}
+    volume_checker, oi_checker, ls_checker = checkers[VolumeSignal], checkers[OpenInterestSignal], checkers[LSRatioSignal]
+    return {
+        "volume_lookback": volume_checker.lookback,
+        "volume_z_score": volume_checker.thresholds['volume_z_score'],
+        "oi_sudden_change": oi_checker.thresholds['oi_sudden_change'],
+        "ls_ratio_lookback": ls_checker.lookback,
+        "ls_ratio_z_score": ls_checker.thresholds['ls_ratio_z_score'],
+    }
+
+
+def scan_matrices(volume: np.ndarray, oi: np.ndarray, ls_ratio: np.ndarray, params: dict):
+    """
+    对堆叠好的矩阵 (每行一个币种，见 stack_metric) 做阈值判断，返回触发的 (行号, indicator) 列表。
+    只做 NumPy 计算，可以在子进程中直接作用于共享内存。
+    """
+    fired = []
+
+    # 成交量 Z-Score
+    volume_z = latest_z_score(volume, params['volume_lookback'])
+    with np.errstate(invalid='ignore'):
+        hits = np.abs(volume_z) > params['volume_z_score']
+    fired += [(int(row), VolumeSignal.indicator) for row in np.flatnonzero(hits)]
+
+    # 持仓量单周期变化
+    with np.errstate(invalid='ignore', divide='ignore'):
+        oi_pct_change = oi[:, -1] / oi[:, -2] - 1
+        hits = np.abs(oi_pct_change) > params['oi_sudden_change']
+    fired += [(int(row), OpenInterestSignal.indicator) for row in np.flatnonzero(hits)]
+
+    # 多空比 Z-Score
+    ls_z = latest_z_score(ls_ratio, params['ls_ratio_lookback'])
+    with np.errstate(invalid='ignore'):
+        hits = np.abs(ls_z) > params['ls_ratio_z_score']
+    fired += [(int(row), LSRatioSignal.indicator) for row in np.flatnonzero(hits)]
+    return fired
+
+
+def candidate_positions(volume: np.ndarray, oi: np.ndarray, ls_ratio: np.ndarray, params: dict):
+    """
+    整段历史 (一维数组) 中每个指标可能触发的K线位置，返回 {indicator: bar 位置数组}。
+    oi / ls_ratio 为 None 表示没有该列。计算方式与 scan_matrices 相同。
+    """
+    candidates = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        volume_z = rolling_z_score(volume, params['volume_lookback'])
+        candidates[VolumeSignal.indicator] = np.flatnonzero(np.abs(volume_z) > params['volume_z_score'])
+
+        if oi is not None:
+            oi_change = np.full(len(oi), np.nan)
+            oi_change[1:] = oi[1:] / oi[:-1] - 1
+            candidates[OpenInterestSignal.indicator] = np.flatnonzero(np.abs(oi_change) > params['oi_sudden_change'])
+
+        if ls_ratio is not None:
+            ls_z = rolling_z_score(ls_ratio, params['ls_ratio_lookback'])
+            candidates[LSRatioSignal.indicator] = np.flatnonzero(np.abs(ls_z) > params['ls_ratio_z_score'])
+    return candidates
+
+
+def scan_universe(frames: dict, checkers=None, pool=None):
+    """
+    对所有币种一次性进行向量化的信号扫描。
+
+    frames: {symbol: DataFrame}，返回触发阈值的 (symbol, indicator) 列表，
+    indicator 与对应检查器的 indicator 属性一致。之后只需对这些组合调用
+    检查器生成完整的信号数据包。
+    checkers: 同一周期的一组检查器，扫描使用它们的回看周期和阈值 (默认基础周期)。
+    pool: 可选的 SharedMemoryPool，币种数量足够多时把扫描分给多个进程。
+    """
+    frames = {symbol: df for symbol, df in frames.items() if not df.empty}
+    if not frames:
+        return []
+    params = scan_params(checkers)
+    symbols = list(frames)
+
+    if pool is not None and pool.should_use(len(frames)):
+        fired = pool.scan(frames, params)
+    else:
+        fired = scan_matrices(stack_metric(frames, 'volume', params['volume_lookback']),
+                              stack_metric(frames, 'oi', 2),
+                              stack_metric(frames, 'ls_ratio', params['ls_ratio_lookback']), params)
+
+    log.debug(f"批量扫描 {len(symbols)} 个币种，触发 {len(fired)} 个信号。")
+    return [(symbols[row], indicator) for row, indicator in fired]
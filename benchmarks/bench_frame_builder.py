@@ -0,0 +1,80 @@
+"""
+对比 frame_builder.build_frame 与旧版 pandas 处理流程的单币种 CPU 时间和峰值内存。
+
+用法 (在仓库根目录下):
+    python -m benchmarks.bench_frame_builder --bars 300 --repeat 200
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from frame_builder import build_frame
+from benchmarks.fixtures import generate_payloads
+
+
+def legacy_build_dataframe(klines_data, oi_data, ls_data):
+    """旧版 data_fetcher.get_binance_data 中的数据处理流程，仅作为基准对照"""
+    df = pd.DataFrame(klines_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df.set_index('timestamp', inplace=True)
+    numeric_cols = ['open', 'high', 'low', 'close', 'volume', 'taker_buy_base_asset_volume']
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric)
+    volume_delta = df['taker_buy_base_asset_volume'] - (df['volume'] - df['taker_buy_base_asset_volume'])
+    df['cvd'] = volume_delta.cumsum()
+
+    oi_df = pd.DataFrame(oi_data)
+    oi_df['timestamp'] = pd.to_datetime(oi_df['timestamp'], unit='ms')
+    oi_df.set_index('timestamp', inplace=True)
+    df['oi'] = pd.to_numeric(oi_df['sumOpenInterestValue'])
+
+    ls_df = pd.DataFrame(ls_data)
+    ls_df['timestamp'] = pd.to_datetime(ls_df['timestamp'], unit='ms')
+    ls_df.set_index('timestamp', inplace=True)
+    df['ls_ratio'] = pd.to_numeric(ls_df['longShortRatio'])
+
+    df = df.reindex(df.index.union(oi_df.index).union(ls_df.index))
+    for col in df.columns:
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except (ValueError, TypeError):
+            pass
+    return df.interpolate(method='time').bfill().ffill()
+
+
+def measure(func, payloads, repeat: int):
+    """返回 (每次调用的平均 CPU 时间 ms, 单次调用峰值内存 KiB)"""
+    func(*payloads)  # 预热
+    start = time.process_time()
+    for _ in range(repeat):
+        func(*payloads)
+    cpu_ms = (time.process_time() - start) / repeat * 1000
+
+    tracemalloc.start()
+    func(*payloads)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, nargs='+', default=[300, 1500])
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'bars':>6} {'path':<14} {'cpu ms':>10} {'peak KiB':>10}")
+    for bars in args.bars:
+        payloads = generate_payloads("BTCUSDT", bars)
+
+        legacy, typed = legacy_build_dataframe(*payloads), build_frame(*payloads)
+        for col in ['open', 'close', 'volume', 'cvd', 'oi', 'ls_ratio']:
+            np.testing.assert_allclose(typed[col].to_numpy(), legacy[col].to_numpy(), rtol=1e-9)
+
+        for name, func in [("legacy pandas", legacy_build_dataframe), ("frame_builder", build_frame)]:
+            cpu_ms, peak_kib = measure(func, payloads, args.repeat)
+            print(f"{bars:>6} {name:<14} {cpu_ms:>10.3f} {peak_kib:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
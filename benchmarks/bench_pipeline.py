@@ -0,0 +1,219 @@
+"""
+各处理阶段及完整 run_check 周期的基准测试。
+
+所有 HTTP 请求都发往本地的 Binance 模拟服务 (benchmarks.stub_server)，数据来自
+benchmarks.fixtures (或 benchmarks/recorded/ 中录制的真实样本)。对每个
+币种数量 × 获取条数 组合测量:
+
+    fetch.get_binance_data      单币种顺序获取 + 组装 DataFrame
+    fetch.fetch_all_cold        FetchEngine 并发获取全部币种 (空缓存)
+    fetch.fetch_all_warm        FetchEngine 增量获取全部币种 (缓存已填充)
+    indicators.calculate_z_score
+    indicators.checkers         三个指标检查器 (增量 Z-Score)
+    indicators.create_market_snapshot (cold / cached)
+    state.should_send_alert     去重判断 (JournalStateStore)
+    market_structure.push       相关矩阵加入一根K线 (增量，O(币种数²))
+    market_structure.recompute  同样的窗口用 np.corrcoef 整体重算 (对照，不处理缺失值)
+    market_structure.cluster    一轮中 10% 的币种触发时的告警聚类
+    cycle.run_check_cold / cycle.run_check_warm   main.run_check 完整周期
+
+结果保存在 benchmarks/results/<commit>.json，可用 --compare 与之前的结果对比。
+
+用法 (在仓库根目录下):
+    python -m benchmarks.bench_pipeline --symbols 10 50 --limits 300 1000
+    python -m benchmarks.bench_pipeline --quick --compare benchmarks/results/<commit>.json
+"""
+import sys
+import argparse
+import tempfile
+import itertools
+import numpy as np
+from pathlib import Path
+
+_tmp_dir = tempfile.TemporaryDirectory(prefix="bench-")
+
+from config_loader import cfg
+# 状态文件和归档写到临时目录，不影响本地运行的机器人
+cfg['state_file_path'] = str(Path(_tmp_dir.name) / "bot_state.json")
+cfg.setdefault('archive', {})['enabled'] = False
+
+from logger import log
+log.remove()
+log.add(sys.stderr, level="ERROR")
+
+import data_fetcher
+from data_fetcher import get_binance_data, interval_to_ms, TIMEFRAME
+from fetch_engine import FetchEngine
+from market_cache import MarketDataCache
+from indicators import calculate_z_score, create_checkers, snapshot_cache, _create_market_snapshot
+from signals import Signal
+from state_manager import SignalStateManager
+from state_store import JournalStateStore
+from market_structure import MarketStructure, RollingCorrelation
+from benchmarks.fixtures import symbol_names
+from benchmarks.stub_server import BinanceStubServer
+from benchmarks.harness import measure_stage, save_results, load_results, print_results, compare_results
+
+RECORDED_DIR = Path(__file__).parent / "recorded"
+
+
+def _new_engine(limit: int):
+    return FetchEngine(cache=MarketDataCache(max_bars=limit, fetch_limit=limit, interval_ms=interval_to_ms(TIMEFRAME)))
+
+
+def _consume(engine, symbols):
+    return {symbol: df for symbol, df, _ in engine.fetch_all(symbols)}
+
+
+def bench_fetch(symbols, limit, iterations):
+    results = {}
+    next_symbol = itertools.cycle(symbols).__next__
+    results["fetch.get_binance_data"] = measure_stage(lambda: get_binance_data(next_symbol(), limit=limit), iterations)
+    results["fetch.fetch_all_cold"] = measure_stage(
+        lambda engine: _consume(engine, symbols), max(1, iterations // 10), len(symbols), setup=lambda: _new_engine(limit))
+
+    engine = _new_engine(limit)
+    _consume(engine, symbols)
+    results["fetch.fetch_all_warm"] = measure_stage(lambda: _consume(engine, symbols), max(1, iterations // 10), len(symbols))
+    return results, _consume(engine, symbols)
+
+
+def bench_indicators(frames, limit, iterations):
+    results = {}
+    symbol, df = next(iter(frames.items()))
+    lookback = min(288, limit - 1)
+    results["indicators.calculate_z_score"] = measure_stage(lambda: calculate_z_score(df['volume'], lookback), iterations)
+
+    checkers = create_checkers()
+
+    def run_checkers():
+        for name, frame in frames.items():
+            for checker in checkers:
+                checker.check(frame, name)
+    results["indicators.checkers"] = measure_stage(run_checkers, max(1, iterations // 10), len(frames) * len(checkers))
+
+    results["indicators.create_market_snapshot.cold"] = measure_stage(
+        lambda _: _create_market_snapshot(symbol, df), iterations, setup=lambda: snapshot_cache.drop(symbol))
+    results["indicators.create_market_snapshot.cached"] = measure_stage(
+        lambda: _create_market_snapshot(symbol, df), iterations)
+    return results
+
+
+def bench_state(symbols, iterations):
+    store = JournalStateStore(Path(_tmp_dir.name) / f"state-{len(symbols)}.json")
+    manager = SignalStateManager(store=store)
+    indicators = ["Volume", "Open Interest", "Long/Short Ratio"]
+    keys = itertools.cycle(itertools.product(symbols, indicators))
+    counter = itertools.count()
+
+    def should_send():
+        symbol, indicator = next(keys)
+        # Z-Score 交替变化，覆盖 发送 / 抑制 两条路径
+        z_score = 3.0 + (next(counter) % 4) * 0.05
+        manager.should_send_alert(symbol, Signal(symbol, TIMEFRAME, indicator, "Spike Alert", z_score=z_score))
+    result = measure_stage(should_send, iterations * 10)
+    store.close()
+    return {"state.should_send_alert": result}
+
+
+def bench_market_structure(symbols, limit, iterations):
+    rng = np.random.default_rng(0)
+    window = min(limit, 288)
+    factor = rng.normal(size=window * 2)
+    bars = factor[:, None] + rng.normal(size=(window * 2, len(symbols)))
+    correlation = RollingCorrelation(window)
+    for row in bars[:window]:
+        correlation.push(dict(zip(symbols, row)))
+    rows = itertools.cycle(bars[window:])
+
+    def push():
+        correlation.push(dict(zip(symbols, next(rows))))
+
+    def recompute():
+        np.corrcoef(bars[:window], rowvar=False)
+
+    structure = MarketStructure(window=window)
+    structure.returns, structure.volume = correlation, correlation
+    fired = symbols[:max(1, len(symbols) // 10)]
+    alerts = {symbol: [(Signal(symbol, TIMEFRAME, "Volume", "Spike Alert", z_score=3.0), None)] for symbol in fired}
+    return {
+        "market_structure.push": measure_stage(push, iterations),
+        "market_structure.recompute": measure_stage(recompute, iterations),
+        "market_structure.cluster": measure_stage(lambda: structure.cluster(alerts, len(symbols)), iterations),
+    }
+
+
+def bench_cycle(symbols, limit, iterations):
+    import main
+    from universe import UniverseManager
+    main.setup()
+
+    def reset():
+        main.fetch_engine = _new_engine(limit)
+        main.universe_manager = UniverseManager(main.fetch_engine, pinned=symbols, enabled=False,
+                                                on_remove=main.release_symbols)
+        if main.market_structure is not None:
+            main.market_structure = MarketStructure()
+        for symbol in symbols:
+            snapshot_cache.drop(symbol)
+
+    results = {"cycle.run_check_cold": measure_stage(lambda _: main.run_check(), max(1, iterations // 10),
+                                                     len(symbols), setup=reset)}
+    reset()
+    main.run_check()
+    results["cycle.run_check_warm"] = measure_stage(main.run_check, max(1, iterations // 10), len(symbols))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, nargs='+', default=[10, 50, 200], help="币种数量")
+    parser.add_argument('--limits', type=int, nargs='+', default=[300, 1000], help="每次获取的K线条数")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=0, help="模拟服务每个请求的额外延迟")
+    parser.add_argument('--stages', nargs='+', default=['fetch', 'indicators', 'state', 'market_structure', 'cycle'])
+    parser.add_argument('--quick', action='store_true', help="只跑 10 个币种 × 300 条，迭代 10 次")
+    parser.add_argument('--output', type=Path, help="结果文件 (默认 benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', help="与之前的结果文件 (或提交哈希) 对比")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="p50 变慢超过该比例视为回归")
+    args = parser.parse_args()
+    if args.quick:
+        args.symbols, args.limits, args.iterations = [10], [300], 10
+    # 先读取基准结果，当前结果可能会覆盖同一个文件
+    baseline = load_results(args.compare) if args.compare else None
+
+    stub = BinanceStubServer(symbol_names(max(args.symbols)), bars=max(args.limits) + 100,
+                             latency_ms=args.latency_ms, recorded_dir=RECORDED_DIR).start()
+    data_fetcher.BASE_URL = stub.base_url
+
+    results = {}
+    for count, limit in itertools.product(args.symbols, args.limits):
+        symbols = symbol_names(count)
+        scenario = {}
+        if 'fetch' in args.stages or 'indicators' in args.stages:
+            fetch_results, frames = bench_fetch(symbols, limit, args.iterations)
+            if 'fetch' in args.stages:
+                scenario.update(fetch_results)
+            if 'indicators' in args.stages:
+                scenario.update(bench_indicators(frames, limit, args.iterations))
+        if 'state' in args.stages:
+            scenario.update(bench_state(symbols, args.iterations))
+        if 'market_structure' in args.stages:
+            scenario.update(bench_market_structure(symbols, limit, args.iterations))
+        if 'cycle' in args.stages:
+            scenario.update(bench_cycle(symbols, limit, args.iterations))
+        results.update({f"{name}[symbols={count},limit={limit}]": stats for name, stats in scenario.items()})
+    stub.stop()
+
+    print_results(results)
+    path = save_results(results, args.output)
+    print(f"\nresults saved to {path}")
+
+    if baseline:
+        regressions = compare_results(baseline, load_results(path), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+冷启动基准测试: 从进程启动到第一轮检查完成 (所有币种都已获取并检查) 的时间。
+
+每次运行启动一个新的 Python 进程，导入 main、(按场景) 恢复热启动快照并执行第一轮检查，
+时间从操作系统记录的进程启动时间算起 (startup.StartupProfile)。场景:
+
+    startup.first_check_cold    没有快照，为每个币种完整拉取历史数据
+    startup.first_check_warm    恢复停机前保存的快照，只补齐停机期间 (--downtime-bars) 缺少的K线
+
+HTTP 请求发往本地的 Binance 模拟服务；--latency-ms 可以模拟真实网络的往返延迟。
+结果格式与 bench_pipeline 相同 (benchmarks/results/<commit>-startup.json)，并打印最后一次运行的
+各阶段耗时和请求次数。
+
+用法 (在仓库根目录下):
+    python -m benchmarks.bench_startup --symbols 50 --runs 5 --latency-ms 50
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+from pathlib import Path
+import numpy as np
+from benchmarks.fixtures import symbol_names
+from benchmarks.stub_server import BinanceStubServer
+from benchmarks.harness import RESULTS_DIR, git_revision, save_results, print_results
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# 子进程中运行的启动流程，与 main.main() 一致 (不启动调度循环)
+_CHILD = """
+import sys, json
+from config_loader import cfg
+settings = json.loads(sys.argv[1])
+cfg['trading']['symbols'] = settings['symbols']
+cfg['state_file_path'] = 'bot_state.json'
+cfg['gemini']['api_key'] = ''
+cfg.setdefault('archive', {})['enabled'] = False
+cfg.setdefault('universe', {})['enabled'] = False
+cfg.setdefault('prefilter', {})['enabled'] = False
+cfg.setdefault('warm_state', {}).update(enabled=settings['warm'], path='warm_state.pkl', interval_seconds=0)
+import data_fetcher
+data_fetcher.BASE_URL = settings['base_url']
+import main
+main.setup()
+main.universe_manager.start()
+main.start_from_warm_state()
+main.first_check()
+profile = main.startup_profile
+with open('result.json', 'w') as f:
+    json.dump({"elapsed": profile.elapsed, "stages": profile.stages, "symbols_checked": main.cycle_symbols.value()}, f)
+"""
+
+
+def run_child(workdir: Path, settings: dict):
+    env = {**os.environ, "PYTHONPATH": str(REPO_ROOT)}
+    result_path = workdir / "result.json"
+    result_path.unlink(missing_ok=True)
+    completed = subprocess.run([sys.executable, "-c", _CHILD, json.dumps(settings)], cwd=workdir, env=env,
+                               capture_output=True, text=True, timeout=600)
+    if completed.returncode != 0 or not result_path.exists():
+        raise RuntimeError(f"startup run failed:\n{completed.stdout[-2000:]}\n{completed.stderr[-2000:]}")
+    return json.loads(result_path.read_text())
+
+
+def summarize(elapsed, symbol_count: int):
+    elapsed = np.array(elapsed)
+    return {
+        "iterations": len(elapsed),
+        "p50_ms": round(float(np.percentile(elapsed, 50)) * 1000, 4),
+        "p99_ms": round(float(np.percentile(elapsed, 99)) * 1000, 4),
+        "mean_ms": round(float(elapsed.mean()) * 1000, 4),
+        "throughput_per_s": round(symbol_count / float(np.median(elapsed)), 2),
+        "peak_kib": 0.0,
+    }
+
+
+def bench_startup(stub, symbols, runs: int, downtime_bars: int):
+    results, last = {}, {}
+    for scenario in ("cold", "warm"):
+        elapsed = []
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory(prefix="bench-startup-") as workdir:
+                settings = {"symbols": symbols, "base_url": stub.base_url, "warm": scenario == "warm"}
+                if scenario == "warm":
+                    # 停机前的一次运行，退出时保存快照；之后的这段时间里行情继续更新
+                    stub.hidden_bars = downtime_bars
+                    run_child(Path(workdir), settings)
+                    stub.hidden_bars = 0
+                before = sum(stub.requests.values())
+                result = run_child(Path(workdir), settings)
+                if result["symbols_checked"] != len(symbols):
+                    raise RuntimeError(f"first check covered {result['symbols_checked']} of {len(symbols)} symbols")
+                result["requests"] = sum(stub.requests.values()) - before
+            elapsed.append(result["elapsed"])
+            last[scenario] = result
+        results[f"startup.first_check_{scenario}[symbols={len(symbols)}]"] = summarize(elapsed, len(symbols))
+    return results, last
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, nargs='+', default=[10, 50], help="币种数量")
+    parser.add_argument('--runs', type=int, default=3, help="每个场景启动的次数")
+    parser.add_argument('--downtime-bars', type=int, default=3, help="热启动场景中停机期间错过的K线数量")
+    parser.add_argument('--latency-ms', type=float, default=0, help="模拟服务每个请求的额外延迟")
+    parser.add_argument('--output', type=Path, help="结果文件 (默认 benchmarks/results/<commit>-startup.json)")
+    args = parser.parse_args()
+
+    stub = BinanceStubServer(symbol_names(max(args.symbols)), latency_ms=args.latency_ms).start()
+    results = {}
+    try:
+        for count in args.symbols:
+            scenario_results, last = bench_startup(stub, symbol_names(count), args.runs, args.downtime_bars)
+            results.update(scenario_results)
+            for scenario, result in last.items():
+                stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in result["stages"])
+                print(f"[symbols={count}] {scenario}: {result['elapsed']:.2f}s ({stages}), {result['requests']} requests")
+    finally:
+        stub.stop()
+
+    print_results(results)
+    path = save_results(results, args.output or RESULTS_DIR / f"{git_revision()}-startup.json")
+    print(f"\nresults saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
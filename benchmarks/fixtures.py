@@ -0,0 +1,114 @@
+"""
+Binance 接口数据样本生成。
+
+生成的数据与 /fapi/v1/klines、/futures/data/openInterestHist、
+/futures/data/globalLongShortAccountRatio 的返回格式完全一致 (数值均为字符串)，
+同一个币种每次生成的结果相同，便于在不同提交之间比较基准测试结果。
+
+也可以用 record_payloads 从 Binance 录制真实数据 (python -m benchmarks.fixtures --record ...)，
+load_payloads 优先使用录制的样本，时间戳会平移到指定的结束时间。
+"""
+import json
+import random
+import zlib
+import argparse
+from pathlib import Path
+
+INTERVAL_MS = 5 * 60 * 1000
+END_TIME_MS = 1_735_689_600_000  # 2025-01-01 00:00:00 UTC
+
+
+def generate_payloads(symbol: str, bars: int, end_time_ms: int = END_TIME_MS, interval_ms: int = INTERVAL_MS):
+    """返回 (klines, open_interest, long_short_ratio) 三个接口的原始数据"""
+    rnd = random.Random(zlib.crc32(symbol.encode()))
+    price = rnd.uniform(0.1, 50_000)
+    open_interest = rnd.uniform(1e7, 5e9)
+    ratio = rnd.uniform(0.6, 3.0)
+
+    klines, oi_rows, ls_rows = [], [], []
+    start = end_time_ms - interval_ms * (bars - 1)
+    for i in range(bars):
+        ts = start + i * interval_ms
+        open_price = price
+        price *= 1 + rnd.gauss(0, 0.002)
+        high = max(open_price, price) * (1 + abs(rnd.gauss(0, 0.001)))
+        low = min(open_price, price) * (1 - abs(rnd.gauss(0, 0.001)))
+        volume = rnd.lognormvariate(8, 0.8)
+        taker_buy = volume * rnd.uniform(0.35, 0.65)
+        klines.append([
+            ts, f"{open_price:.6f}", f"{high:.6f}", f"{low:.6f}", f"{price:.6f}", f"{volume:.3f}",
+            ts + interval_ms - 1, f"{volume * price:.4f}", rnd.randint(100, 20_000),
+            f"{taker_buy:.3f}", f"{taker_buy * price:.4f}", "0",
+        ])
+
+        open_interest *= 1 + rnd.gauss(0, 0.003)
+        oi_rows.append({
+            "symbol": symbol,
+            "sumOpenInterest": f"{open_interest / price:.8f}",
+            "sumOpenInterestValue": f"{open_interest:.8f}",
+            "timestamp": ts,
+        })
+
+        ratio = max(0.1, ratio + rnd.gauss(0, 0.01))
+        long_account = ratio / (1 + ratio)
+        ls_rows.append({
+            "symbol": symbol,
+            "longShortRatio": f"{ratio:.4f}",
+            "longAccount": f"{long_account:.4f}",
+            "shortAccount": f"{1 - long_account:.4f}",
+            "timestamp": ts,
+        })
+    return klines, oi_rows, ls_rows
+
+
+def symbol_names(count: int):
+    """生成 count 个币种名称"""
+    return [f"SYM{i:04d}USDT" for i in range(count)]
+
+
+def record_payloads(symbols, bars: int, out_dir):
+    """从 Binance 获取真实数据并保存为 <out_dir>/<SYMBOL>.json"""
+    from data_fetcher import fetch_klines, fetch_open_interest, fetch_long_short_ratio
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for symbol in symbols:
+        payload = {
+            "klines": fetch_klines(symbol, limit=bars),
+            "oi": fetch_open_interest(symbol, limit=min(bars, 500)),
+            "ls": fetch_long_short_ratio(symbol, limit=min(bars, 500)),
+        }
+        (out_dir / f"{symbol}.json").write_text(json.dumps(payload), encoding='utf-8')
+        print(f"recorded {symbol}: {len(payload['klines'])} klines")
+
+
+def _shift(rows, delta: int, kline: bool):
+    if kline:
+        return [[row[0] + delta, *row[1:6], row[6] + delta, *row[7:]] for row in rows]
+    return [{**row, "timestamp": row["timestamp"] + delta} for row in rows]
+
+
+def load_payloads(symbol: str, bars: int, end_time_ms: int = END_TIME_MS, recorded_dir=None):
+    """
+    返回一个币种的三个接口数据，最后一根K线的开盘时间为 end_time_ms。
+    recorded_dir 中有该币种的录制样本时使用样本 (不足 bars 根时以样本为准)，否则生成数据。
+    """
+    path = Path(recorded_dir) / f"{symbol}.json" if recorded_dir else None
+    if path is None or not path.exists():
+        return generate_payloads(symbol, bars, end_time_ms)
+    payload = json.loads(path.read_text(encoding='utf-8'))
+    klines = payload["klines"][-bars:]
+    delta = end_time_ms - klines[-1][0]
+    return _shift(klines, delta, True), _shift(payload["oi"], delta, False), _shift(payload["ls"], delta, False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record real Binance payloads for the benchmarks")
+    parser.add_argument('--record', nargs='+', required=True, metavar='SYMBOL')
+    parser.add_argument('--bars', type=int, default=1500)
+    parser.add_argument('--out', type=Path, default=Path(__file__).parent / "recorded")
+    args = parser.parse_args()
+    record_payloads(args.record, args.bars, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+基准测试的计时、统计和结果存储。
+
+每个阶段先逐次计时得到延迟分布 (p50 / p99) 和吞吐量，再单独跑一遍并用
+tracemalloc 记录峰值内存 (tracemalloc 会拖慢执行，所以不与计时混在一起)。
+结果按提交保存为 benchmarks/results/<commit>.json，可以与任意一次结果对比。
+"""
+import gc
+import json
+import time
+import platform
+import subprocess
+import tracemalloc
+from pathlib import Path
+import numpy as np
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def measure_stage(func, iterations: int, items_per_call: int = 1, setup=None, warmup: int = 1):
+    """
+    调用 func() iterations 次，返回延迟分位数 (ms)、吞吐量 (items/s) 和峰值内存 (KiB)。
+    setup() 在每次调用前执行且不计时；它的返回值会传给 func。
+    """
+    def args():
+        return (setup(),) if setup else ()
+
+    for _ in range(warmup):
+        func(*args())
+
+    latencies = []
+    gc.collect()
+    for _ in range(iterations):
+        call_args = args()
+        start = time.perf_counter()
+        func(*call_args)
+        latencies.append(time.perf_counter() - start)
+
+    call_args = args()
+    tracemalloc.start()
+    func(*call_args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    total = latencies.sum()
+    return {
+        "iterations": iterations,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 4),
+        "mean_ms": round(float(latencies.mean()) * 1000, 4),
+        "throughput_per_s": round(iterations * items_per_call / total, 2) if total else 0.0,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def git_revision():
+    """当前提交的短哈希，工作区有未提交改动时加上 -dirty"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True).stdout.strip()
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(results: dict, path: Path = None):
+    revision = git_revision()
+    path = path or RESULTS_DIR / f"{revision}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "revision": revision,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    path.write_text(json.dumps(document, indent=2), encoding='utf-8')
+    return path
+
+
+def load_results(path) -> dict:
+    path = Path(path)
+    if not path.exists():
+        # 允许只写提交哈希
+        path = RESULTS_DIR / f"{path.name.removesuffix('.json')}.json"
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def print_results(results: dict):
+    print(f"{'stage':<72} {'p50 ms':>10} {'p99 ms':>10} {'items/s':>12} {'peak KiB':>10}")
+    for name, stats in results.items():
+        print(f"{name:<72} {stats['p50_ms']:>10.3f} {stats['p99_ms']:>10.3f} "
+              f"{stats['throughput_per_s']:>12.1f} {stats['peak_kib']:>10.1f}")
+
+
+def compare_results(baseline: dict, current: dict, tolerance: float = 0.10):
+    """打印两次结果的 p50 / 峰值内存变化，返回变慢超过 tolerance 的阶段列表"""
+    regressions = []
+    print(f"baseline {baseline['revision']} -> current {current['revision']}")
+    print(f"{'stage':<72} {'p50 ratio':>10} {'peak ratio':>11}")
+    for name, stats in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        p50_ratio = stats['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+        peak_ratio = stats['peak_kib'] / before['peak_kib'] if before['peak_kib'] else float('inf')
+        flag = ""
+        if p50_ratio > 1 + tolerance:
+            flag = "  <-- slower"
+            regressions.append(name)
+        print(f"{name:<72} {p50_ratio:>10.2f} {peak_ratio:>11.2f}{flag}")
+    return regressions
@@ -0,0 +1,109 @@
+"""
+本地 OpenAI 兼容接口模拟服务 (只实现 POST /v1/chat/completions)，供测试和基准测试使用。
+
+把 gemini.base_url 指向 base_url 即可让 AI 解读请求发往本地。每个请求的回复内容带有序号
+("analysis #1" ...)，便于区分是新请求还是复用的结果；latency_ms 模拟模型的响应时间，
+fail_requests 让接下来的若干个请求返回 500。
+
+用法 (在仓库根目录下):
+    python -m benchmarks.openai_stub --port 8766 --latency-ms 2000
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        status, payload = stub.respond(body)
+        self._send(status, payload)
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class OpenAIStubServer:
+    """在后台线程中运行的模拟服务；base_url 可直接作为 OpenAI 客户端的 base_url"""
+
+    def __init__(self, latency_ms: float = 0, host: str = '127.0.0.1', port: int = 0):
+        self.latency_seconds = latency_ms / 1000
+        # 接下来返回 500 的请求数
+        self.fail_requests = 0
+        # 收到的请求正文 (按到达顺序)
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="openai-stub", daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, body: dict):
+        with self._lock:
+            self.requests.append(body)
+            number = len(self.requests)
+            failed = self.fail_requests > 0
+            if failed:
+                self.fail_requests -= 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if failed:
+            return 500, {"error": {"message": "stub failure", "type": "server_error"}}
+        return 200, {
+            "id": f"chatcmpl-stub-{number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"analysis #{number}"}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency-ms', type=float, default=0, help="每个请求的响应时间")
+    args = parser.parse_args()
+
+    stub = OpenAIStubServer(args.latency_ms, args.host, args.port).start()
+    print(f"serving chat completions on {stub.base_url} (set gemini.base_url to this)")
+    try:
+        stub._thread.join()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
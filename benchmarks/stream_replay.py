@@ -0,0 +1,128 @@
+"""
+本地 Binance 合约 WebSocket 组合流模拟服务，回放录制的行情消息。
+
+录制文件为 StreamEngine 的 streaming.record_path 写出的 JSONL (每行一条组合流消息
+{"stream": ..., "data": ...})。客户端连接 /stream?streams=a/b/... 后，服务按录制顺序
+只发送它订阅的流的消息，发完后保持连接 (与真实服务一样不主动断开)。
+把 streaming.base_url 指向 base_url 即可让实时模式使用回放的行情。
+
+也可以用 kline_frames 从 REST 格式的K线生成消息，不需要真实录制。
+
+用法 (在仓库根目录下):
+    python -m benchmarks.stream_replay stream.jsonl --port 8765 --interval-ms 100
+"""
+import json
+import asyncio
+import argparse
+import threading
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+import websockets
+
+
+def load_recording(path):
+    """读取录制的 JSONL 文件，返回消息列表"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def kline_frames(symbol: str, klines, timeframe: str = "5m", ticks_per_bar: int = 2):
+    """
+    把 REST 格式的K线转换为组合流消息: 每根K线先发送 ticks_per_bar 条未收盘的更新，
+    最后一条为收盘消息 (x=true)。
+    """
+    stream = f"{symbol.lower()}@kline_{timeframe}"
+    frames = []
+    for row in klines:
+        for tick in range(ticks_per_bar + 1):
+            closed = tick == ticks_per_bar
+            frames.append({"stream": stream, "data": {
+                "e": "kline", "E": row[6] if closed else row[0] + tick, "s": symbol,
+                "k": {"t": row[0], "T": row[6], "s": symbol, "i": timeframe, "o": row[1], "h": row[2], "l": row[3],
+                      "c": row[4], "v": row[5], "n": row[8], "x": closed, "q": row[7], "V": row[9], "Q": row[10],
+                      "B": row[11]},
+            }})
+    return frames
+
+
+class StreamReplayServer:
+    """在后台线程中运行的回放服务；interval_ms 为相邻两条消息之间的间隔"""
+
+    def __init__(self, frames, interval_ms: float = 0, host: str = '127.0.0.1', port: int = 0):
+        self.frames = list(frames)
+        self.interval_seconds = interval_ms / 1000
+        self.host = host
+        self.port = port
+        # 已发送的消息数 (所有连接合计)
+        self.sent = 0
+        self.connections = 0
+        self._loop = None
+        self._stop = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stream-replay", daemon=True)
+
+    @property
+    def base_url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        # 客户端可能不回应关闭握手 (例如测试中直接结束事件循环)，停止时不必久等
+        async with websockets.serve(self._handle, self.host, self.port, close_timeout=0.1) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stop.wait()
+
+    async def _handle(self, websocket, path=None):
+        # 新版 websockets 的请求路径在 websocket.request 上，旧版作为第二个参数传入
+        request = getattr(websocket, 'request', None)
+        path = request.path if request is not None else path
+        streams = set(parse_qs(urlparse(path).query).get('streams', [''])[0].split('/'))
+        self.connections += 1
+        for frame in self.frames:
+            if frame.get('stream') not in streams:
+                continue
+            await websocket.send(json.dumps(frame))
+            self.sent += 1
+            if self.interval_seconds:
+                await asyncio.sleep(self.interval_seconds)
+        # 等到客户端断开或服务停止
+        closed = asyncio.ensure_future(websocket.wait_closed())
+        stopped = asyncio.ensure_future(self._stop.wait())
+        await asyncio.wait({closed, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        for task in (closed, stopped):
+            task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', type=Path, help="streaming.record_path 录制的 JSONL 文件")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--interval-ms', type=float, default=0, help="相邻两条消息之间的间隔")
+    args = parser.parse_args()
+
+    server = StreamReplayServer(load_recording(args.recording), args.interval_ms, args.host, args.port).start()
+    print(f"replaying {len(server.frames)} frames on {server.base_url} (set streaming.base_url to this)")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,15 @@ from pathlib import Path
 
 _config = None
 
+# 有 libyaml 时使用 C 实现的解析器，解析速度快约一个数量级
+_Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 def load_config():
     global _config
     if _config is None:
         config_path = Path(__file__).parent / "config.yaml"
         with open(config_path, 'r', encoding='utf-8') as f:
-            _config = yaml.safe_load(f)
+            _config = yaml.load(f, Loader=_Loader)
 
         # 优先从环境变量中读取敏感信息
         _config['binance']['api_key'] = os.getenv('BINANCE_API_KEY', _config['binance']['api_key'])
@@ -1,89 +1,102 @@
-import requests
 import pandas as pd
-from tenacity import retry, stop_after_attempt, wait_fixed, RetryError
+from tenacity import RetryError
 from config_loader import cfg
 from logger import log
+from frame_builder import build_frame
+from http_client import http_client
 
 BASE_URL = "https://fapi.binance.com"
 TIMEFRAME = cfg['trading']['timeframe']
 DATA_FETCH_LIMIT = cfg['trading']['data_fetch_limit']
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), reraise=True)
-def _make_request(url: str, params: dict):
-    """Makes a request with retry logic."""
-    response = requests.get(url, params=params)
-    response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-    return response.json()
+_INTERVAL_UNITS_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
 
+def interval_to_ms(interval: str) -> int:
+    """将 Binance 的时间周期字符串 (如 "5m", "1h") 转换为毫秒数"""
+    return int(interval[:-1]) * _INTERVAL_UNITS_MS[interval[-1]]
 
-def get_binance_data(symbol: str):
+def _klines_weight(limit: int) -> int:
+    """/fapi/v1/klines 的请求权重随 limit 变化"""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+def _make_request(url: str, params: dict, weight: int = 1):
+    """Makes a request through the shared HTTP client (pooled, rate-limited, with retries)."""
+    return http_client.get_json(url, params=params, weight=weight)
+
+
+def fetch_klines(symbol: str, start_time: int = None, limit: int = DATA_FETCH_LIMIT):
+    """获取K线原始数据 (价格, 成交量)"""
+    klines_url = f"{BASE_URL}/fapi/v1/klines"
+    params = {'symbol': symbol, 'interval': TIMEFRAME, 'limit': limit}
+    if start_time is not None:
+        params['startTime'] = start_time
+    return _make_request(klines_url, params=params, weight=_klines_weight(limit))
+
+
+def fetch_open_interest(symbol: str, start_time: int = None, limit: int = DATA_FETCH_LIMIT):
+    """获取持仓量 (OI) 历史原始数据"""
+    oi_url = f"{BASE_URL}/futures/data/openInterestHist"
+    oi_params = {'symbol': symbol, 'period': TIMEFRAME, 'limit': limit}
+    if start_time is not None:
+        oi_params['startTime'] = start_time
+    return _make_request(oi_url, params=oi_params)
+
+
+def fetch_long_short_ratio(symbol: str, start_time: int = None, limit: int = DATA_FETCH_LIMIT):
+    """获取多空比历史原始数据"""
+    ls_url = f"{BASE_URL}/futures/data/globalLongShortAccountRatio"
+    ls_params = {'symbol': symbol, 'period': TIMEFRAME, 'limit': limit}
+    if start_time is not None:
+        ls_params['startTime'] = start_time
+    return _make_request(ls_url, params=ls_params)
+
+
+def fetch_exchange_info():
+    """获取所有合约的交易规则和状态"""
+    return _make_request(f"{BASE_URL}/fapi/v1/exchangeInfo", params={}, weight=1)
+
+
+def fetch_24hr_tickers():
+    """一次请求获取所有合约的24小时行情统计 (不指定 symbol 时权重为 40)"""
+    return _make_request(f"{BASE_URL}/fapi/v1/ticker/24hr", params={}, weight=40)
+
+
+def build_dataframe(symbol: str, klines_data, oi_data=None, ls_data=None):
+    """将三个接口的原始数据合并为一个按时间对齐的 DataFrame"""
+    df = build_frame(klines_data, oi_data, ls_data)
+    if df.empty:
+        log.warning(f"No klines data returned for {symbol}")
+    return df
+
+
+def get_binance_data(symbol: str, limit: int = DATA_FETCH_LIMIT):
     """获取一个币种的所有相关数据：K-line, OI, L/S Ratio"""
     log.debug(f"Fetching data for {symbol}")
     try:
         # 1. 获取K线数据 (价格, 成交量)
-        klines_url = f"{BASE_URL}/fapi/v1/klines"
-        params = {'symbol': symbol, 'interval': TIMEFRAME, 'limit': DATA_FETCH_LIMIT}
-        klines_data = _make_request(klines_url, params=params)
-        
-        df = pd.DataFrame(klines_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
-        if df.empty:
-            log.warning(f"No klines data returned for {symbol}")
-            return pd.DataFrame()
-
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df.set_index('timestamp', inplace=True)
-        numeric_cols = ['open', 'high', 'low', 'close', 'volume', 'taker_buy_base_asset_volume']
-        df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric)
-
-        # 4. 计算 CVD (Cumulative Volume Delta)
-        volume_delta = df['taker_buy_base_asset_volume'] - (df['volume'] - df['taker_buy_base_asset_volume'])
-        df['cvd'] = volume_delta.cumsum()
-        
+        klines_data = fetch_klines(symbol, limit=limit)
+
         # 2. 获取持仓量 (OI)
-        oi_df = pd.DataFrame()
+        oi_data = None
         try:
-            oi_url = f"{BASE_URL}/futures/data/openInterestHist"
-            oi_params = {'symbol': symbol, 'period': TIMEFRAME, 'limit': DATA_FETCH_LIMIT}
-            oi_data = _make_request(oi_url, params=oi_params)
-            oi_df = pd.DataFrame(oi_data)
-            if not oi_df.empty:
-                oi_df['timestamp'] = pd.to_datetime(oi_df['timestamp'], unit='ms')
-                oi_df.set_index('timestamp', inplace=True)
-                df['oi'] = pd.to_numeric(oi_df['sumOpenInterestValue'])
+            oi_data = fetch_open_interest(symbol, limit=limit)
         except Exception as e:
             log.warning(f"Could not fetch Open Interest data for {symbol}: {e}")
 
         # 3. 获取多空比
-        ls_df = pd.DataFrame()
+        ls_data = None
         try:
-            ls_url = f"{BASE_URL}/futures/data/globalLongShortAccountRatio"
-            ls_params = {'symbol': symbol, 'period': TIMEFRAME, 'limit': DATA_FETCH_LIMIT}
-            ls_data = _make_request(ls_url, params=ls_params)
-            ls_df = pd.DataFrame(ls_data)
-            if not ls_df.empty:
-                ls_df['timestamp'] = pd.to_datetime(ls_df['timestamp'], unit='ms')
-                ls_df.set_index('timestamp', inplace=True)
-                df['ls_ratio'] = pd.to_numeric(ls_df['longShortRatio'])
+            ls_data = fetch_long_short_ratio(symbol, limit=limit)
         except Exception as e:
             log.warning(f"Could not fetch Long/Short Ratio data for {symbol}: {e}")
-        
-        # 数据对齐与填充
-        all_indices = df.index
-        if not oi_df.empty:
-            all_indices = all_indices.union(oi_df.index)
-        if not ls_df.empty:
-            all_indices = all_indices.union(ls_df.index)
-        
-        df = df.reindex(all_indices)
-        # Force conversion of all possible columns to numeric types to avoid interpolation warning
-        for col in df.columns:
-            try:
-                df[col] = pd.to_numeric(df[col])
-            except (ValueError, TypeError):
-                # This column cannot be converted to numeric, so we skip it.
-                pass
-        
-        df = df.interpolate(method='time').bfill().ffill()
+
+        df = build_dataframe(symbol, klines_data, oi_data, ls_data)
         log.debug(f"Successfully fetched and processed data for {symbol}")
         return df
 
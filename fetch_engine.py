@@ -0,0 +1,116 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from config_loader import cfg
+from logger import log
+from data_fetcher import fetch_klines, fetch_open_interest, fetch_long_short_ratio, build_dataframe
+from market_cache import MarketDataCache
+from market_archive import ColumnarArchive, ARCHIVE_ENABLED
+from metrics import span, stage_duration
+
+# --- 使用新的配置 ---
+FETCH_MAX_CONCURRENCY = cfg.get('fetch', {}).get('max_concurrency', 8)
+CACHE_ENABLED = cfg.get('cache', {}).get('enabled', True)
+
+# 每个币种需要请求的接口: (名称, 请求函数)
+ENDPOINTS = [
+    ("klines", fetch_klines),
+    ("oi", fetch_open_interest),
+    ("ls", fetch_long_short_ratio),
+]
+
+
+class FetchEngine:
+    """
+    并发获取多个币种的行情数据。
+
+    所有 币种×接口 的请求都会被提交到一个有界线程池中并行执行，
+    某个币种的三个接口全部返回后立即组装 DataFrame 并交给调用方，
+    这样一个周期的耗时取决于最慢的请求，而不是币种数量。
+
+    启用缓存时，每个接口只请求上次缓存之后的新数据。
+    """
+
+    def __init__(self, max_concurrency: int = FETCH_MAX_CONCURRENCY, cache: MarketDataCache = None):
+        self.max_concurrency = max(1, int(max_concurrency))
+        if cache is None and CACHE_ENABLED:
+            cache = MarketDataCache(archive=ColumnarArchive() if ARCHIVE_ENABLED else None)
+        self.cache = cache
+
+    def fetch_all(self, symbols, endpoints=None):
+        """
+        并发获取所有币种的数据，按完成顺序逐个产出 (symbol, df, elapsed)。
+        获取失败的币种产出一个空 DataFrame。
+
+        endpoints 为需要请求的接口名称 (默认全部)；其余接口直接使用缓存中的数据，
+        例如实时模式下 K 线已由 WebSocket 写入缓存，收盘时只需补齐 OI 和多空比。
+        """
+        symbols = list(symbols)
+        if not symbols:
+            return
+        skipped = [name for name, _ in ENDPOINTS if endpoints is not None and name not in endpoints]
+        requested = [(name, fetch_func) for name, fetch_func in ENDPOINTS if name not in skipped]
+        if skipped and self.cache is None:
+            raise ValueError("Fetching a subset of endpoints requires the market data cache.")
+
+        cycle_start = time.perf_counter()
+        started = {}
+        payloads = {symbol: {name: self.cache.rows(symbol, name) for name in skipped} for symbol in symbols}
+        remaining = {symbol: len(requested) for symbol in symbols}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="fetch") as executor:
+            futures = {}
+            for symbol in symbols:
+                started[symbol] = time.perf_counter()
+                for name, fetch_func in requested:
+                    params = self.cache.request_params(symbol, name) if self.cache else {}
+                    futures[executor.submit(fetch_func, symbol, **params)] = (symbol, name, params)
+
+            try:
+                for future in as_completed(futures):
+                    symbol, name, params = futures[future]
+                    try:
+                        rows = future.result()
+                        if self.cache:
+                            rows = self.cache.update(symbol, name, rows, params)
+                        payloads[symbol][name] = rows
+                    except Exception as e:
+                        payloads[symbol][name] = e
+                    remaining[symbol] -= 1
+                    if remaining[symbol] == 0:
+                        with span("build_frame"):
+                            df = self._assemble(symbol, payloads.pop(symbol))
+                        elapsed = time.perf_counter() - started[symbol]
+                        stage_duration.observe(elapsed, stage="fetch_symbol")
+                        log.info(f"{symbol} 数据就绪，耗时 {elapsed:.2f}s")
+                        yield symbol, df, elapsed
+            finally:
+                # 调用方提前退出时取消尚未开始的请求
+                for future in futures:
+                    future.cancel()
+
+        total = time.perf_counter() - cycle_start
+        stage_duration.observe(total, stage="fetch_all")
+        log.info(f"本轮共获取 {len(symbols)} 个币种数据，总耗时 {total:.2f}s")
+
+    def _assemble(self, symbol: str, payload: dict):
+        klines_data = payload.get("klines")
+        if isinstance(klines_data, Exception):
+            log.error(f"Error fetching klines for {symbol}: {klines_data}")
+            return pd.DataFrame()
+
+        oi_data = payload.get("oi")
+        if isinstance(oi_data, Exception):
+            log.warning(f"Could not fetch Open Interest data for {symbol}: {oi_data}")
+            oi_data = None
+
+        ls_data = payload.get("ls")
+        if isinstance(ls_data, Exception):
+            log.warning(f"Could not fetch Long/Short Ratio data for {symbol}: {ls_data}")
+            ls_data = None
+
+        try:
+            return build_dataframe(symbol, klines_data, oi_data, ls_data)
+        except Exception as e:
+            log.error(f"An unexpected error occurred while processing data for {symbol}: {e}", exc_info=True)
+            return pd.DataFrame()
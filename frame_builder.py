@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Binance /fapi/v1/klines 返回的每一行: 列名 -> (位置, 类型)
+KLINE_COLUMNS = {
+    'open': (1, np.float64),
+    'high': (2, np.float64),
+    'low': (3, np.float64),
+    'close': (4, np.float64),
+    'volume': (5, np.float64),
+    'close_time': (6, np.int64),
+    'quote_asset_volume': (7, np.float64),
+    'number_of_trades': (8, np.int64),
+    'taker_buy_base_asset_volume': (9, np.float64),
+    'taker_buy_quote_asset_volume': (10, np.float64),
+}
+
+
+def _parse_klines(klines_data):
+    """
+    把K线数组一次性解析到预分配的 float64 二维数组中，再按列切分并转换为各自的固定类型。
+    """
+    n = len(klines_data)
+    timestamps = np.fromiter((row[0] for row in klines_data), dtype=np.int64, count=n)
+    block = np.empty((n, 10), dtype=np.float64)
+    block[:] = [row[1:11] for row in klines_data]
+    columns = {}
+    for name, (pos, dtype) in KLINE_COLUMNS.items():
+        column = block[:, pos - 1]
+        columns[name] = column if dtype is np.float64 else column.astype(dtype)
+    return timestamps, columns
+
+
+def _parse_series(rows, value_key: str):
+    """解析 OI / 多空比 这类 [{timestamp, value}] 数据，返回按时间排序的两个数组"""
+    n = len(rows)
+    timestamps = np.fromiter((row['timestamp'] for row in rows), dtype=np.int64, count=n)
+    values = np.fromiter((float(row[value_key]) for row in rows), dtype=np.float64, count=n)
+    valid = ~np.isnan(values)
+    timestamps, values = timestamps[valid], values[valid]
+    if n > 1 and np.any(np.diff(timestamps) < 0):
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+    return timestamps, values
+
+
+def _align(target_timestamps, timestamps, values):
+    """
+    按时间把一个序列对齐到K线时间戳上：两端之间按时间线性插值，
+    超出范围的部分用最近的值填充 (等价于 interpolate(method='time').bfill().ffill())。
+    """
+    if len(timestamps) == 1:
+        return np.full(len(target_timestamps), values[0])
+    return np.interp(target_timestamps.astype(np.float64), timestamps.astype(np.float64), values)
+
+
+def build_frame(klines_data, oi_data=None, ls_data=None) -> pd.DataFrame:
+    """
+    将 Binance 返回的K线、持仓量和多空比原始数据构建为以K线时间为索引的 DataFrame。
+    所有列均为固定的 float64 / int64 类型，只有 oi / ls_ratio 两列需要插值。
+    """
+    if not klines_data:
+        return pd.DataFrame()
+
+    timestamps, columns = _parse_klines(klines_data)
+    if len(timestamps) > 1 and np.any(np.diff(timestamps) < 0):
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        columns = {name: column[order] for name, column in columns.items()}
+
+    # CVD (Cumulative Volume Delta)
+    taker_buy = columns['taker_buy_base_asset_volume']
+    columns['cvd'] = np.cumsum(taker_buy - (columns['volume'] - taker_buy))
+
+    if oi_data:
+        oi_timestamps, oi_values = _parse_series(oi_data, 'sumOpenInterestValue')
+        if len(oi_timestamps):
+            columns['oi'] = _align(timestamps, oi_timestamps, oi_values)
+    if ls_data:
+        ls_timestamps, ls_values = _parse_series(ls_data, 'longShortRatio')
+        if len(ls_timestamps):
+            columns['ls_ratio'] = _align(timestamps, ls_timestamps, ls_values)
+
+    index = pd.DatetimeIndex(timestamps.astype('datetime64[ms]').astype('datetime64[ns]'), name='timestamp')
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def closed_bars(df: pd.DataFrame, now_ms: int) -> pd.DataFrame:
+    """
+    去掉收盘时间不早于 now_ms 的K线 (仍在形成中的K线)。
+    Binance 的K线接口总是带上当前未收盘的那一根，刚过收盘时间时它几乎没有成交，不能用来判断信号。
+    """
+    if df.empty or 'close_time' not in df:
+        return df
+    closed = int(np.searchsorted(df['close_time'].to_numpy(), now_ms, side='left'))
+    return df if closed == len(df) else df.iloc[:closed]
+
+
+def bars_until(df: pd.DataFrame, open_ms: int) -> pd.DataFrame:
+    """只保留开盘时间不晚于 open_ms 的K线 (截止到指定的那一根)"""
+    if df.empty:
+        return df
+    end = int(df.index.searchsorted(pd.Timestamp(open_ms, unit='ms'), side='right'))
+    return df if end == len(df) else df.iloc[:end]
@@ -0,0 +1,190 @@
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception
+from config_loader import cfg
+from logger import log
+from metrics import Counter, Gauge, Histogram
+
+# --- 使用新的配置 ---
+_http_cfg = cfg.get('http', {})
+HTTP_CONNECT_TIMEOUT_SECONDS = _http_cfg.get('connect_timeout_seconds', 5)
+HTTP_READ_TIMEOUT_SECONDS = _http_cfg.get('read_timeout_seconds', 15)
+HTTP_POOL_MAXSIZE = _http_cfg.get('pool_maxsize', 16)
+HTTP_MAX_RETRIES = _http_cfg.get('max_retries', 3)
+HTTP_BACKOFF_MAX_SECONDS = _http_cfg.get('backoff_max_seconds', 30)
+BINANCE_WEIGHT_LIMIT_PER_MINUTE = _http_cfg.get('binance_weight_limit_per_minute', 2400)
+BINANCE_WEIGHT_SAFETY_RATIO = _http_cfg.get('binance_weight_safety_ratio', 0.8)
+
+# Binance 在响应头中返回当前分钟已使用的请求权重
+USED_WEIGHT_HEADER = 'X-MBX-USED-WEIGHT-1M'
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+http_request_duration = Histogram("bot_http_request_duration_seconds", "HTTP request latency per attempt", ["host", "endpoint"])
+http_responses = Counter("bot_http_responses_total", "HTTP responses by status code (\"error\" when no response)", ["host", "endpoint", "status"])
+http_retries = Counter("bot_http_retries_total", "HTTP request retries", ["host", "endpoint"])
+http_weight_requested = Counter("bot_http_weight_requested_total", "Request weight acquired from the limiter", ["host"])
+http_used_weight = Gauge("bot_http_used_weight", "Request weight used in the current minute, as reported by the server", ["host"])
+
+
+class WeightLimiter:
+    """
+    请求权重令牌桶。容量为每分钟权重上限 × 安全系数，按秒连续补充。
+    每次收到响应后用服务端返回的已用权重校正剩余令牌，
+    收到 429 / 418 时在 Retry-After 指定的时间内暂停所有请求。
+    """
+
+    def __init__(self, limit_per_minute: int = BINANCE_WEIGHT_LIMIT_PER_MINUTE,
+                 safety_ratio: float = BINANCE_WEIGHT_SAFETY_RATIO):
+        self.capacity = limit_per_minute * safety_ratio
+        self.refill_per_second = self.capacity / 60
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.used_weight = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def acquire(self, weight: int = 1):
+        """阻塞直到有足够的权重可用"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= weight:
+                    self._tokens -= weight
+                    return
+                else:
+                    wait = (weight - self._tokens) / self.refill_per_second
+            log.debug(f"请求权重不足，等待 {wait:.2f}s")
+            time.sleep(wait)
+
+    def observe(self, used_weight: int):
+        """根据服务端返回的本分钟已用权重校正令牌数"""
+        with self._lock:
+            self.used_weight = used_weight
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, self.capacity - used_weight)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _retry_after_seconds(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code in RETRYABLE_STATUS_CODES
+    if isinstance(exc, requests.ReadTimeout):
+        # 读超时时请求可能已被处理，只重试幂等的 GET 请求，避免重复发送告警
+        return exc.request is not None and exc.request.method == "GET"
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+class _WaitRetryAfter:
+    """带抖动的指数退避；如果服务端返回了 Retry-After 则以它为准"""
+
+    def __init__(self):
+        self._backoff = wait_random_exponential(multiplier=0.5, max=HTTP_BACKOFF_MAX_SECONDS)
+
+    def __call__(self, retry_state):
+        exc = retry_state.outcome.exception()
+        if isinstance(exc, requests.HTTPError) and exc.response is not None:
+            retry_after = _retry_after_seconds(exc.response)
+            if retry_after is not None:
+                return retry_after + random.uniform(0, 1)
+        return self._backoff(retry_state)
+
+
+def _count_retry(retry_state):
+    url = retry_state.args[2]
+    parts = urlsplit(url)
+    http_retries.inc(host=parts.netloc, endpoint=parts.path)
+
+
+class HttpClient:
+    """
+    共享的 HTTP 客户端：每个主机一个带连接池的 keep-alive 会话，统一的超时设置，
+    Binance 主机的请求在发送前经过权重令牌桶限流。
+    """
+
+    def __init__(self, pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                 timeout=(HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS)):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self._sessions = {}
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def _session(self, host: str) -> requests.Session:
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def limiter(self, host: str) -> WeightLimiter:
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = WeightLimiter()
+            return self._limiters[host]
+
+    @retry(stop=stop_after_attempt(HTTP_MAX_RETRIES), wait=_WaitRetryAfter(),
+           retry=retry_if_exception(_is_retryable), before_sleep=_count_retry, reraise=True)
+    def _send(self, method: str, url: str, weight: int, **kwargs):
+        parts = urlsplit(url)
+        host = parts.netloc
+        limiter = self.limiter(host) if weight else None
+        if limiter:
+            limiter.acquire(weight)
+            http_weight_requested.inc(weight, host=host)
+
+        start = time.perf_counter()
+        try:
+            response = self._session(host).request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            http_responses.inc(host=host, endpoint=parts.path, status="error")
+            raise
+        finally:
+            http_request_duration.observe(time.perf_counter() - start, host=host, endpoint=parts.path)
+        http_responses.inc(host=host, endpoint=parts.path, status=response.status_code)
+
+        used_weight = response.headers.get(USED_WEIGHT_HEADER)
+        if used_weight is not None:
+            self.limiter(host).observe(int(used_weight))
+            http_used_weight.set(int(used_weight), host=host)
+        if response.status_code in (418, 429):
+            retry_after = _retry_after_seconds(response) or 60
+            log.warning(f"{host} 返回 {response.status_code}，暂停请求 {retry_after:.0f}s")
+            self.limiter(host).pause(retry_after)
+        response.raise_for_status()
+        return response
+
+    def get_json(self, url: str, params: dict = None, weight: int = 1):
+        """发送 GET 请求并返回 JSON。weight 为该请求在 Binance 的权重，0 表示不限流"""
+        return self._send("GET", url, weight, params=params).json()
+
+    def post(self, url: str, weight: int = 0, **kwargs):
+        return self._send("POST", url, weight, **kwargs)
+
+
+# 全局共享的 HTTP 客户端
+http_client = HttpClient()
@@ -1,117 +1,232 @@
+from functools import cached_property
 import pandas as pd
-import pandas_ta as ta
 from config_loader import cfg
+from metrics import span
+from signals import Signal
+from rolling_stats import SeriesZScoreTracker, ExponentialMovingAverage, RelativeStrengthIndex, rolling_z_score
 
 # --- 使用新的配置 ---
+BASE_TIMEFRAME = cfg['trading']['timeframe']
 VOLUME_LOOKBACK_PERIOD = cfg['trading']['volume_lookback_period']
 LS_RATIO_LOOKBACK_PERIOD = cfg['trading']['ls_ratio_lookback_period']
 THRESHOLDS = cfg['trading']['thresholds']
+# 由基础周期聚合得到的更高周期，以及各自的回看周期和阈值
+TIMEFRAME_SETTINGS = cfg['trading'].get('timeframes') or {}
 
-def _create_market_snapshot(df: pd.DataFrame, primary_signal: dict):
+class TechnicalIndicatorState:
     """
-    创建一个包含主要信号和市场背景快照的丰富数据包。
+    某个币种的 RSI / EMA 增量状态。只有已收盘的K线会被写入状态，
+    最后一根 (可能仍在形成中的) K线通过 peek 计算，不会污染状态。
     """
-    # 1. 提取最近16条K线数据
-    recent_klines = df.tail(16).copy()
-    klines_data = recent_klines[['open', 'high', 'low', 'close', 'volume']].to_dict(orient='records')
-
-    # 2. 提取关键指标的最新值
-    latest_indicators = df.tail(1).copy()
-    context_indicators = {
-        "oi": f"${latest_indicators['oi'].iloc[0]:,.0f}" if 'oi' in latest_indicators else "N/A",
-        "price": f"{latest_indicators['close'].iloc[0]:.2f}",
-        "volume": f"{latest_indicators['volume'].iloc[0]:,.0f}",
-        "cvd": f"{latest_indicators['cvd'].iloc[0]:,.0f}" if 'cvd' in latest_indicators else "N/A",
-        "long_short_ratio": f"{latest_indicators['ls_ratio'].iloc[0]:.3f}" if 'ls_ratio' in latest_indicators else "N/A"
-    }
-    
-    # 3. 计算额外的技术指标 (RSI, EMA)
-    df.ta.rsi(length=14, append=True)
-    df.ta.ema(length=12, append=True)
-    df.ta.ema(length=26, append=True)
-    
-    latest_tech_indicators = df.tail(1)
-    tech_indicators = {
-        "rsi_14": f"{latest_tech_indicators.get('RSI_14', pd.Series([pd.NA])).iloc[0]:.2f}",
-        "ema_12": f"{latest_tech_indicators.get('EMA_12', pd.Series([pd.NA])).iloc[0]:.2f}",
-        "ema_26": f"{latest_tech_indicators.get('EMA_26', pd.Series([pd.NA])).iloc[0]:.2f}",
-    }
-
-    return {
-        "primary_signal": primary_signal,
-        "market_context": {
-            "recent_klines": klines_data,
-            "key_indicators": context_indicators,
-            "technical_indicators": tech_indicators
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.rsi_14 = RelativeStrengthIndex(14)
+        self.ema_12 = ExponentialMovingAverage(12)
+        self.ema_26 = ExponentialMovingAverage(26)
+        self.last_committed = None
+
+    def latest(self, df: pd.DataFrame):
+        closes = df['close'].to_numpy(dtype=float)
+        timestamps = df.index
+
+        start = 0
+        if self.last_committed is not None:
+            pos = timestamps.searchsorted(self.last_committed)
+            if pos < len(timestamps) and timestamps[pos] == self.last_committed:
+                start = pos + 1
+            else:
+                # 数据不连续，用当前数据重新初始化
+                self._reset()
+
+        for i in range(start, len(closes) - 1):
+            self.rsi_14.update(closes[i])
+            self.ema_12.update(closes[i])
+            self.ema_26.update(closes[i])
+        if start < len(closes) - 1:
+            self.last_committed = timestamps[-2]
+
+        last_close = closes[-1]
+        return {
+            "rsi_14": self.rsi_14.peek(last_close),
+            "ema_12": self.ema_12.peek(last_close),
+            "ema_26": self.ema_26.peek(last_close),
         }
-    }
+
+class MarketSnapshot:
+    """
+    一个币种在某根K线上的市场背景快照。各部分只在首次用到时计算一次，
+    同一周期内多个指标同时触发时共享同一个快照。
+    """
+    def __init__(self, df: pd.DataFrame, indicator_state: TechnicalIndicatorState):
+        self.df = df
+        self._indicator_state = indicator_state
+
+    @cached_property
+    def recent_klines(self):
+        # 最近16条K线数据
+        return self.df[['open', 'high', 'low', 'close', 'volume']].tail(16).to_dict(orient='records')
+
+    @cached_property
+    def key_indicators(self):
+        # 关键指标的最新值 (缺少的列为 None)
+        latest = self.df.iloc[-1]
+        return {
+            "oi": float(latest['oi']) if 'oi' in latest else None,
+            "price": float(latest['close']),
+            "volume": float(latest['volume']),
+            "cvd": float(latest['cvd']) if 'cvd' in latest else None,
+            "long_short_ratio": float(latest['ls_ratio']) if 'ls_ratio' in latest else None
+        }
+
+    @cached_property
+    def technical_indicators(self):
+        # 额外的技术指标 (RSI, EMA)，基于增量状态计算
+        return self._indicator_state.latest(self.df)
+
+class MarketSnapshotCache:
+    """按 币种+周期 缓存最新一根K线的快照，以最后一根K线的时间戳和数据帧本身作为失效依据"""
+    def __init__(self):
+        self._snapshots = {}
+        self._indicator_states = {}
+
+    def get(self, symbol: str, df: pd.DataFrame, timeframe: str = BASE_TIMEFRAME) -> MarketSnapshot:
+        key = (symbol, timeframe)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None or snapshot.df is not df or snapshot.df.index[-1] != df.index[-1]:
+            state = self._indicator_states.setdefault(key, TechnicalIndicatorState())
+            snapshot = self._snapshots[key] = MarketSnapshot(df, state)
+        return snapshot
+
+    def drop(self, symbol: str):
+        for key in [key for key in self._indicator_states if key[0] == symbol]:
+            self._snapshots.pop(key, None)
+            self._indicator_states.pop(key, None)
+
+    def export_state(self) -> dict:
+        # 快照本身引用数据帧，只保存 RSI / EMA 的增量状态
+        return dict(self._indicator_states)
+
+    def restore_state(self, state: dict):
+        self._indicator_states.update(state)
+
+snapshot_cache = MarketSnapshotCache()
+
+def _create_market_snapshot(symbol: str, df: pd.DataFrame, timeframe: str = BASE_TIMEFRAME) -> MarketSnapshot:
+    """
+    获取信号的市场背景快照。技术指标依赖按币种共享的增量状态，在检查线程中
+    立即计算；其余部分只读取数据帧，可以在告警线程中按需计算。
+    """
+    with span("snapshot"):
+        snapshot = snapshot_cache.get(symbol, df, timeframe)
+        snapshot.technical_indicators
+        return snapshot
 
 def calculate_z_score(series: pd.Series, lookback: int):
-    """计算 Z-Score"""
-    mean = series.rolling(window=lookback, min_periods=lookback // 2).mean()
-    std = series.rolling(window=lookback, min_periods=lookback // 2).std()
-    # Avoid division by zero
-    std[std == 0] = 1
-    return (series - mean) / std
-
-class VolumeSignal:
+    """计算整个序列的 Z-Score (向量化批量计算，用于回填历史数据)"""
+    return pd.Series(rolling_z_score(series.to_numpy(dtype=float), lookback), index=series.index)
+
+class BaseSignal:
+    """
+    指标检查器的公共部分：所属周期、回看周期和阈值 (未指定的阈值沿用全局配置)，
+    以及每个币种一个的增量 Z-Score 跟踪器，每根新K线只需 O(1) 更新。
+    """
+    indicator = None
+
+    def __init__(self, timeframe: str = BASE_TIMEFRAME, lookback: int = None, thresholds: dict = None):
+        self.timeframe = timeframe
+        self.lookback = lookback
+        self.thresholds = {**THRESHOLDS, **(thresholds or {})}
+        self._trackers = {}
+
+    def _latest_z_score(self, symbol: str, series: pd.Series):
+        tracker = self._trackers.get(symbol)
+        if tracker is None:
+            tracker = self._trackers[symbol] = SeriesZScoreTracker(self.lookback)
+        return tracker.update_series(series)
+
+    def drop(self, symbol: str):
+        self._trackers.pop(symbol, None)
+
+    def export_state(self) -> dict:
+        return dict(self._trackers)
+
+    def restore_state(self, state: dict):
+        self._trackers.update(state)
+
+    def _create_signal(self, symbol: str, df: pd.DataFrame, signal_type: str, **fields):
+        return Signal(symbol, self.timeframe, self.indicator, signal_type,
+                      context=_create_market_snapshot(symbol, df, self.timeframe), **fields)
+
+class VolumeSignal(BaseSignal):
+    indicator = "Volume"
+
+    def __init__(self, timeframe: str = BASE_TIMEFRAME, lookback: int = VOLUME_LOOKBACK_PERIOD, thresholds: dict = None):
+        super().__init__(timeframe, lookback, thresholds)
+
     def check(self, df: pd.DataFrame, symbol: str):
-        df['volume_z_score'] = calculate_z_score(df['volume'], VOLUME_LOOKBACK_PERIOD)
+        volume_z_score = self._latest_z_score(symbol, df['volume'])
         latest = df.iloc[-1]
         
-        volume_z_score_threshold = THRESHOLDS['volume_z_score']
+        volume_z_score_threshold = self.thresholds['volume_z_score']
         
-        if pd.notna(latest['volume_z_score']) and abs(latest['volume_z_score']) > volume_z_score_threshold:
-            signal = {
-                "indicator": "Volume",
-                "signal_type": "Spike Alert",
-                "value": f"{latest['volume']:,.0f}",
-                "z_score": f"{latest['volume_z_score']:.2f}",
-                "price_change": f"{(latest['close']/df.iloc[-2]['close'] - 1):.2%}"
-            }
-            return _create_market_snapshot(df, signal)
+        if pd.notna(volume_z_score) and abs(volume_z_score) > volume_z_score_threshold:
+            return self._create_signal(symbol, df, "Spike Alert",
+                                       value=float(latest['volume']),
+                                       z_score=float(volume_z_score),
+                                       price_change=float(latest['close'] / df.iloc[-2]['close'] - 1))
         return None
 
-class OpenInterestSignal:
+class OpenInterestSignal(BaseSignal):
+    indicator = "Open Interest"
+
     def check(self, df: pd.DataFrame, symbol: str):
         if 'oi' not in df.columns or df['oi'].isnull().all():
             return None
             
         latest = df.iloc[-1]
-        oi_sudden_change_threshold = THRESHOLDS['oi_sudden_change']
+        oi_sudden_change_threshold = self.thresholds['oi_sudden_change']
         
         # 突然剧烈变化
         oi_pct_change = df['oi'].pct_change()
         if pd.notna(oi_pct_change.iloc[-1]) and abs(oi_pct_change.iloc[-1]) > oi_sudden_change_threshold:
-            signal = {
-                "indicator": "Open Interest",
-                "signal_type": "Sudden Change Alert",
-                "value": f"${latest['oi']:,.0f}",
-                "change_1_period": f"{oi_pct_change.iloc[-1]:+.2%}",
-                "price": f"{latest['close']:.2f}"
-            }
-            return _create_market_snapshot(df, signal)
+            return self._create_signal(symbol, df, "Sudden Change Alert",
+                                       value=float(latest['oi']),
+                                       change=float(oi_pct_change.iloc[-1]),
+                                       price=float(latest['close']))
             
         return None
 
-class LSRatioSignal:
+class LSRatioSignal(BaseSignal):
+    indicator = "Long/Short Ratio"
+
+    def __init__(self, timeframe: str = BASE_TIMEFRAME, lookback: int = LS_RATIO_LOOKBACK_PERIOD, thresholds: dict = None):
+        super().__init__(timeframe, lookback, thresholds)
+
     def check(self, df: pd.DataFrame, symbol: str):
         if 'ls_ratio' not in df.columns or df['ls_ratio'].isnull().all():
             return None
 
-        df['ls_z_score'] = calculate_z_score(df['ls_ratio'], LS_RATIO_LOOKBACK_PERIOD)
+        ls_z_score = self._latest_z_score(symbol, df['ls_ratio'])
         latest = df.iloc[-1]
         
-        ls_ratio_z_score_threshold = THRESHOLDS['ls_ratio_z_score']
+        ls_ratio_z_score_threshold = self.thresholds['ls_ratio_z_score']
         
-        if pd.notna(latest['ls_z_score']) and abs(latest['ls_z_score']) > ls_ratio_z_score_threshold:
-            sentiment = "Extremely Bullish (Contrarian Bearish)" if latest['ls_z_score'] > 0 else "Extremely Bearish (Contrarian Bullish)"
-            signal = {
-                "indicator": "Long/Short Ratio",
-                "signal_type": "Sentiment Extreme Alert",
-                "value": f"{latest['ls_ratio']:.3f}",
-                "z_score": f"{latest['ls_z_score']:.2f}",
-                "sentiment": sentiment
-            }
-            return _create_market_snapshot(df, signal)
+        if pd.notna(ls_z_score) and abs(ls_z_score) > ls_ratio_z_score_threshold:
+            sentiment = "Extremely Bullish (Contrarian Bearish)" if ls_z_score > 0 else "Extremely Bearish (Contrarian Bullish)"
+            return self._create_signal(symbol, df, "Sentiment Extreme Alert",
+                                       value=float(latest['ls_ratio']),
+                                       z_score=float(ls_z_score),
+                                       sentiment=sentiment)
         return None
+
+def create_checkers(timeframe: str = BASE_TIMEFRAME):
+    """按周期配置创建一组指标检查器；更高周期未配置的参数沿用基础周期的设置"""
+    settings = {} if timeframe == BASE_TIMEFRAME else (TIMEFRAME_SETTINGS.get(timeframe) or {})
+    thresholds = settings.get('thresholds')
+    return [
+        VolumeSignal(timeframe, settings.get('volume_lookback_period', VOLUME_LOOKBACK_PERIOD), thresholds),
+        OpenInterestSignal(timeframe, thresholds=thresholds),
+        LSRatioSignal(timeframe, settings.get('ls_ratio_lookback_period', LS_RATIO_LOOKBACK_PERIOD), thresholds),
+    ]
@@ -19,6 +19,7 @@ logger.add(
     rotation="10 MB", # Rotate log file when it reaches 10 MB
     retention="7 days", # Keep logs for 7 days
     compression="zip", # Compress rotated files
+    delay=True, # Open the file on the first message instead of at import time
     serialize=True # IMPORTANT: This enables structured (JSON) logging
 )
 
@@ -1,65 +1,440 @@
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, message=".*pkg_resources is deprecated.*")
 
+# 最先导入，之后所有模块的导入时间都计入启动耗时
+from startup import startup_profile
 import time
-import schedule
+import atexit
+from contextlib import nullcontext
 from logger import log # 导入 log
 from config_loader import cfg
-from data_fetcher import get_binance_data
-from indicators import VolumeSignal, OpenInterestSignal, LSRatioSignal
-from ai_interpreter import get_gemini_interpretation
-from alerter import send_lark_alert
+from fetch_engine import FetchEngine
+from frame_builder import closed_bars
+from indicators import TIMEFRAME_SETTINGS, create_checkers, snapshot_cache
+from resampler import TimeframeResampler
+from batch_scan import scan_universe
+from alert_dispatcher import AlertDispatcher
 from state_manager import SignalStateManager
+from sharding import SHARDING_ENABLED, SHARDING_WORKER_ID_CONFIGURED, ShardCoordinator, create_backend
+from universe import UniverseManager
+from prefilter import PREFILTER_ENABLED, TickerPrefilter
+from process_pool import PROCESS_POOL_ENABLED, SharedMemoryPool
+from market_structure import MARKET_STRUCTURE_ENABLED, MarketStructure
+from warm_state import WARM_STATE_ENABLED, WARM_STATE_PATH, WarmStateStore
+from ai_interpreter import preload_client
+from scheduler import CycleBudget, CycleScheduler, aligned_interval_seconds, deferred_symbols
+from metrics import METRICS_ENABLED, Counter, Gauge, Histogram, span, start_metrics_server
+startup_profile.mark("imports")
 
 # --- 使用新的配置 ---
 symbols_to_check = cfg['trading']['symbols']
 timeframe = cfg['trading']['timeframe']
-check_interval_minutes = cfg['schedule']['check_interval_minutes']
+streaming_enabled = cfg.get('streaming', {}).get('enabled', False)
+scan_mode = cfg.get('scan', {}).get('mode', 'per_symbol')
+# 检查间隔取整为K线周期的整数倍，每轮在K线收盘后运行
+cycle_interval_seconds = aligned_interval_seconds()
 
-# 初始化状态管理器
-state_manager = SignalStateManager()
+# --- 运行时组件 ---
+# 由 setup() 创建，导入本模块时不创建任何组件: 进程池以 spawn 方式启动的子进程会把本文件
+# 作为 __mp_main__ 重新导入，如果导入时就打开状态文件、启动后台线程，子进程退出时会用
+# 过期的内存状态压缩 bot_state.json，丢掉主进程写入的去重记录。
+alert_dispatcher = None
+fetch_engine = None
+universe_manager = None
+coordinator = None
+state_manager = None
+prefilter = None
+market_structure = None
+warm_state = None
+# 批量扫描使用的进程池 (在 main() 中按配置创建)
+process_pool = None
+indicator_checkers = []
+timeframe_pipelines = []
 
-def run_check():
-    log.info(f"开始执行检查，目标币种: {', '.join(symbols_to_check)}...")
-    
+def setup():
+    """创建告警队列、数据获取引擎、状态存储等运行时组件；只在主进程中调用一次"""
+    global alert_dispatcher, fetch_engine, universe_manager, coordinator, state_manager, prefilter
+    global market_structure, warm_state, indicator_checkers, timeframe_pipelines
+    # 初始化告警分发队列 (AI 解读和发送在后台线程中完成)
+    alert_dispatcher = AlertDispatcher(timeframe)
+    # 初始化并发数据获取引擎
+    fetch_engine = FetchEngine()
+    # 币种列表: 配置中的币种固定监控，启用自动发现时再加上成交额排名靠前的永续合约
+    universe_manager = UniverseManager(fetch_engine, pinned=symbols_to_check, on_remove=lambda symbols: release_symbols(symbols))
+    # 分片模式下多个进程按币种分工，去重状态和币种列表通过协调后端共享
+    coordinator = ShardCoordinator(create_backend(), universe_source=universe_manager.symbols) if SHARDING_ENABLED else None
+    # 初始化状态管理器
+    state_manager = SignalStateManager(store=coordinator.backend if coordinator else None)
+    # 启用预筛选时，每轮先用一次全市场 ticker 请求筛出有异动的币种，只对它们做完整的获取和检查
+    prefilter = TickerPrefilter() if PREFILTER_ENABLED else None
+    # 跨币种的滚动相关矩阵；启用时一轮内触发的告警先汇总，相关币种同时触发时合并为一条市场整体告警
+    market_structure = MarketStructure() if MARKET_STRUCTURE_ENABLED else None
+    # 热启动快照: 定期和退出时保存行情缓存及指标状态，启动时恢复后只补齐缺少的K线 (分片时每个进程一个文件)
+    warm_state = None
+    if WARM_STATE_ENABLED:
+        if coordinator and not SHARDING_WORKER_ID_CONFIGURED:
+            # 默认的 <hostname>-<pid> 每次启动都不同，重启后的进程找不到自己的快照
+            raise ValueError("warm_state in sharded mode requires a stable worker id: set SHARD_WORKER_ID or sharding.worker_id.")
+        warm_state = WarmStateStore(f"{WARM_STATE_PATH}.{coordinator.worker_id}" if coordinator else WARM_STATE_PATH)
     # 初始化所有指标检查器
-    indicator_checkers = [VolumeSignal(), OpenInterestSignal(), LSRatioSignal()]
+    indicator_checkers = create_checkers()
+    # 由基础周期数据聚合得到的更高周期，每个周期一个聚合器和一组检查器
+    timeframe_pipelines = [(TimeframeResampler(tf), create_checkers(tf)) for tf in TIMEFRAME_SETTINGS]
+    startup_profile.mark("setup")
+
+# --- 检查周期指标 ---
+cycle_duration = Histogram("bot_cycle_duration_seconds", "Duration of a full run_check cycle",
+                           buckets=(1, 5, 10, 30, 60, 120, 300, 600, 900))
+cycle_overruns = Counter("bot_cycle_overruns_total", "Cycles that took longer than the check interval")
+cycle_symbols = Gauge("bot_cycle_symbols", "Symbols checked in the last cycle")
+last_cycle_timestamp = Gauge("bot_last_cycle_timestamp_seconds", "Unix time at which the last cycle finished")
+# 上一轮因时间预算用完而未完成检查的币种
+deferred = []
+# 本轮允许发送、等待聚类的告警 {symbol: [(signal, previous_signal), ...]}
+pending_alerts = {}
+
+def timeframe_frames(symbol, df):
+    """返回 (DataFrame, 检查器列表) 列表：基础周期在前，之后是各更高周期的聚合数据"""
+    frames = [(df, indicator_checkers)]
+    for resampler, checkers in timeframe_pipelines:
+        frames.append((resampler.update(symbol, df), checkers))
+    return frames
+
+def evaluate_symbol(symbol, df):
+    """对单个币种的基础周期及所有更高周期数据运行指标检查器，并把需要发送的信号交给告警队列"""
+    to_send = []
+    with span("evaluate"):
+        if market_structure is not None:
+            market_structure.update(symbol, df)
+        for frame, checkers in timeframe_frames(symbol, df):
+            if len(frame) > 1:
+                to_send += _check_frame(symbol, frame, checkers)
+    submit_alerts(symbol, to_send)
+
+def submit_alerts(symbol, to_send):
+    """未启用市场结构聚类时直接交给告警队列，否则留到本轮结束时由 flush_alerts 统一聚类"""
+    if not to_send:
+        return
+    if market_structure is None:
+        # AI 解读和发送由后台线程完成，不阻塞后续币种的检查
+        alert_dispatcher.submit(symbol, to_send)
+    else:
+        pending_alerts.setdefault(symbol, []).extend(to_send)
+
+def flush_alerts(universe_size=0):
+    """一轮 (或一批同时收盘的K线) 检查结束: 更新相关矩阵，把本轮的告警聚类后交给告警队列"""
+    global pending_alerts
+    if market_structure is None:
+        return
+    market_structure.commit()
+    alerts, pending_alerts = pending_alerts, {}
+    if alerts:
+        with span("cluster"):
+            clusters = market_structure.cluster(alerts, universe_size)
+        alert_dispatcher.submit_clusters(clusters)
+
+def _check_frame(symbol, df, checkers):
+    to_send = []
+    for checker in checkers:
+        with span("check"):
+            signal = checker.check(df, symbol)
+        if signal:
+            # 发现信号时，使用 warning 级别记录，以便引起注意
+            log.warning(f"为 {symbol} 找到潜在信号: {signal}")
+            
+            # 检查是否应该发送警报
+            with span("dedup"):
+                should_send, prev_signal = state_manager.should_send_alert(symbol, signal)
+            if should_send:
+                to_send.append((signal, prev_signal))
+    return to_send
+
+def all_checkers():
+    return indicator_checkers + [checker for _, checkers in timeframe_pipelines for checker in checkers]
+
+def warm_state_components():
+    """
+    热启动快照中保存的各组件状态。收集期间持有行情缓存的锁: 实时模式下行情流线程
+    (以及后台预热) 不能在此期间写入缓存，导出的缓存副本与指标状态对应同一时刻。
+    指标状态只在检查线程中修改，快照也在检查线程中保存 (退出时先停止检查线程)。
+    """
+    cache = fetch_engine.cache
+    with cache.locked() if cache is not None else nullcontext():
+        return _collect_components()
+
+def _collect_components():
+    components = {
+        "checkers": {(checker.timeframe, checker.indicator): checker.export_state() for checker in all_checkers()},
+        "resamplers": {resampler.timeframe: resampler.export_state() for resampler, _ in timeframe_pipelines},
+        "indicator_states": snapshot_cache.export_state(),
+    }
+    if fetch_engine.cache is not None:
+        components["cache"] = fetch_engine.cache.export_state()
+    if market_structure is not None:
+        components["market_structure"] = market_structure.export_state()
+    if prefilter is not None:
+        components["prefilter"] = prefilter.export_state()
+    return components
+
+def save_warm_state():
+    if warm_state is not None:
+        warm_state.save(warm_state_components())
+
+def restore_warm_state():
+    """
+    恢复热启动快照，之后的第一轮检查只补齐快照之后缺少的K线。
+    快照中已不在本进程检查范围内的币种会被释放。返回是否恢复成功。
+    """
+    components = warm_state.load() if warm_state is not None else None
+    if not components:
+        return False
+    checkers = {(checker.timeframe, checker.indicator): checker for checker in all_checkers()}
+    for key, state in components.get("checkers", {}).items():
+        if key in checkers:
+            checkers[key].restore_state(state)
+    resamplers = {resampler.timeframe: resampler for resampler, _ in timeframe_pipelines}
+    for timeframe, state in components.get("resamplers", {}).items():
+        if timeframe in resamplers:
+            resamplers[timeframe].restore_state(state)
+    snapshot_cache.restore_state(components.get("indicator_states", {}))
+    if fetch_engine.cache is not None and "cache" in components:
+        fetch_engine.cache.restore_state(components["cache"])
+    if market_structure is not None and "market_structure" in components:
+        market_structure.restore_state(components["market_structure"])
+    if prefilter is not None and "prefilter" in components:
+        prefilter.restore_state(components["prefilter"])
+
+    restored = {symbol for symbol, _ in components.get("cache", {})}
+    wanted = set(coordinator.owned(universe()) if coordinator else universe())
+    if restored - wanted:
+        release_symbols(restored - wanted)
+    log.info(f"已从热启动快照恢复 {len(restored & wanted)} 个币种的状态。")
+    return True
+
+def universe():
+    """全部监控的币种 (分片模式下使用 leader 发布的列表)"""
+    if coordinator:
+        return coordinator.universe(universe_manager.symbols())
+    return universe_manager.symbols()
+
+def active_symbols():
+    """本进程负责检查且已完成预热的币种"""
+    symbols = universe()
+    if coordinator:
+        symbols = coordinator.owned(symbols)
+    return universe_manager.sync(symbols)
+
+def release_symbols(symbols):
+    """币种不再由本进程检查时，释放它的行情缓存和指标状态"""
+    for symbol in symbols:
+        if fetch_engine.cache is not None:
+            fetch_engine.cache.drop(symbol)
+        snapshot_cache.drop(symbol)
+        if prefilter is not None:
+            prefilter.drop(symbol)
+        if market_structure is not None:
+            market_structure.drop(symbol)
+        for resampler, checkers in timeframe_pipelines:
+            resampler.drop(symbol)
+        for checker in all_checkers():
+            checker.drop(symbol)
+    log.info(f"已释放 {len(symbols)} 个币种的数据: {', '.join(sorted(symbols))}")
+
+def _fetch_within_budget(symbols, budget):
+    """
+    按完成顺序产出 (symbol, df, elapsed)；fetch 预算用完后停止获取 (未开始的请求会被取消)。
+    df 只包含已收盘的K线: 调度在收盘后几秒运行，接口返回的最后一根是刚开始的新K线，
+    检查的应是刚收盘的那一根。
+    """
+    results = fetch_engine.fetch_all(symbols)
+    try:
+        while not budget.exhausted("fetch"):
+            with budget.stage("fetch"):
+                item = next(results, None)
+            if item is None:
+                return
+            symbol, df, elapsed = item
+            yield symbol, closed_bars(df, int(budget.clock() * 1000)), elapsed
+    finally:
+        results.close()
+
+def run_batch_check(symbols, budget=None):
+    """
+    先获取所有币种的数据，再一次性向量化扫描整个币种列表，只对触发的组合生成完整信号。
+    返回因预算用完而未完成检查的币种。
+    """
+    budget = budget or CycleBudget()
+    frames = {}
+    fetched = set()
+    for symbol, df, elapsed in _fetch_within_budget(symbols, budget):
+        fetched.add(symbol)
+        if df.empty:
+            log.warning(f"未能获取 {symbol} 的数据，跳过。")
+            continue
+        frames[symbol] = df
+        if market_structure is not None:
+            market_structure.update(symbol, df)
+    unfinished = [symbol for symbol in symbols if symbol not in fetched]
     
-    for symbol in symbols_to_check:
+    # 每个周期分别批量扫描，触发的 (周期数据, 检查器) 按币种汇总
+    timeframes = [(indicator_checkers, frames)]
+    for resampler, checkers in timeframe_pipelines:
+        resampled = {symbol: resampler.update(symbol, df) for symbol, df in frames.items()}
+        timeframes.append((checkers, {symbol: df for symbol, df in resampled.items() if len(df) > 1}))
+    
+    scan_start = time.perf_counter()
+    fired_by_symbol = {}
+    with span("scan"), budget.stage("evaluate"):
+        for checkers, tf_frames in timeframes:
+            checkers_by_indicator = {checker.indicator: checker for checker in checkers}
+            for symbol, indicator in scan_universe(tf_frames, checkers, pool=process_pool):
+                fired_by_symbol.setdefault(symbol, []).append((tf_frames[symbol], checkers_by_indicator[indicator]))
+    fired = sum(len(hits) for hits in fired_by_symbol.values())
+    log.info(f"批量扫描 {len(frames)} 个币种 × {len(timeframes)} 个周期耗时 {time.perf_counter() - scan_start:.3f}s，触发 {fired} 个信号。")
+    
+    for symbol, hits in fired_by_symbol.items():
+        if budget.exhausted("evaluate"):
+            unfinished.append(symbol)
+            continue
+        to_send = []
+        with budget.stage("evaluate"):
+            for df, checker in hits:
+                to_send += _check_frame(symbol, df, [checker])
+        submit_alerts(symbol, to_send)
+    return unfinished
+
+def run_check(deadline=None):
+    """
+    执行一轮检查。deadline 为本轮必须结束的时间 (time.time())，由调度器传入；
+    预算用完时剩下的币种留到下一轮，并排在最前面检查。
+    """
+    global deferred
+    cycle_start = time.perf_counter()
+    symbols = active_symbols()
+    universe_size = len(symbols)
+    if prefilter is not None:
+        symbols = prefilter.select(symbols, force=deferred)
+    # 上一轮没有完成的币种优先
+    wanted = set(symbols)
+    carried = [symbol for symbol in deferred if symbol in wanted]
+    symbols = carried + [symbol for symbol in symbols if symbol not in carried]
+    log.info(f"开始执行检查，目标币种: {', '.join(symbols)}...")
+    
+    budget = CycleBudget(deadline)
+    if scan_mode == 'batch':
+        deferred = run_batch_check(symbols, budget)
+    else:
+        deferred = _run_symbol_checks(symbols, budget)
+    flush_alerts(universe_size)
+    deferred_symbols.set(len(deferred))
+    if deferred:
+        log.warning(f"本轮时间预算已用完，{len(deferred)} 个币种未完成检查，将在下一轮优先检查: {', '.join(deferred)}")
+    
+    _record_cycle(time.perf_counter() - cycle_start, len(symbols) - len(deferred))
+    log.info(f"检查完成。告警队列: {alert_dispatcher.stats()}")
+    if warm_state is not None:
+        warm_state.save_if_due(warm_state_components)
+
+def _record_cycle(duration, symbol_count):
+    """记录周期耗时；超过检查间隔说明下一轮会被推迟，按超时计数并告警"""
+    cycle_duration.observe(duration)
+    cycle_symbols.set(symbol_count)
+    last_cycle_timestamp.set(time.time())
+    if duration > cycle_interval_seconds:
+        cycle_overruns.inc()
+        log.warning(f"检查周期耗时 {duration:.1f}s，超过了 {cycle_interval_seconds / 60:g} 分钟的检查间隔。")
+
+def _run_symbol_checks(symbols, budget):
+    """返回因预算用完而未完成检查的币种"""
+    done = set()
+    # 所有币种的数据并发获取，哪个币种的数据先到齐就先检查哪个
+    for symbol, df, elapsed in _fetch_within_budget(symbols, budget):
         log.info(f"--- 正在检查 {symbol} ---")
-        df = get_binance_data(symbol)
+        done.add(symbol)
         
         if df.empty:
             log.warning(f"未能获取 {symbol} 的数据，跳过。")
             continue
-            
-        for checker in indicator_checkers:
-            signal = checker.check(df, symbol)
-            if signal:
-                # 发现信号时，使用 warning 级别记录，以便引起注意
-                log.warning(f"为 {symbol} 找到潜在信号: {signal['primary_signal']}")
-                
-                # 检查是否应该发送警报
-                should_send, prev_signal = state_manager.should_send_alert(symbol, signal)
-                if should_send:
-                    # 获取 AI 解读
-                    ai_insight = get_gemini_interpretation(symbol, timeframe, signal, previous_signal=prev_signal)
-                    # 发送通知
-                    send_lark_alert(symbol, signal, ai_insight)
-                    # 防止短时间重复发送同一个信号
-                    time.sleep(2)
-    
-    log.info("检查完成。")
+        
+        eval_start = time.perf_counter()
+        with budget.stage("evaluate"):
+            evaluate_symbol(symbol, df)
+        log.info(f"{symbol} 检查完成 (获取 {elapsed:.2f}s, 指标 {time.perf_counter() - eval_start:.2f}s)")
+        if budget.exhausted("evaluate"):
+            break
+    return [symbol for symbol in symbols if symbol not in done]
 
-if __name__ == "__main__":
-    log.info("启动加密货币指标监控器...")
-    # 首次启动立即执行一次
+def on_stream_batch(symbols):
+    """实时模式下每批同时收盘的K线检查完成后调用"""
+    flush_alerts(len(symbols))
+    if warm_state is not None:
+        warm_state.save_if_due(warm_state_components)
+
+def start_from_warm_state():
+    """恢复热启动快照，并在退出时保存 (先于上面注册的 atexit 回调执行)"""
+    if warm_state is None:
+        return
+    restore_warm_state()
+    startup_profile.mark("restore")
+    atexit.register(save_warm_state)
+
+def first_check():
+    """启动后的第一轮检查；完成后输出启动耗时汇总，并在后台预先导入 AI 客户端"""
     run_check()
+    startup_profile.mark("first_check")
+    startup_profile.report()
+    preload_client()
+
+def main():
+    global process_pool
+    log.info("启动加密货币指标监控器...")
+    setup()
+    # 退出时等待队列中的告警发送完毕
+    atexit.register(alert_dispatcher.shutdown)
+    if PROCESS_POOL_ENABLED and scan_mode == 'batch':
+        # 批量扫描交给多个进程，数据通过共享内存传递
+        process_pool = SharedMemoryPool()
+        atexit.register(process_pool.shutdown)
+    if METRICS_ENABLED:
+        start_metrics_server()
+    if coordinator:
+        coordinator.start()
+        atexit.register(coordinator.stop)
+        log.info(f"分片模式: 本进程 {coordinator.worker_id}，共 {len(coordinator.workers)} 个进程。")
+    # 分片模式下只有 leader 请求成交额排名并发布币种列表
+    should_discover = (lambda: coordinator.is_leader) if coordinator else None
     
-    # 设置定时任务
-    schedule.every(check_interval_minutes).minutes.do(run_check)
-    log.info(f"定时任务已设置，程序将每 {check_interval_minutes} 分钟运行一次检查。")
-    
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    if streaming_enabled:
+        from stream_engine import StreamEngine
+        stream_engine = None
+        def on_universe_refresh():
+            # 为新币种安排预热，并按新的币种列表更新订阅
+            active_symbols()
+            if stream_engine is not None:
+                stream_engine.set_symbols(universe())
+        universe_manager.start(should_discover, on_universe_refresh)
+        atexit.register(universe_manager.stop)
+        start_from_warm_state()
+        # 首次启动立即执行一次 (同时为行情缓存填充历史数据)
+        first_check()
+        log.info("已启用 WebSocket 实时模式，将在每根K线收盘时运行检查。")
+        # 只处理本进程负责且已预热的币种
+        owns = coordinator.owns if coordinator else (lambda symbol: True)
+        stream_engine = StreamEngine(universe(), evaluate_symbol, fetch_engine,
+                                     on_batch=on_stream_batch,
+                                     symbol_filter=lambda symbol: owns(symbol) and universe_manager.is_ready(symbol))
+        # 退出时先等待正在进行的检查结束，再保存热启动快照
+        atexit.register(stream_engine.shutdown)
+        stream_engine.run_forever()
+    else:
+        universe_manager.start(should_discover)
+        atexit.register(universe_manager.stop)
+        start_from_warm_state()
+        # 首次启动立即执行一次 (同时为行情缓存填充历史数据)
+        first_check()
+
+        # 之后每根K线收盘后运行，超时的周期不会堆积
+        CycleScheduler(run_check, cycle_interval_seconds).run_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import os
+import threading
+from pathlib import Path
+import numpy as np
+from config_loader import cfg
+from logger import log
+from data_fetcher import TIMEFRAME, interval_to_ms
+
+# --- 使用新的配置 ---
+_archive_cfg = cfg.get('archive', {})
+ARCHIVE_ENABLED = _archive_cfg.get('enabled', False)
+ARCHIVE_PATH = _archive_cfg.get('path', 'data/archive')
+
+# 每个数据集的列定义: (列名, 类型)。列名与 Binance 返回的字段一致
+DATASETS = {
+    "klines": [
+        ('timestamp', np.int64), ('open', np.float64), ('high', np.float64), ('low', np.float64),
+        ('close', np.float64), ('volume', np.float64), ('close_time', np.int64),
+        ('quote_asset_volume', np.float64), ('number_of_trades', np.int64),
+        ('taker_buy_base_asset_volume', np.float64), ('taker_buy_quote_asset_volume', np.float64),
+    ],
+    "oi": [('timestamp', np.int64), ('sumOpenInterest', np.float64), ('sumOpenInterestValue', np.float64)],
+    "ls": [('timestamp', np.int64), ('longShortRatio', np.float64), ('longAccount', np.float64), ('shortAccount', np.float64)],
+}
+
+
+def _rows_to_columns(dataset: str, rows):
+    """把 Binance 原始数据行转换为按列存放的定长类型数组"""
+    columns = DATASETS[dataset]
+    if dataset == "klines":
+        return {name: np.array([row[pos] for row in rows], dtype=np.float64).astype(dtype)
+                for pos, (name, dtype) in enumerate(columns)}
+    return {name: np.array([row[name] for row in rows], dtype=np.float64).astype(dtype)
+            for name, dtype in columns}
+
+
+def _columns_to_rows(dataset: str, columns: dict, symbol: str):
+    """把列数据还原为与 Binance 接口返回格式相同的数据行"""
+    names = [name for name, _ in DATASETS[dataset]]
+    values = [columns[name].tolist() for name in names]
+    if dataset == "klines":
+        return [list(row) + ["0"] for row in zip(*values)]
+    return [dict(zip(names, row), symbol=symbol) for row in zip(*values)]
+
+
+class ColumnarArchive:
+    """
+    本地列式行情归档。每个 币种/周期/数据集 的每一列存为一个原始二进制文件
+    (<root>/<timeframe>/<symbol>/<dataset>/<column>.bin)，只追加已收盘的数据，
+    读取最近 N 条时通过 np.memmap 直接映射文件，不需要拷贝或解析。
+
+    每个数据集最后归档的时间戳保存在内存中，追加时不需要读取文件。
+    新数据与已归档数据之间有缺口时 (例如长时间停机后完整重新拉取) 照常追加，
+    read_rows 预填充缓存时只返回最后一个缺口之后的连续数据。
+    """
+
+    def __init__(self, root=ARCHIVE_PATH, timeframe: str = TIMEFRAME):
+        self.root = Path(root)
+        self.timeframe = timeframe
+        self.interval_ms = interval_to_ms(timeframe)
+        self._locks = {}
+        self._checked = set()
+        self._last_ts = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, symbol: str, dataset: str) -> Path:
+        return self.root / self.timeframe / symbol / dataset
+
+    def _dataset_lock(self, symbol: str, dataset: str):
+        with self._lock:
+            return self._locks.setdefault((symbol, dataset), threading.Lock())
+
+    def _length(self, symbol: str, dataset: str) -> int:
+        """
+        返回数据集的行数。首次访问时检查各列长度是否一致，
+        进程在追加过程中崩溃导致长度不一致时截断到最短的列。
+        """
+        directory = self._dir(symbol, dataset)
+        lengths = {}
+        for name, dtype in DATASETS[dataset]:
+            path = directory / f"{name}.bin"
+            lengths[name] = path.stat().st_size // np.dtype(dtype).itemsize if path.exists() else 0
+        length = min(lengths.values())
+        key = (symbol, dataset)
+        if key not in self._checked:
+            self._checked.add(key)
+            for name, dtype in DATASETS[dataset]:
+                if lengths[name] != length:
+                    log.warning(f"Repairing archive column {symbol}/{dataset}/{name}: {lengths[name]} -> {length} rows")
+                    os.truncate(directory / f"{name}.bin", length * np.dtype(dtype).itemsize)
+        return length
+
+    def read_columns(self, symbol: str, dataset: str, n: int = None) -> dict:
+        """以内存映射方式读取最近 n 条数据 (n 为 None 时读取全部)，返回 {列名: 只读数组}"""
+        with self._dataset_lock(symbol, dataset):
+            length = self._length(symbol, dataset)
+        start = 0 if n is None else max(0, length - n)
+        columns = {}
+        for name, dtype in DATASETS[dataset]:
+            if length == 0:
+                columns[name] = np.empty(0, dtype=dtype)
+                continue
+            mapped = np.memmap(self._dir(symbol, dataset) / f"{name}.bin", dtype=dtype, mode='r', shape=(length,))
+            columns[name] = mapped[start:]
+        return columns
+
+    def read_rows(self, symbol: str, dataset: str, n: int):
+        """
+        读取最近 n 条数据并还原为 Binance 接口的数据行格式，用于预填充行情缓存。
+        最近 n 条中有时间缺口时只返回缺口之后的部分，缓存不会用不连续的数据预填充。
+        """
+        columns = self.read_columns(symbol, dataset, n)
+        gaps = np.flatnonzero(np.diff(columns['timestamp']) > self.interval_ms)
+        if len(gaps):
+            start = int(gaps[-1]) + 1
+            log.info(f"{symbol} {dataset} 的归档数据在 {int(columns['timestamp'][start])} 之前有缺口，"
+                     f"只使用之后的 {len(columns['timestamp']) - start} 条预填充。")
+            columns = {name: column[start:] for name, column in columns.items()}
+        return _columns_to_rows(dataset, columns, symbol)
+
+    def _cached_last_timestamp(self, symbol: str, dataset: str):
+        """调用方需持有该数据集的锁"""
+        key = (symbol, dataset)
+        if key not in self._last_ts:
+            length = self._length(symbol, dataset)
+            self._last_ts[key] = int(np.memmap(self._dir(symbol, dataset) / "timestamp.bin", dtype=np.int64,
+                                               mode='r', shape=(length,))[-1]) if length else None
+        return self._last_ts[key]
+
+    def last_timestamp(self, symbol: str, dataset: str):
+        """最后归档的时间戳 (没有数据时为 None)；首次访问时从文件读取，之后保存在内存中"""
+        with self._dataset_lock(symbol, dataset):
+            return self._cached_last_timestamp(symbol, dataset)
+
+    def append(self, symbol: str, dataset: str, rows) -> int:
+        """
+        追加比已归档数据更新的数据行，返回追加的行数。
+        调用方只传入已收盘的数据 (未收盘的K线之后还会变化)。
+        """
+        if not rows:
+            return 0
+        timestamp_of = (lambda row: int(row[0])) if dataset == "klines" else (lambda row: int(row['timestamp']))
+        with self._dataset_lock(symbol, dataset):
+            last_ts = self._cached_last_timestamp(symbol, dataset)
+            rows = sorted((row for row in rows if last_ts is None or timestamp_of(row) > last_ts), key=timestamp_of)
+            if not rows:
+                return 0
+
+            first_ts = timestamp_of(rows[0])
+            if last_ts is not None and first_ts > last_ts + self.interval_ms:
+                log.warning(f"{symbol} {dataset} 的归档数据出现缺口: {last_ts} -> {first_ts} "
+                            f"({(first_ts - last_ts) // self.interval_ms - 1} 根)，之后只从缺口后开始预填充。")
+            columns = _rows_to_columns(dataset, rows)
+            directory = self._dir(symbol, dataset)
+            directory.mkdir(parents=True, exist_ok=True)
+            # 时间戳列最后写入，崩溃时它总是最短的一列
+            for name, _ in sorted(DATASETS[dataset], key=lambda column: column[0] == 'timestamp'):
+                with open(directory / f"{name}.bin", 'ab') as f:
+                    f.write(columns[name].tobytes())
+            self._last_ts[(symbol, dataset)] = timestamp_of(rows[-1])
+            return len(rows)
@@ -0,0 +1,160 @@
+import time
+import threading
+from collections import deque
+from config_loader import cfg
+from logger import log
+from data_fetcher import TIMEFRAME, DATA_FETCH_LIMIT, interval_to_ms
+
+# --- 使用新的配置 ---
+CACHE_MAX_BARS = cfg.get('cache', {}).get('max_bars', DATA_FETCH_LIMIT)
+
+INTERVAL_MS = interval_to_ms(TIMEFRAME)
+
+# 每个接口返回的原始行中时间戳的取值方式
+_TIMESTAMP_GETTERS = {
+    "klines": lambda row: int(row[0]),
+    "oi": lambda row: int(row['timestamp']),
+    "ls": lambda row: int(row['timestamp']),
+}
+
+
+def _closed_rows(name: str, rows, now_ms: int):
+    """K线只保留收盘时间已过的行；OI / 多空比 的每一条都是已结束周期的统计"""
+    if name == "klines":
+        return [row for row in rows if int(row[6]) < now_ms]
+    return rows
+
+
+class SeriesBuffer:
+    """
+    单个币种单个接口的环形缓冲区，按时间戳升序保存最近 maxlen 条原始数据行。
+    """
+
+    def __init__(self, name: str, maxlen: int):
+        self.name = name
+        self.rows = deque(maxlen=maxlen)
+        self._timestamp = _TIMESTAMP_GETTERS[name]
+
+    @property
+    def last_timestamp(self):
+        return self._timestamp(self.rows[-1]) if self.rows else None
+
+    def is_contiguous(self, rows, interval_ms: int) -> bool:
+        """新数据是否与缓冲区中已有的数据相连 (有重叠或紧接其后)"""
+        if not rows or not self.rows:
+            return False
+        return min(self._timestamp(row) for row in rows) <= self.last_timestamp + interval_ms
+
+    def replace(self, rows):
+        self.rows.clear()
+        self.rows.extend(sorted(rows, key=self._timestamp))
+
+    def merge(self, rows):
+        """
+        合并增量数据。缓冲区中时间戳不早于新数据第一条的行会被丢弃后重写，
+        这样上一轮仍在形成中的 K 线会被最新的版本覆盖。
+        """
+        if not rows:
+            return
+        rows = sorted(rows, key=self._timestamp)
+        first_new = self._timestamp(rows[0])
+        while self.rows and self._timestamp(self.rows[-1]) >= first_new:
+            self.rows.pop()
+        self.rows.extend(rows)
+
+
+class MarketDataCache:
+    """
+    按币种缓存 K线 / OI / 多空比 的原始数据。
+
+    第一次请求某个币种时进行完整拉取，之后只请求最后一条已存数据之后的新数据
+    (包括最后一条本身，以便覆盖仍在形成中的 K 线)。缓存落后太多 (例如进程
+    长时间暂停或网络中断) 时自动退回到完整拉取。
+
+    配置了本地归档时，新币种先从归档预填充，拉取到的已收盘数据也会追加到归档中。
+    """
+
+    def __init__(self, max_bars: int = CACHE_MAX_BARS, fetch_limit: int = DATA_FETCH_LIMIT,
+                 interval_ms: int = INTERVAL_MS, archive=None):
+        self.max_bars = max_bars
+        self.fetch_limit = fetch_limit
+        self.interval_ms = interval_ms
+        self.archive = archive
+        self._buffers = {}
+        self._lock = threading.RLock()
+
+    def _buffer(self, symbol: str, name: str) -> SeriesBuffer:
+        with self._lock:
+            key = (symbol, name)
+            if key not in self._buffers:
+                buffer = self._buffers[key] = SeriesBuffer(name, self.max_bars)
+                if self.archive is not None:
+                    buffer.replace(self.archive.read_rows(symbol, name, self.max_bars))
+                    if buffer.rows:
+                        log.debug(f"{symbol} {name} 从本地归档预填充了 {len(buffer.rows)} 条数据。")
+            return self._buffers[key]
+
+    def request_params(self, symbol: str, name: str, now_ms: int = None) -> dict:
+        """返回下一次请求该接口时应使用的参数 (start_time / limit)"""
+        buffer = self._buffer(symbol, name)
+        last_ts = buffer.last_timestamp
+        if last_ts is None:
+            return {'limit': self.fetch_limit}
+
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        missing_bars = max(0, (now_ms - last_ts) // self.interval_ms)
+        # 缺口超过单次请求上限或缓冲区长度时，增量数据无法与已有数据相连或会挤掉全部旧数据
+        if missing_bars + 1 >= min(self.fetch_limit, self.max_bars):
+            log.info(f"{symbol} {name} 缓存已落后 {missing_bars} 根K线，重新完整拉取。")
+            return {'limit': self.fetch_limit}
+        # 多请求一条，容忍时钟误差
+        return {'start_time': last_ts, 'limit': int(missing_bars) + 2}
+
+    def update(self, symbol: str, name: str, rows, params: dict, now_ms: int = None):
+        """根据请求参数将返回的数据写入缓存，并返回该接口当前缓存的全部数据行"""
+        with self._lock:
+            buffer = self._buffer(symbol, name)
+            if 'start_time' in params:
+                buffer.merge(rows)
+            elif buffer.is_contiguous(rows, self.interval_ms):
+                # 完整拉取的数据与已有数据相连，保留更早的历史
+                buffer.merge(rows)
+            else:
+                buffer.replace(rows)
+            result = list(buffer.rows)
+
+        if self.archive is not None:
+            # 只归档已收盘的数据；WebSocket 推送的未收盘K线更新不会触及归档
+            closed = _closed_rows(name, rows, now_ms if now_ms is not None else int(time.time() * 1000))
+            if closed:
+                try:
+                    self.archive.append(symbol, name, closed)
+                except OSError as e:
+                    log.error(f"Error appending {symbol} {name} to archive: {e}")
+        return result
+
+    def rows(self, symbol: str, name: str):
+        with self._lock:
+            return list(self._buffer(symbol, name).rows)
+
+    def locked(self):
+        """缓存的锁 (可重入)；持有期间其他线程不能读写缓存"""
+        return self._lock
+
+    def export_state(self) -> dict:
+        """{(symbol, 接口): [原始数据行, ...]}，用于热启动快照"""
+        with self._lock:
+            return {key: list(buffer.rows) for key, buffer in self._buffers.items()}
+
+    def restore_state(self, state: dict):
+        """恢复 export_state 的结果；之后的请求只会补齐最后一条数据之后的K线"""
+        with self._lock:
+            for (symbol, name), rows in state.items():
+                buffer = self._buffers[(symbol, name)] = SeriesBuffer(name, self.max_bars)
+                buffer.replace(rows)
+
+    def drop(self, symbol: str):
+        """从缓存中移除一个币种的全部数据"""
+        with self._lock:
+            for key in [key for key in self._buffers if key[0] == symbol]:
+                del self._buffers[key]
@@ -0,0 +1,317 @@
+"""
+跨币种的市场结构: 增量维护的滚动相关矩阵，以及同一轮告警的聚类。
+
+RollingCorrelation 为窗口内每一对币种维护成对样本数、Σx、Σx² 和 Σxy，
+每根新K线 (以及被挤出窗口的旧K线) 只做一次外积加减，复杂度 O(币种数²)，
+不需要在每一轮重新计算整个相关矩阵。MarketStructure 分别对收益率和成交量
+Z-Score 维护一个这样的矩阵，并用它把同一轮触发的信号分为市场整体异动
+(相关性高的一组币种同时触发，只做一次 AI 解读、发一条告警) 和个别币种的异动。
+"""
+import math
+import threading
+import time
+import numpy as np
+from config_loader import cfg
+from logger import log
+from data_fetcher import interval_to_ms, TIMEFRAME
+from rolling_stats import RollingStats
+from signals import SignalCluster
+from metrics import Counter
+
+# --- 使用新的配置 ---
+_market_structure_cfg = cfg.get('market_structure', {})
+MARKET_STRUCTURE_ENABLED = _market_structure_cfg.get('enabled', False)
+MARKET_STRUCTURE_WINDOW = _market_structure_cfg.get('window', 288)
+MARKET_STRUCTURE_MIN_PERIODS = _market_structure_cfg.get('min_periods', 48)
+MARKET_STRUCTURE_CORRELATION_THRESHOLD = _market_structure_cfg.get('correlation_threshold', 0.6)
+MARKET_STRUCTURE_MIN_CLUSTER_SIZE = _market_structure_cfg.get('min_cluster_size', 3)
+MARKET_STRUCTURE_MARKET_WIDE_FRACTION = _market_structure_cfg.get('market_wide_fraction', 0.3)
+VOLUME_LOOKBACK_PERIOD = cfg['trading']['volume_lookback_period']
+
+clustered_signals = Counter("bot_clustered_signals_total", "Signals grouped per cycle, by kind (market_wide / idiosyncratic)",
+                            ["kind"])
+
+
+class RollingCorrelation:
+    """
+    固定窗口 (最近 window 根K线) 内各币种两两之间的相关系数和协方差。
+
+    只使用两个币种同时有值的K线 (与 pandas DataFrame.rolling(window).corr 的成对处理一致)，
+    成对样本数不足 min_periods 时结果为 NaN。币种可以随时加入或移除，
+    容量不够时矩阵按倍数扩大。
+    """
+
+    def __init__(self, window: int, min_periods: int = None, capacity: int = 64):
+        self.window = window
+        self.min_periods = window // 2 if min_periods is None else min_periods
+        self._slots = {}
+        self._free = []
+        self._ring = np.full((window, capacity), np.nan)
+        self._pos = 0
+        self._filled = 0
+        self._updates = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self._n = np.zeros((capacity, capacity))
+        self._sx = np.zeros((capacity, capacity))    # [i, j]: 与 j 同时有值时 x_i 之和
+        self._sxx = np.zeros((capacity, capacity))   # [i, j]: 与 j 同时有值时 x_i² 之和
+        self._sxy = np.zeros((capacity, capacity))   # [i, j]: x_i * x_j 之和
+
+    @property
+    def capacity(self) -> int:
+        return self._ring.shape[1]
+
+    def __contains__(self, symbol):
+        return symbol in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _grow(self):
+        old = self.capacity
+        ring = np.full((self.window, old * 2), np.nan)
+        ring[:, :old] = self._ring
+        self._ring = ring
+        for name in ('_n', '_sx', '_sxx', '_sxy'):
+            matrix = np.zeros((old * 2, old * 2))
+            matrix[:old, :old] = getattr(self, name)
+            setattr(self, name, matrix)
+
+    def _slot(self, symbol: str) -> int:
+        slot = self._slots.get(symbol)
+        if slot is None:
+            if not self._free:
+                if len(self._slots) >= self.capacity:
+                    self._grow()
+                self._free = sorted(set(range(self.capacity)) - set(self._slots.values()), reverse=True)
+            slot = self._slots[symbol] = self._free.pop()
+        return slot
+
+    def drop(self, symbol: str):
+        """移除一个币种，它在窗口中的数据不再参与计算，位置留给之后加入的币种"""
+        slot = self._slots.pop(symbol, None)
+        if slot is None:
+            return
+        self._ring[:, slot] = np.nan
+        for matrix in (self._n, self._sx, self._sxx, self._sxy):
+            matrix[slot, :] = 0.0
+            matrix[:, slot] = 0.0
+        self._free.append(slot)
+
+    def _accumulate(self, rows, sign: float):
+        """加上 (sign=1) 或减去 (sign=-1) 若干行 (K线 × 容量) 的贡献；NaN (空行) 不计入"""
+        valid = ~np.isnan(rows)
+        if not valid.any():
+            return
+        mask = valid.astype(np.float64)
+        x = np.where(valid, rows, 0.0)
+        self._n += sign * (mask.T @ mask)
+        self._sx += sign * (x.T @ mask)
+        self._sxx += sign * ((x * x).T @ mask)
+        self._sxy += sign * (x.T @ x)
+
+    def _recompute(self):
+        """定期用窗口内的数据重新累加，消除增删累积的浮点误差"""
+        self._allocate(self.capacity)
+        self._accumulate(self._ring, 1.0)
+
+    def push(self, values: dict):
+        """加入一根K线上各币种的值 {symbol: value}，缺少的币种记为 NaN"""
+        self.extend([values])
+
+    def extend(self, rows):
+        """
+        按时间顺序加入多根K线 [{symbol: value}, ...]。
+        多行一起处理时用矩阵乘法一次完成加减，首次预热整个窗口时比逐行 push 快得多。
+        """
+        slotted = [{self._slot(symbol): value for symbol, value in values.items()} for values in rows]
+        # 超过一个窗口的部分会被挤出，不需要计入
+        slotted = slotted[-self.window:]
+        block = np.full((len(slotted), self.capacity), np.nan)
+        for i, values in enumerate(slotted):
+            block[i, list(values)] = list(values.values())
+        positions = (self._pos + np.arange(len(block))) % self.window
+        # 未填满的位置是 NaN，减去也没有影响
+        self._accumulate(self._ring[positions], -1.0)
+        self._ring[positions] = block
+        self._accumulate(block, 1.0)
+        self._pos = (self._pos + len(block)) % self.window
+        self._filled = min(self._filled + len(block), self.window)
+        previous, self._updates = self._updates, self._updates + len(block)
+        if self._updates // (self.window * 4) != previous // (self.window * 4):
+            self._recompute()
+
+    def _moments(self, symbols):
+        index = np.array([self._slots.get(symbol, -1) for symbol in symbols], dtype=int)
+        known = index >= 0
+        index = np.where(known, index, 0)
+        grid = np.ix_(index, index)
+        n = np.where(np.outer(known, known), self._n[grid], 0.0)
+        sx, sy = self._sx[grid], self._sx.T[grid]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = self._sxy[grid] - sx * sy / n
+            var_x = np.maximum(self._sxx[grid] - sx * sx / n, 0.0)
+            var_y = np.maximum(self._sxx.T[grid] - sy * sy / n, 0.0)
+        enough = (n >= max(self.min_periods, 2))
+        return n, cov, var_x, var_y, enough
+
+    def covariance(self, symbols):
+        """symbols 两两之间的协方差矩阵 (ddof=1)"""
+        n, cov, _, _, enough = self._moments(symbols)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(enough, cov / (n - 1), np.nan)
+
+    def correlation(self, symbols):
+        """symbols 两两之间的相关系数矩阵；方差为 0 或样本不足时为 NaN"""
+        _, cov, var_x, var_y, enough = self._moments(symbols)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = cov / np.sqrt(var_x * var_y)
+        return np.where(enough & np.isfinite(corr), np.clip(corr, -1.0, 1.0), np.nan)
+
+
+class MarketStructure:
+    """
+    用每个币种已收盘的K线维护收益率和成交量 Z-Score 的滚动相关矩阵，并对同一轮的告警聚类。
+
+    update(symbol, df) 在每次检查币种时调用，新收盘的K线先按时间戳暂存；
+    commit() 在一轮检查结束时调用，把这一轮所有币种都已给出的K线按时间顺序
+    加入矩阵，保证同一根K线上各币种的值在同一行。
+    """
+
+    def __init__(self, window: int = MARKET_STRUCTURE_WINDOW, min_periods: int = MARKET_STRUCTURE_MIN_PERIODS,
+                 correlation_threshold: float = MARKET_STRUCTURE_CORRELATION_THRESHOLD,
+                 min_cluster_size: int = MARKET_STRUCTURE_MIN_CLUSTER_SIZE,
+                 market_wide_fraction: float = MARKET_STRUCTURE_MARKET_WIDE_FRACTION,
+                 volume_lookback: int = VOLUME_LOOKBACK_PERIOD, timeframe: str = TIMEFRAME):
+        self.returns = RollingCorrelation(window, min_periods)
+        self.volume = RollingCorrelation(window, min_periods)
+        self.correlation_threshold = correlation_threshold
+        self.min_cluster_size = min_cluster_size
+        self.market_wide_fraction = market_wide_fraction
+        self.volume_lookback = volume_lookback
+        self.bar_ms = interval_to_ms(timeframe)
+        self._last_bar = {}       # symbol -> 已暂存的最后一根收盘K线时间 (ms)
+        self._last_close = {}
+        self._volume_stats = {}
+        self._pending = {}        # 时间 (ms) -> {symbol: (收益率, 成交量 Z-Score)}
+        self._committed = -1
+        self._lock = threading.Lock()
+
+    def update(self, symbol: str, df, now_ms: float = None):
+        """暂存 df 中该币种上次之后新收盘的K线；首次调用时用最近一个窗口的历史数据预热"""
+        if df is None or df.empty:
+            return
+        now_ms = time.time() * 1000 if now_ms is None else now_ms
+        opened = df.index.values.astype('datetime64[ms]').astype(np.int64)
+        closed = opened + self.bar_ms <= now_ms
+        with self._lock:
+            last = self._last_bar.get(symbol, -1)
+            new = closed & (opened > max(last, self._committed - self.returns.window * self.bar_ms))
+            if not new.any():
+                return
+            stats = self._volume_stats.get(symbol)
+            if stats is None:
+                stats = self._volume_stats[symbol] = RollingStats(self.volume_lookback)
+            previous_close = self._last_close.get(symbol, math.nan)
+            for ts, close, volume in zip(opened[new], df['close'].to_numpy(dtype=float)[new],
+                                         df['volume'].to_numpy(dtype=float)[new]):
+                stats.push(volume)
+                ret = close / previous_close - 1 if previous_close else math.nan
+                previous_close = close
+                if ts > self._committed:
+                    self._pending.setdefault(int(ts), {})[symbol] = (ret, stats.zscore())
+            self._last_bar[symbol] = int(opened[new][-1])
+            self._last_close[symbol] = previous_close
+
+    def commit(self):
+        """把暂存的K线按时间顺序加入相关矩阵"""
+        with self._lock:
+            if not self._pending:
+                return
+            timestamps = sorted(self._pending)
+            rows = [self._pending.pop(ts) for ts in timestamps]
+            self.returns.extend([{symbol: ret for symbol, (ret, _) in values.items()} for values in rows])
+            self.volume.extend([{symbol: volume_z for symbol, (_, volume_z) in values.items()} for values in rows])
+            self._committed = timestamps[-1]
+
+    def drop(self, symbol: str):
+        with self._lock:
+            self.returns.drop(symbol)
+            self.volume.drop(symbol)
+            self._last_bar.pop(symbol, None)
+            self._last_close.pop(symbol, None)
+            self._volume_stats.pop(symbol, None)
+            for values in self._pending.values():
+                values.pop(symbol, None)
+
+    _STATE_FIELDS = ('returns', 'volume', '_last_bar', '_last_close', '_volume_stats', '_pending', '_committed')
+
+    def export_state(self) -> dict:
+        with self._lock:
+            return {name: getattr(self, name) for name in self._STATE_FIELDS}
+
+    def restore_state(self, state: dict):
+        with self._lock:
+            for name in self._STATE_FIELDS:
+                if name in state:
+                    setattr(self, name, state[name])
+
+    def correlated(self, symbols):
+        """收益率或成交量 Z-Score 的相关系数超过阈值的币种对 (布尔矩阵)"""
+        with self._lock:
+            returns = self.returns.correlation(symbols)
+            volume = self.volume.correlation(symbols)
+        with np.errstate(invalid='ignore'):
+            return (np.nan_to_num(returns) >= self.correlation_threshold) | \
+                   (np.nan_to_num(volume) >= self.correlation_threshold)
+
+    def cluster(self, alerts: dict, universe_size: int = 0):
+        """
+        把一轮检查中允许发送的告警 {symbol: [(signal, previous_signal), ...]} 分组，返回 SignalCluster 列表。
+
+        同时触发的币种达到 universe_size 的 market_wide_fraction 时，全部视为一次市场整体异动；
+        否则按相关性连通的分量分组，分量大小达到 min_cluster_size 的作为市场整体异动，
+        其余币种各自单独成组 (个别币种的异动，与未聚类时的告警相同)。
+        """
+        symbols = [symbol for symbol, signals in alerts.items() if signals]
+        if len(symbols) < self.min_cluster_size:
+            groups = [[symbol] for symbol in symbols]
+        elif universe_size and len(symbols) >= self.market_wide_fraction * universe_size:
+            groups = [symbols]
+        else:
+            groups = _connected_components(symbols, self.correlated(symbols))
+
+        clusters = []
+        for group in groups:
+            market_wide = len(group) >= self.min_cluster_size
+            if market_wide:
+                clusters.append(SignalCluster({symbol: alerts[symbol] for symbol in group}, market_wide=True))
+            else:
+                clusters.extend(SignalCluster({symbol: alerts[symbol]}) for symbol in group)
+        market_wide_count = sum(len(cluster.symbols) for cluster in clusters if cluster.market_wide)
+        clustered_signals.inc(market_wide_count, kind="market_wide")
+        clustered_signals.inc(len(symbols) - market_wide_count, kind="idiosyncratic")
+        if market_wide_count:
+            log.info(f"本轮 {len(symbols)} 个币种触发信号，其中 {market_wide_count} 个归为市场整体异动。")
+        return clusters
+
+
+def _connected_components(symbols, adjacency):
+    """按邻接矩阵求连通分量，保持 symbols 中的先后顺序"""
+    seen = [False] * len(symbols)
+    groups = []
+    for start in range(len(symbols)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        stack, members = [start], []
+        while stack:
+            i = stack.pop()
+            members.append(i)
+            for j in np.flatnonzero(adjacency[i]):
+                if not seen[j]:
+                    seen[j] = True
+                    stack.append(j)
+        groups.append([symbols[i] for i in sorted(members)])
+    return groups
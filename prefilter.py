@@ -0,0 +1,130 @@
+import math
+from config_loader import cfg
+from logger import log
+from data_fetcher import fetch_24hr_tickers
+from rolling_stats import RollingStats
+from metrics import Counter
+
+# --- 使用新的配置 ---
+_prefilter_cfg = cfg.get('prefilter', {})
+PREFILTER_ENABLED = _prefilter_cfg.get('enabled', False)
+PREFILTER_WINDOW = _prefilter_cfg.get('window', 288)
+PREFILTER_MIN_PERIODS = _prefilter_cfg.get('min_periods', 12)
+PREFILTER_Z_THRESHOLD = _prefilter_cfg.get('z_threshold', 2.0)
+PREFILTER_PRICE_CHANGE_THRESHOLD = _prefilter_cfg.get('price_change_threshold', 0.005)
+PREFILTER_REFRESH_CYCLES = _prefilter_cfg.get('refresh_cycles', 6)
+
+prefilter_decisions = Counter("bot_prefilter_symbols_total", "Symbols screened by the ticker prefilter, by decision (deep / skipped)",
+                              ["decision"])
+
+
+class _TickerState:
+    __slots__ = ("quote_volume", "price", "volume_stats", "return_stats", "cycles_since_deep")
+
+    def __init__(self, window: int, min_periods: int):
+        self.quote_volume = None
+        self.price = None
+        self.volume_stats = RollingStats(window, min_periods)
+        self.return_stats = RollingStats(window, min_periods)
+        # 从未深度获取过，第一次一定会被选中
+        self.cycles_since_deep = math.inf
+
+
+class TickerPrefilter:
+    """
+    两级筛选中的第一级。
+
+    每轮只请求一次全市场 ticker/24hr (权重 40)，对每个币种比较本轮与上一轮的
+    24小时成交额和最新价：成交额增量和价格变化的绝对值分别放入滚动窗口，
+    得到相对于该币种自身历史的 Z-Score。只有异常分数超过 z_threshold、价格变化
+    超过 price_change_threshold、已连续 refresh_cycles 轮没有深度获取，或者历史
+    样本不足的币种，才会进入第二级 (K线 + OI + 多空比获取和指标检查)。
+
+    ticker 只包含价格和成交量，OI 和多空比信号依赖 refresh_cycles 的定期刷新，
+    最多延迟 refresh_cycles 个周期被发现。
+    """
+
+    def __init__(self, window: int = PREFILTER_WINDOW, min_periods: int = PREFILTER_MIN_PERIODS,
+                 z_threshold: float = PREFILTER_Z_THRESHOLD,
+                 price_change_threshold: float = PREFILTER_PRICE_CHANGE_THRESHOLD,
+                 refresh_cycles: int = PREFILTER_REFRESH_CYCLES):
+        self.window = window
+        self.min_periods = min_periods
+        self.z_threshold = z_threshold
+        self.price_change_threshold = price_change_threshold
+        self.refresh_cycles = refresh_cycles
+        self._states = {}
+
+    def _observe(self, ticker: dict):
+        """用一条 ticker 更新对应币种的状态，返回 (成交额增量 Z-Score, 价格变化, 价格变化 Z-Score)"""
+        symbol = ticker['symbol']
+        state = self._states.get(symbol)
+        if state is None:
+            state = self._states[symbol] = _TickerState(self.window, self.min_periods)
+        quote_volume = float(ticker.get('quoteVolume') or 0)
+        price = float(ticker.get('lastPrice') or 0)
+
+        volume_z = price_change = return_z = math.nan
+        if state.quote_volume is not None and state.price:
+            state.volume_stats.push(quote_volume - state.quote_volume)
+            price_change = price / state.price - 1
+            state.return_stats.push(abs(price_change))
+            volume_z = state.volume_stats.zscore()
+            return_z = state.return_stats.zscore()
+        state.quote_volume = quote_volume
+        state.price = price
+        return volume_z, price_change, return_z
+
+    def _is_anomalous(self, volume_z: float, price_change: float, return_z: float) -> bool:
+        if math.isnan(volume_z) or math.isnan(return_z):
+            # 样本不足时无法判断，按异常处理
+            return True
+        return (volume_z > self.z_threshold or return_z > self.z_threshold
+                or abs(price_change) > self.price_change_threshold)
+
+    def screen(self, symbols, tickers, force=()):
+        """
+        根据本轮的 ticker 列表返回需要深度获取的币种 (保持 symbols 的顺序)。
+        force 中的币种 (例如上一轮没有完成的) 总是被选中。
+        """
+        wanted = set(symbols)
+        anomalous = set(force)
+        for ticker in tickers:
+            symbol = ticker.get('symbol')
+            if symbol in wanted and self._is_anomalous(*self._observe(ticker)):
+                anomalous.add(symbol)
+
+        selected = []
+        for symbol in symbols:
+            state = self._states.get(symbol)
+            # 没有 ticker 的币种无法筛选，直接深度获取
+            if state is None or symbol in anomalous or state.cycles_since_deep + 1 >= self.refresh_cycles:
+                selected.append(symbol)
+                if state is not None:
+                    state.cycles_since_deep = 0
+            else:
+                state.cycles_since_deep += 1
+        prefilter_decisions.inc(len(selected), decision="deep")
+        prefilter_decisions.inc(len(symbols) - len(selected), decision="skipped")
+        return selected
+
+    def select(self, symbols, force=()):
+        """请求全市场 ticker 并筛选；请求失败时退回到全部深度获取"""
+        symbols = list(symbols)
+        try:
+            tickers = fetch_24hr_tickers()
+        except Exception as e:
+            log.error(f"Error fetching tickers for prefilter, checking all symbols: {e}")
+            return symbols
+        selected = self.screen(symbols, tickers, force)
+        log.info(f"预筛选: {len(symbols)} 个币种中 {len(selected)} 个需要深度获取。")
+        return selected
+
+    def drop(self, symbol: str):
+        self._states.pop(symbol, None)
+
+    def export_state(self) -> dict:
+        return dict(self._states)
+
+    def restore_state(self, state: dict):
+        self._states.update(state)
@@ -0,0 +1,196 @@
+"""
+CPU 密集阶段的多进程执行。
+
+行情数据放在 multiprocessing.shared_memory 中的 NumPy 数组里，子进程按名字映射同一块
+内存直接读取 (不再 pickle DataFrame)，只把很小的结果 (触发的行号、不带市场快照的 Signal)
+传回主进程。进程池创建一次后一直复用，启动子进程和导入模块的开销只付一次。
+
+目前用于:
+    scan    批量扫描模式下对整个币种列表的向量化阈值判断 (按行切分给各进程)
+    check   回测中在候选位置上运行指标检查器和市场快照 (按币种切分)
+"""
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from config_loader import cfg
+from logger import log
+
+# --- 使用新的配置 ---
+_processes_cfg = cfg.get('processes', {})
+PROCESS_POOL_ENABLED = _processes_cfg.get('enabled', False)
+PROCESS_POOL_WORKERS = _processes_cfg.get('workers', 0)
+PROCESS_POOL_START_METHOD = _processes_cfg.get('start_method', 'spawn')
+PROCESS_POOL_MIN_SYMBOLS = _processes_cfg.get('min_symbols', 200)
+
+
+class SharedArray:
+    """放在共享内存中的 NumPy 数组；spec 可以传给子进程，按名字映射同一块内存"""
+
+    def __init__(self, shape, dtype=np.float64):
+        dtype = np.dtype(dtype)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        self.array = np.ndarray(shape, dtype, buffer=self._shm.buf)
+        self.spec = (self._shm.name, tuple(shape), dtype.str)
+
+    def close(self):
+        # 先释放指向共享内存的数组，否则 close 会因为仍有导出的缓冲区而失败
+        self.array = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _run_attached(func, specs, *args):
+    """在子进程中映射 specs 对应的共享数组并调用 func(*arrays, *args)；func 的结果不能引用这些数组"""
+    handles = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    try:
+        return func(*[np.ndarray(shape, dtype, buffer=shm.buf) for (_, shape, dtype), shm in zip(specs, handles)], *args)
+    finally:
+        for shm in handles:
+            shm.close()
+
+
+# --- 批量扫描 ---
+
+def _scan_rows(volume, oi, ls_ratio, params, start, stop):
+    from batch_scan import scan_matrices
+    fired = scan_matrices(volume[start:stop], oi[start:stop], ls_ratio[start:stop], params)
+    return [(start + row, indicator) for row, indicator in fired]
+
+
+def _scan_task(specs, params, start, stop):
+    return _run_attached(_scan_rows, specs, params, start, stop)
+
+
+# --- 回测检查 ---
+
+def _share_frames(frames: dict):
+    """
+    把 {symbol: DataFrame} 放进两块共享内存: 所有币种按行拼接的数值列 (缺少的列为 NaN)
+    和对应的时间戳。返回 (数值块, 时间戳块, 列名, [(symbol, start, stop, 该币种的列序号), ...])。
+    """
+    columns = []
+    for df in frames.values():
+        columns += [column for column in df.columns if column not in columns]
+    total = sum(len(df) for df in frames.values())
+    values = SharedArray((total, len(columns)))
+    timestamps = SharedArray((total,), np.int64)
+    values.array.fill(np.nan)
+    segments, start = [], 0
+    for symbol, df in frames.items():
+        stop = start + len(df)
+        indexes = [columns.index(column) for column in df.columns]
+        values.array[start:stop, indexes] = df.to_numpy(dtype=np.float64)
+        timestamps.array[start:stop] = df.index.values.astype('datetime64[ns]').view(np.int64)
+        segments.append((symbol, start, stop, indexes))
+        start = stop
+    return values, timestamps, columns, segments
+
+
+def _check_symbols(values, timestamps, columns, segments, events, settings, window):
+    import indicators
+    checkers = {checker.indicator: checker for checker in indicators.create_checkers()}
+    for indicator, (lookback, thresholds) in settings.items():
+        checkers[indicator].lookback = lookback
+        checkers[indicator].thresholds = thresholds
+
+    results = []
+    for symbol, start, stop, indexes in segments:
+        index = pd.DatetimeIndex(timestamps[start:stop].view('datetime64[ns]'), name='timestamp')
+        if indexes == list(range(indexes[0], indexes[0] + len(indexes))):
+            # 列连续时直接切片，不复制数据
+            block = values[start:stop, indexes[0]:indexes[0] + len(indexes)]
+        else:
+            block = values[start:stop, indexes]
+        df = pd.DataFrame(block, index=index, columns=[columns[i] for i in indexes], copy=False)
+        for pos, indicator in events[symbol]:
+            signal = checkers[indicator].check(df.iloc[max(0, pos + 1 - window):pos + 1], symbol)
+            if signal:
+                # 市场快照引用共享内存中的数据，不传回主进程
+                signal.context = None
+                results.append((symbol, pos, indicator, signal))
+        indicators.snapshot_cache.drop(symbol)
+        del df, block, index
+    return results
+
+
+def _check_task(specs, columns, segments, events, settings, window):
+    return _run_attached(_check_symbols, specs, columns, segments, events, settings, window)
+
+
+class SharedMemoryPool:
+    """
+    复用的进程池。数据由主进程写入共享内存，按块分给各子进程处理，
+    币种数量少于 min_symbols 时调用方应直接在本进程中计算 (见 should_use)。
+    """
+
+    def __init__(self, workers: int = PROCESS_POOL_WORKERS, start_method: str = PROCESS_POOL_START_METHOD,
+                 min_symbols: int = PROCESS_POOL_MIN_SYMBOLS):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_symbols = min_symbols
+        self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context(start_method))
+        log.info(f"已启动 {self.workers} 个计算进程 ({start_method})。")
+
+    def should_use(self, symbol_count: int) -> bool:
+        return symbol_count >= self.min_symbols
+
+    def _chunks(self, count: int):
+        bounds = np.linspace(0, count, min(self.workers, count) + 1).astype(int)
+        return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    def scan(self, frames: dict, params: dict):
+        """与 batch_scan.scan_matrices 相同，返回 [(行号, indicator), ...]，行号对应 frames 的顺序"""
+        from batch_scan import INDICATORS, stack_metric
+        count = len(frames)
+        arrays = [SharedArray((count, params['volume_lookback'])), SharedArray((count, 2)),
+                  SharedArray((count, params['ls_ratio_lookback']))]
+        try:
+            for array, column in zip(arrays, ('volume', 'oi', 'ls_ratio')):
+                stack_metric(frames, column, array.array.shape[1], out=array.array)
+            specs = [array.spec for array in arrays]
+            futures = [self._executor.submit(_scan_task, specs, params, start, stop) for start, stop in self._chunks(count)]
+            hits = [hit for future in futures for hit in future.result()]
+            # 与单进程扫描的顺序一致: 按指标，再按行号
+            return sorted(hits, key=lambda hit: (INDICATORS.index(hit[1]), hit[0]))
+        finally:
+            for array in arrays:
+                array.close()
+
+    def check(self, frames: dict, events: dict, settings: dict, window: int):
+        """
+        在子进程中对 events ({symbol: [(bar 位置, indicator), ...]}) 运行指标检查器。
+        settings: {indicator: (lookback, thresholds)}，window: 每次检查使用的K线数量。
+        返回 [(symbol, bar 位置, indicator, Signal), ...] (Signal 不带市场快照)。
+        """
+        frames = {symbol: df for symbol, df in frames.items() if events.get(symbol)}
+        if not frames:
+            return []
+        values, timestamps, columns, segments = _share_frames(frames)
+        try:
+            specs = [values.spec, timestamps.spec]
+            # 按事件数量把币种均匀分给各进程
+            chunks = [[] for _ in range(min(self.workers, len(segments)))]
+            loads = [0] * len(chunks)
+            for segment in sorted(segments, key=lambda segment: -len(events[segment[0]])):
+                target = loads.index(min(loads))
+                chunks[target].append(segment)
+                loads[target] += len(events[segment[0]])
+            futures = [self._executor.submit(_check_task, specs, columns, chunk,
+                                             {segment[0]: events[segment[0]] for segment in chunk}, settings, window)
+                       for chunk in chunks]
+            return [result for future in futures for result in future.result()]
+        finally:
+            values.close()
+            timestamps.close()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
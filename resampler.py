@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+from config_loader import cfg
+from data_fetcher import TIMEFRAME, interval_to_ms
+
+# --- 使用新的配置 ---
+RESAMPLE_MAX_BARS = cfg.get('cache', {}).get('max_bars', cfg['trading']['data_fetch_limit'])
+
+# 各列聚合到更高周期时的方式
+AGGREGATIONS = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+    'close_time': 'last',
+    'quote_asset_volume': 'sum',
+    'number_of_trades': 'sum',
+    'taker_buy_base_asset_volume': 'sum',
+    'taker_buy_quote_asset_volume': 'sum',
+    'oi': 'last',
+    'ls_ratio': 'last',
+}
+
+_REDUCERS = {
+    'first': lambda values, starts, ends: values[starts],
+    'last': lambda values, starts, ends: values[ends - 1],
+    'max': lambda values, starts, ends: np.maximum.reduceat(values, starts),
+    'min': lambda values, starts, ends: np.minimum.reduceat(values, starts),
+    'sum': lambda values, starts, ends: np.add.reduceat(values, starts),
+}
+
+
+def aggregate(df: pd.DataFrame, interval_ms: int) -> pd.DataFrame:
+    """把按时间排序的基础周期数据聚合为 interval_ms 周期 (按 UTC 时间对齐)"""
+    if df.empty:
+        return df
+    timestamps = df.index.values.astype('datetime64[ms]').astype(np.int64)
+    buckets = timestamps - timestamps % interval_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)]
+
+    columns = {}
+    for name, how in AGGREGATIONS.items():
+        if name in df.columns:
+            columns[name] = _REDUCERS[how](df[name].to_numpy(), starts, ends)
+    if 'close_time' in columns:
+        columns['close_time'] = buckets[starts] + interval_ms - 1
+    index = pd.DatetimeIndex(buckets[starts].astype('datetime64[ms]').astype('datetime64[ns]'), name='timestamp')
+    return pd.DataFrame(columns, index=index)
+
+
+class TimeframeResampler:
+    """
+    从基础周期数据增量生成一个更高周期的K线。
+
+    已收盘的高周期K线按币种保存 (最多 max_bars 根)，每次只聚合上次之后新增的基础K线，
+    最后一根仍在形成中的高周期K线每次重新计算。因为已收盘的K线会一直保留，
+    高周期的历史长度不受基础周期缓存窗口的限制。
+    CVD 在聚合后的数据上按主动买卖量重新累计，OI / 多空比取每个周期的最后一个值。
+    """
+
+    def __init__(self, timeframe: str, base_timeframe: str = TIMEFRAME, max_bars: int = RESAMPLE_MAX_BARS):
+        self.timeframe = timeframe
+        self.interval_ms = interval_to_ms(timeframe)
+        base_interval_ms = interval_to_ms(base_timeframe)
+        if self.interval_ms <= base_interval_ms or self.interval_ms % base_interval_ms:
+            raise ValueError(f"Timeframe {timeframe} must be a multiple of the base timeframe {base_timeframe}")
+        self.max_bars = max_bars
+        self._closed = {}
+
+    def update(self, symbol: str, base_df: pd.DataFrame) -> pd.DataFrame:
+        if base_df.empty:
+            return base_df
+        freq = f"{self.interval_ms}ms"
+        last_bucket = base_df.index[-1].floor(freq)
+        closed = self._closed.get(symbol)
+
+        if closed is not None and base_df.index[0] <= closed.index[-1] + pd.Timedelta(milliseconds=self.interval_ms):
+            new_rows = base_df[base_df.index >= closed.index[-1] + pd.Timedelta(milliseconds=self.interval_ms)]
+        else:
+            # 首次聚合或与已保存的K线之间有缺口: 丢弃开头不完整的高周期K线后重新聚合
+            closed = None
+            new_rows = base_df[base_df.index >= base_df.index[0].ceil(freq)]
+
+        aggregated = aggregate(new_rows, self.interval_ms)
+        newly_closed = aggregated[aggregated.index < last_bucket]
+        if closed is None:
+            closed = newly_closed
+        elif not newly_closed.empty:
+            closed = pd.concat([closed, newly_closed])
+        closed = closed.tail(self.max_bars)
+        if not closed.empty:
+            self._closed[symbol] = closed
+
+        forming = aggregated[aggregated.index >= last_bucket]
+        df = pd.concat([closed, forming]) if not closed.empty else forming
+        if df.empty:
+            return df
+        if 'taker_buy_base_asset_volume' in df.columns:
+            taker_buy = df['taker_buy_base_asset_volume']
+            df = df.assign(cvd=(taker_buy - (df['volume'] - taker_buy)).cumsum())
+        return df
+
+    def drop(self, symbol: str):
+        self._closed.pop(symbol, None)
+
+    def export_state(self) -> dict:
+        """各币种已收盘的高周期K线"""
+        return dict(self._closed)
+
+    def restore_state(self, state: dict):
+        self._closed.update(state)
@@ -0,0 +1,293 @@
+import math
+from collections import deque
+import numpy as np
+
+# 每次增量更新时重新同步的最近K线数量 (覆盖仍在形成中或被插值修正过的尾部数据)
+RESYNC_BARS = 3
+
+
+class RollingStats:
+    """
+    固定窗口的滚动均值 / 标准差 (Welford 算法，支持移除窗口外的旧值)。
+
+    每次 push / pop 都是 O(1)。结果与 pandas 的
+    series.rolling(window, min_periods).mean() / .std() 在最后一个位置的取值一致：
+    NaN 不计入样本数，样本数不足 min_periods 时返回 NaN，标准差使用 ddof=1。
+    """
+
+    def __init__(self, window: int, min_periods: int = None, history: int = RESYNC_BARS):
+        self.window = window
+        self.min_periods = window // 2 if min_periods is None else min_periods
+        # 多保留 history 个旧值，使 pop 之后可以把重新进入窗口的旧值加回来
+        self._values = deque(maxlen=window + history)
+        self._n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._updates = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def clear(self):
+        self._values.clear()
+        self._n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _add(self, x: float):
+        if math.isnan(x):
+            return
+        self._n += 1
+        delta = x - self._mean
+        self._mean += delta / self._n
+        self._m2 += delta * (x - self._mean)
+
+    def _remove(self, x: float):
+        if math.isnan(x):
+            return
+        self._n -= 1
+        if self._n == 0:
+            self._mean = 0.0
+            self._m2 = 0.0
+            return
+        delta = x - self._mean
+        self._mean -= delta / self._n
+        self._m2 = max(0.0, self._m2 - delta * (x - self._mean))
+
+    def _recompute(self):
+        """定期用窗口内的值重新计算，消除增删累积的浮点误差"""
+        window_values = [v for v in list(self._values)[-self.window:] if not math.isnan(v)]
+        self._n = len(window_values)
+        if self._n:
+            self._mean = sum(window_values) / self._n
+            self._m2 = sum((v - self._mean) ** 2 for v in window_values)
+        else:
+            self._mean = 0.0
+            self._m2 = 0.0
+
+    def push(self, x: float):
+        x = float(x)
+        if len(self._values) >= self.window:
+            self._remove(self._values[-self.window])
+        self._values.append(x)
+        self._add(x)
+        self._updates += 1
+        if self._updates % (self.window * 4) == 0:
+            self._recompute()
+
+    def pop(self) -> float:
+        """移除最新的值，窗口左侧被挤出的旧值 (如仍保留) 会重新计入"""
+        x = self._values.pop()
+        self._remove(x)
+        if len(self._values) >= self.window:
+            self._add(self._values[-self.window])
+        return x
+
+    @property
+    def last(self) -> float:
+        return self._values[-1] if self._values else math.nan
+
+    @property
+    def mean(self) -> float:
+        if self._n == 0 or self._n < self.min_periods:
+            return math.nan
+        return self._mean
+
+    @property
+    def std(self) -> float:
+        if self._n < 2 or self._n < self.min_periods:
+            return math.nan
+        # 窗口内数值全部相同时，增删累积的舍入误差不应产生一个极小的非零标准差
+        if self._m2 <= self._n * self._mean * self._mean * 1e-20:
+            return 0.0
+        return math.sqrt(self._m2 / (self._n - 1))
+
+    def zscore(self) -> float:
+        """最新值相对于当前窗口 (包含该值本身) 的 Z-Score；标准差为 0 时按 1 处理"""
+        std = self.std
+        if math.isnan(std):
+            return math.nan
+        return (self.last - self.mean) / (std if std != 0 else 1)
+
+
+class SeriesZScoreTracker:
+    """
+    跟踪一个时间序列 (例如某个币种的成交量) 的增量 Z-Score。
+
+    每次传入最新的完整序列，只有上次之后的新K线 (以及尾部 RESYNC_BARS 根可能被修正的K线)
+    会被计入；时间不连续或首次调用时会用最近一个窗口的数据重新初始化。
+    """
+
+    def __init__(self, window: int, min_periods: int = None, resync_bars: int = RESYNC_BARS):
+        self.resync_bars = resync_bars
+        self.stats = RollingStats(window, min_periods, history=resync_bars)
+        self._timestamps = deque(maxlen=window + resync_bars)
+
+    def _reseed(self, timestamps, values):
+        self.stats.clear()
+        self._timestamps.clear()
+        start = max(0, len(values) - self._timestamps.maxlen)
+        for ts, value in zip(timestamps[start:], values[start:]):
+            self._timestamps.append(ts)
+            self.stats.push(value)
+
+    def update(self, timestamps, values) -> float:
+        """传入按时间升序排列的时间戳和数值数组，返回最后一个值的 Z-Score"""
+        if len(values) == 0:
+            return math.nan
+
+        pos = -1
+        if self._timestamps:
+            pos = int(np.searchsorted(timestamps, self._timestamps[-1]))
+            if pos >= len(timestamps) or timestamps[pos] != self._timestamps[-1]:
+                pos = -1
+
+        if pos < 0 or len(values) - pos > self.stats.window:
+            self._reseed(timestamps, values)
+        else:
+            resync = min(self.resync_bars, len(self._timestamps), pos + 1)
+            for _ in range(resync):
+                self._timestamps.pop()
+                self.stats.pop()
+            for ts, value in zip(timestamps[pos - resync + 1:], values[pos - resync + 1:]):
+                self._timestamps.append(ts)
+                self.stats.push(value)
+        return self.stats.zscore()
+
+    def update_series(self, series) -> float:
+        """pandas Series 版本的 update，索引为时间"""
+        return self.update(series.index.values, series.to_numpy(dtype=float))
+
+
+def rolling_z_score(values, window: int, min_periods: int = None):
+    """
+    向量化的滚动 Z-Score，用于回填历史数据。支持一维数组或二维数组 (沿最后一个轴计算)，
+    结果与 pandas rolling(window, min_periods=window // 2) 的计算方式一致。
+    """
+    min_periods = window // 2 if min_periods is None else min_periods
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+
+    # 减去每行的均值后再做累加，降低大数值下方差计算的精度损失
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offset = np.nanmean(values, axis=-1, keepdims=True) if values.size else 0.0
+    offset = np.where(np.isnan(offset), 0.0, offset)
+    centered = np.where(valid, values - offset, 0.0)
+
+    def _window_sum(x):
+        csum = np.cumsum(x, axis=-1, dtype=np.float64)
+        shifted = np.zeros_like(csum)
+        if csum.shape[-1] > window:
+            shifted[..., window:] = csum[..., :-window]
+        return csum - shifted
+
+    count = _window_sum(valid.astype(np.float64))
+    s1 = _window_sum(centered)
+    s2 = _window_sum(centered * centered)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s1 / count
+        var = np.maximum(s2 - s1 * mean, 0.0) / (count - 1)
+        std = np.sqrt(var)
+        enough = (count >= max(min_periods, 1)) & (count >= 2)
+        std = np.where(enough, std, np.nan)
+        std = np.where(std == 0, 1.0, std)
+        return np.where(enough & valid, (centered - mean) / std, np.nan)
+
+
+class ExponentialMovingAverage:
+    """
+    增量 EMA，与 pandas_ta 的 ema(length) 默认行为一致：
+    前 length 个值的简单均值作为初始值，之后按 alpha = 2 / (length + 1) 递推。
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self.alpha = 2 / (length + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._value = math.nan
+
+    def _next(self, x: float):
+        if self._count + 1 < self.length:
+            return math.nan
+        if self._count + 1 == self.length:
+            return (self._sum + x) / self.length
+        return self.alpha * x + (1 - self.alpha) * self._value
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        self._value = self._next(x)
+        self._count += 1
+        if self._count <= self.length:
+            self._sum += x
+        return self._value
+
+    def peek(self, x: float) -> float:
+        """计算加入 x 之后的 EMA，但不更新状态 (用于仍在形成中的K线)"""
+        return self._next(float(x))
+
+
+class RelativeStrengthIndex:
+    """
+    增量 RSI，与 pandas_ta 的 rsi(length) 一致：涨跌幅分别做
+    ewm(alpha=1/length, adjust=True, min_periods=length) 平滑。
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self._decay = 1 - 1 / length
+        self._prev_close = math.nan
+        self._count = 0
+        self._gain_sum = 0.0
+        self._loss_sum = 0.0
+        self._weight = 0.0
+
+    def _next(self, close: float):
+        if math.isnan(self._prev_close):
+            return None
+        change = close - self._prev_close
+        gain_sum = max(change, 0.0) + self._decay * self._gain_sum
+        loss_sum = max(-change, 0.0) + self._decay * self._loss_sum
+        weight = 1.0 + self._decay * self._weight
+        return gain_sum, loss_sum, weight, self._count + 1
+
+    @staticmethod
+    def _value(state, length: int) -> float:
+        if state is None:
+            return math.nan
+        gain_sum, loss_sum, weight, count = state
+        if count < length or gain_sum + loss_sum == 0:
+            return math.nan
+        return 100 * (gain_sum / weight) / ((gain_sum + loss_sum) / weight)
+
+    def update(self, close: float) -> float:
+        close = float(close)
+        state = self._next(close)
+        if state is not None:
+            self._gain_sum, self._loss_sum, self._weight, self._count = state
+        self._prev_close = close
+        return self._value(state, self.length)
+
+    def peek(self, close: float) -> float:
+        """计算加入 close 之后的 RSI，但不更新状态 (用于仍在形成中的K线)"""
+        return self._value(self._next(float(close)), self.length)
+
+
+def latest_z_score(values, window: int, min_periods: int = None):
+    """
+    只计算最后一列的滚动 Z-Score (二维数组: 每行一个序列)。
+    等价于 rolling_z_score(values, window)[:, -1]，但只处理最后 window 列。
+    """
+    min_periods = window // 2 if min_periods is None else min_periods
+    values = np.asarray(values, dtype=np.float64)
+    tail = values[..., -window:]
+    count = np.sum(~np.isnan(tail), axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(tail, axis=-1)
+        std = np.nanstd(tail, axis=-1, ddof=1)
+    enough = (count >= max(min_periods, 1)) & (count >= 2)
+    std = np.where(enough, std, np.nan)
+    std = np.where(std == 0, 1.0, std)
+    with np.errstate(invalid='ignore'):
+        return np.where(enough, (tail[..., -1] - mean) / std, np.nan)
@@ -0,0 +1,101 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+from config_loader import cfg
+from logger import log
+from data_fetcher import interval_to_ms, TIMEFRAME
+from metrics import Counter, Gauge
+
+# --- 使用新的配置 ---
+_schedule_cfg = cfg['schedule']
+CHECK_INTERVAL_MINUTES = _schedule_cfg['check_interval_minutes']
+SETTLE_SECONDS = _schedule_cfg.get('settle_seconds', 2)
+STAGE_BUDGETS = {stage: seconds for stage, seconds in (_schedule_cfg.get('stage_budgets_seconds') or {}).items()
+                 if seconds is not None}
+
+cycles_skipped = Counter("bot_cycles_skipped_total", "Scheduled cycles skipped because the previous cycle overran")
+deferred_symbols = Gauge("bot_deferred_symbols", "Symbols left unfinished by the last cycle (run first next cycle)")
+
+
+def aligned_interval_seconds(check_interval_minutes: float = CHECK_INTERVAL_MINUTES, timeframe: str = TIMEFRAME) -> float:
+    """检查间隔向上取整为K线周期的整数倍，这样每次运行都落在K线收盘之后"""
+    bar_seconds = interval_to_ms(timeframe) / 1000
+    return max(1, math.ceil(check_interval_minutes * 60 / bar_seconds)) * bar_seconds
+
+
+class CycleBudget:
+    """
+    一个检查周期的时间预算。
+
+    deadline 是周期必须结束的时间点 (time.time()，一般是下一次调度时间)；
+    budgets 为各阶段 (fetch / evaluate) 最多可用的秒数。阶段耗时用 stage()
+    累计，exhausted() 为 True 时调用方应停止该阶段，把剩下的币种留给下一轮。
+    """
+
+    def __init__(self, deadline: float = None, budgets: dict = None, clock=time.time):
+        self.deadline = deadline
+        self.budgets = STAGE_BUDGETS if budgets is None else budgets
+        self.clock = clock
+        self.spent = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.spent[name] = self.spent.get(name, 0.0) + self.clock() - start
+
+    def exhausted(self, name: str) -> bool:
+        if self.deadline is not None and self.clock() >= self.deadline:
+            return True
+        budget = self.budgets.get(name)
+        return budget is not None and self.spent.get(name, 0.0) >= budget
+
+
+class CycleScheduler:
+    """
+    按K线收盘对齐的周期调度。
+
+    每次在 interval 的整数倍 (UTC 对齐，与 Binance K线收盘时间一致) 之后再等待
+    settle_seconds 运行 job(deadline)，deadline 为下一次调度时间。job 在同一个线程
+    中执行，不会重叠；如果某一轮超时，错过的调度点不会补跑，而是合并到下一个
+    调度点 (增量获取会补齐中间的数据)，避免负载堆积。
+    """
+
+    def __init__(self, job, interval_seconds: float = None, settle_seconds: float = SETTLE_SECONDS,
+                 clock=time.time):
+        self.job = job
+        self.interval = interval_seconds or aligned_interval_seconds()
+        self.settle = settle_seconds
+        self.clock = clock
+        self._stopped = threading.Event()
+
+    def next_run(self, now: float) -> float:
+        """now 之后的第一个调度时间 (K线收盘时间 + settle)"""
+        boundary = math.floor((now - self.settle) / self.interval) + 1
+        return boundary * self.interval + self.settle
+
+    def run_forever(self):
+        next_run = self.next_run(self.clock())
+        log.info(f"调度已设置，每 {self.interval / 60:g} 分钟在K线收盘后 {self.settle:g}s 运行一次检查。")
+        while not self._stopped.is_set():
+            wait = next_run - self.clock()
+            if wait > 0 and self._stopped.wait(wait):
+                break
+            deadline = next_run + self.interval
+            try:
+                self.job(deadline)
+            except Exception as e:
+                log.opt(exception=e).error(f"Error in scheduled check: {e}")
+
+            next_run = self.next_run(self.clock())
+            skipped = round((next_run - deadline) / self.interval)
+            if skipped > 0:
+                cycles_skipped.inc(skipped)
+                log.warning(f"检查周期超时，跳过 {skipped} 个调度点，下一次运行合并到 "
+                            f"{time.strftime('%H:%M:%S', time.localtime(next_run))}。")
+
+    def stop(self):
+        self._stopped.set()
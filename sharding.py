@@ -0,0 +1,334 @@
+"""
+多进程 / 多主机分片运行。
+
+每个工作进程通过协调后端 (CoordinationBackend) 定期发送心跳，所有存活的
+进程组成一个一致性哈希环，按币种名称决定每个币种由哪个进程负责；进程加入
+或退出时只有约 1/N 的币种会换到别的进程。去重状态也保存在协调后端中，
+所有进程共享。币种列表由持有 "leader" 租约的进程发布，其余进程读取。
+
+SqliteCoordinationBackend 基于 SQLite 文件 (由 SQLite 的文件锁保证多进程一致)，
+适合单机多进程和本地测试；跨主机部署时实现一个相同接口的后端即可 (例如 Redis)。
+"""
+import os
+import abc
+import json
+import time
+import socket
+import bisect
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from config_loader import cfg
+from logger import log
+from state_store import STATE_HISTORY_SIZE
+
+# --- 使用新的配置 ---
+_sharding_cfg = cfg.get('sharding', {})
+SHARDING_ENABLED = _sharding_cfg.get('enabled', False)
+SHARDING_BACKEND = _sharding_cfg.get('backend', 'sqlite')
+SHARDING_PATH = _sharding_cfg.get('path', 'data/coordination.db')
+# 未配置时使用 <hostname>-<pid>，进程重启后会变化
+SHARDING_WORKER_ID_CONFIGURED = bool(os.getenv('SHARD_WORKER_ID') or _sharding_cfg.get('worker_id'))
+SHARDING_WORKER_ID = os.getenv('SHARD_WORKER_ID') or _sharding_cfg.get('worker_id') or f"{socket.gethostname()}-{os.getpid()}"
+SHARDING_HEARTBEAT_SECONDS = _sharding_cfg.get('heartbeat_seconds', 5)
+SHARDING_LEASE_SECONDS = _sharding_cfg.get('lease_seconds', 15)
+SHARDING_VIRTUAL_NODES = _sharding_cfg.get('virtual_nodes', 64)
+
+LEADER_LEASE = "leader"
+UNIVERSE_KEY = "universe"
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """带虚拟节点的一致性哈希环，同一组节点在任何进程中得到相同的分配结果"""
+
+    def __init__(self, nodes=(), virtual_nodes: int = SHARDING_VIRTUAL_NODES):
+        self.nodes = tuple(sorted(set(nodes)))
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(virtual_nodes))
+        self._keys = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str):
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[index]
+
+
+class CoordinationBackend(abc.ABC):
+    """
+    协调后端接口：成员心跳、租约 (用于选主)、共享键值，以及与
+    JournalStateStore 相同的状态存储接口 (get / history / put / put_if / flush / close)，
+    因此可以直接作为 SignalStateManager 的 store 使用。
+    """
+
+    @abc.abstractmethod
+    def heartbeat(self, worker_id: str, ttl: float):
+        ...
+
+    @abc.abstractmethod
+    def leave(self, worker_id: str):
+        ...
+
+    @abc.abstractmethod
+    def live_workers(self):
+        ...
+
+    @abc.abstractmethod
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """获取或续期租约，成功 (当前由 holder 持有) 时返回 True"""
+
+    @abc.abstractmethod
+    def release_lease(self, name: str, holder: str):
+        ...
+
+    @abc.abstractmethod
+    def set_value(self, key: str, value):
+        ...
+
+    @abc.abstractmethod
+    def get_value(self, key: str, default=None):
+        ...
+
+    @abc.abstractmethod
+    def get(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    def history(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    def put(self, key: str, record: dict):
+        ...
+
+    @abc.abstractmethod
+    def put_if(self, key: str, expected, record: dict) -> bool:
+        """
+        条件写入：只有该键最近一条记录仍等于 expected (没有记录时为 None) 时才写入，返回是否写入。
+        读取和写入必须是一个原子操作，多个进程同时写同一个键时只有一个成功。
+        """
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SqliteCoordinationBackend(CoordinationBackend):
+    """基于 SQLite 文件的协调后端 (WAL 模式，每个操作一个短事务)"""
+
+    def __init__(self, path=SHARDING_PATH, history_size: int = STATE_HISTORY_SIZE, clock=time.time):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.history_size = history_size
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS signal_state (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "key TEXT NOT NULL, record TEXT NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS signal_state_key ON signal_state (key, seq)")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            # IMMEDIATE: 事务开始时就取得写锁，读-改-写不会与其他进程交错
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    # --- 成员与租约 ---
+
+    def heartbeat(self, worker_id: str, ttl: float):
+        now = self.clock()
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO workers (worker_id, expires_at) VALUES (?, ?) "
+                         "ON CONFLICT(worker_id) DO UPDATE SET expires_at = excluded.expires_at", (worker_id, now + ttl))
+            conn.execute("DELETE FROM workers WHERE expires_at < ?", (now,))
+
+    def leave(self, worker_id: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def live_workers(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT worker_id FROM workers WHERE expires_at >= ? ORDER BY worker_id",
+                                      (self.clock(),)).fetchall()
+        return [worker_id for worker_id, in rows]
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        now = self.clock()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != holder and row[1] >= now:
+                return False
+            conn.execute("INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                         "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at",
+                         (name, holder, now + ttl))
+            return True
+
+    def release_lease(self, name: str, holder: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    # --- 共享键值 ---
+
+    def set_value(self, key: str, value):
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO kv (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                         (key, json.dumps(value, ensure_ascii=False)))
+
+    def get_value(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    # --- 去重状态 ---
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM signal_state WHERE key = ? ORDER BY seq DESC LIMIT 1",
+                                     (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def history(self, key: str):
+        with self._lock:
+            rows = self._conn.execute("SELECT record FROM signal_state WHERE key = ? ORDER BY seq", (key,)).fetchall()
+        return [json.loads(record) for record, in rows]
+
+    def _insert(self, conn, key: str, record: dict):
+        conn.execute("INSERT INTO signal_state (key, record) VALUES (?, ?)",
+                     (key, json.dumps(record, ensure_ascii=False)))
+        conn.execute("DELETE FROM signal_state WHERE key = ? AND seq NOT IN "
+                     "(SELECT seq FROM signal_state WHERE key = ? ORDER BY seq DESC LIMIT ?)",
+                     (key, key, self.history_size))
+
+    def put(self, key: str, record: dict):
+        with self._transaction() as conn:
+            self._insert(conn, key, record)
+
+    def put_if(self, key: str, expected, record: dict) -> bool:
+        # 比较和写入在同一个 IMMEDIATE 事务中，其他进程的写入只能发生在之前或之后
+        with self._transaction() as conn:
+            row = conn.execute("SELECT record FROM signal_state WHERE key = ? ORDER BY seq DESC LIMIT 1",
+                               (key,)).fetchone()
+            if (json.loads(row[0]) if row else None) != expected:
+                return False
+            self._insert(conn, key, record)
+            return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+BACKENDS = {
+    "sqlite": SqliteCoordinationBackend,
+}
+
+
+def create_backend(name: str = SHARDING_BACKEND, path: str = SHARDING_PATH) -> CoordinationBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown coordination backend: {name}")
+    return BACKENDS[name](path)
+
+
+class ShardCoordinator:
+    """
+    在后台线程中定期发送心跳、续期 leader 租约并刷新成员列表。
+
+    owns / owned 根据当前的一致性哈希环判断币种归属；成员变化会在一个心跳周期内
+    被所有进程看到。leader 进程把 universe_source() 返回的币种列表发布到后端，
+    所有进程通过 universe() 读取。
+    """
+
+    def __init__(self, backend: CoordinationBackend, worker_id: str = SHARDING_WORKER_ID,
+                 heartbeat_seconds: float = SHARDING_HEARTBEAT_SECONDS,
+                 lease_seconds: float = SHARDING_LEASE_SECONDS,
+                 virtual_nodes: int = SHARDING_VIRTUAL_NODES, universe_source=None):
+        self.backend = backend
+        self.worker_id = worker_id
+        self.heartbeat_seconds = heartbeat_seconds
+        self.lease_seconds = lease_seconds
+        self.virtual_nodes = virtual_nodes
+        self.universe_source = universe_source
+        self.is_leader = False
+        self._ring = HashRing([worker_id], virtual_nodes)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # 先同步完成一次心跳，启动后的第一轮检查就能看到已在运行的其他进程
+        self._tick()
+        self._thread = threading.Thread(target=self._run, name="shard-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.heartbeat_seconds):
+            try:
+                self._tick()
+            except Exception as e:
+                log.error(f"Shard heartbeat failed: {e}", exc_info=True)
+
+    def _tick(self):
+        self.backend.heartbeat(self.worker_id, self.lease_seconds)
+        was_leader = self.is_leader
+        self.is_leader = self.backend.acquire_lease(LEADER_LEASE, self.worker_id, self.lease_seconds)
+        if self.is_leader != was_leader:
+            log.info(f"Worker {self.worker_id} {'acquired' if self.is_leader else 'lost'} leadership.")
+        if self.is_leader and self.universe_source is not None:
+            self.publish_universe(self.universe_source())
+
+        workers = self.backend.live_workers()
+        if self.worker_id not in workers:
+            workers.append(self.worker_id)
+        if tuple(sorted(workers)) != self._ring.nodes:
+            self._ring = HashRing(workers, self.virtual_nodes)
+            log.info(f"Shard membership changed: {len(workers)} workers {', '.join(self._ring.nodes)}")
+
+    def owns(self, symbol: str) -> bool:
+        return self._ring.owner(symbol) == self.worker_id
+
+    def owned(self, symbols):
+        return [symbol for symbol in symbols if self.owns(symbol)]
+
+    def publish_universe(self, symbols):
+        symbols = list(symbols)
+        if symbols != self.backend.get_value(UNIVERSE_KEY):
+            self.backend.set_value(UNIVERSE_KEY, symbols)
+            log.info(f"Published universe of {len(symbols)} symbols.")
+
+    def universe(self, default=None):
+        return self.backend.get_value(UNIVERSE_KEY, default)
+
+    @property
+    def workers(self):
+        return self._ring.nodes
+
+    def stop(self):
+        """退出分片：注销成员并释放 leader 租约，其余进程在下一次心跳时接管这些币种"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        try:
+            self.backend.release_lease(LEADER_LEASE, self.worker_id)
+            self.backend.leave(self.worker_id)
+        except Exception as e:
+            log.error(f"Error leaving shard: {e}")
@@ -0,0 +1,176 @@
+"""
+指标信号的数据模型。
+
+检查器产出的 Signal 只保存原始数值，去重比较、指纹和持久化都直接使用数值；
+格式化 (千分位、百分比、$ 前缀) 只在发送告警和构建 AI 提示词时进行。
+"""
+
+# 各指标 value 字段的显示格式
+VALUE_FORMATS = {
+    "Volume": "{:,.0f}",
+    "Open Interest": "${:,.0f}",
+    "Long/Short Ratio": "{:.3f}",
+}
+
+# (字段, 显示名称, 格式)，显示名称与旧版告警中的字段名一致
+DISPLAY_FIELDS = (
+    ("value", "value", None),
+    ("z_score", "z_score", "{:.2f}"),
+    ("price_change", "price_change", "{:.2%}"),
+    ("change", "change_1_period", "{:+.2%}"),
+    ("price", "price", "{:.2f}"),
+    ("sentiment", "sentiment", "{}"),
+)
+
+_LEGACY_NAMES = {"change_1_period": "change"}
+
+
+def _parse_number(value):
+    """解析旧版状态文件中格式化过的数值 ("$1,234"、"+1.50%")"""
+    if not isinstance(value, str):
+        return value
+    text = value.strip().replace('$', '').replace(',', '')
+    try:
+        if text.endswith('%'):
+            return float(text[:-1]) / 100
+        return float(text)
+    except ValueError:
+        return value
+
+
+def _round_significant(value, digits: int):
+    if isinstance(value, float):
+        return float(f"{value:.{digits}g}")
+    return value
+
+
+class Signal:
+    """一个币种在某个周期上触发的指标信号；context 为共享的市场背景快照 (不参与比较和持久化)"""
+    __slots__ = ("symbol", "timeframe", "indicator", "signal_type", "value", "z_score", "change",
+                 "price", "price_change", "sentiment", "context")
+
+    FIELDS = __slots__[:-1]
+    NUMERIC_FIELDS = ("value", "z_score", "change", "price", "price_change")
+
+    def __init__(self, symbol: str, timeframe: str, indicator: str, signal_type: str, value: float = None,
+                 z_score: float = None, change: float = None, price: float = None, price_change: float = None,
+                 sentiment: str = None, context=None):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.indicator = indicator
+        self.signal_type = signal_type
+        self.value = value
+        self.z_score = z_score
+        self.change = change
+        self.price = price
+        self.price_change = price_change
+        self.sentiment = sentiment
+        self.context = context
+
+    @property
+    def key(self) -> str:
+        """去重状态的键"""
+        return f"{self.symbol}-{self.timeframe}-{self.indicator}-{self.signal_type}"
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+    def __eq__(self, other):
+        if not isinstance(other, Signal):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS if getattr(self, name) is not None)
+        return f"Signal({fields})"
+
+    def fingerprint(self, digits: int = 2):
+        """数值保留 digits 位有效数字的字段元组，数值相近的信号得到相同的指纹"""
+        return tuple(_round_significant(value, digits) for value in self._values())
+
+    # --- 持久化 ---
+
+    def to_record(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS if getattr(self, name) is not None}
+
+    @classmethod
+    def from_record(cls, record: dict):
+        """从状态记录恢复；兼容旧版记录中格式化为字符串的数值"""
+        fields = {}
+        for name, value in record.items():
+            name = _LEGACY_NAMES.get(name, name)
+            if name in cls.NUMERIC_FIELDS:
+                value = _parse_number(value)
+            if name in cls.FIELDS:
+                fields[name] = value
+        fields.setdefault('symbol', None)
+        fields.setdefault('timeframe', None)
+        fields.setdefault('indicator', None)
+        fields.setdefault('signal_type', None)
+        return cls(**fields)
+
+    # --- 格式化 (只在告警和提示词中使用) ---
+
+    def display_fields(self):
+        """[(显示名称, 格式化后的值), ...]，不含 indicator / signal_type"""
+        fields = []
+        for name, label, fmt in DISPLAY_FIELDS:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if fmt is None:
+                fmt = VALUE_FORMATS.get(self.indicator, "{}")
+            try:
+                fields.append((label, fmt.format(value)))
+            except (ValueError, TypeError):
+                fields.append((label, str(value)))
+        return fields
+
+    def to_display(self) -> dict:
+        return {"indicator": self.indicator, "signal_type": self.signal_type,
+                **dict(self.display_fields()), "timeframe": self.timeframe}
+
+
+class SignalCluster:
+    """
+    同一轮检查中归为一组的告警。alerts 为 {symbol: [(signal, previous_signal), ...]}；
+    market_wide 为 True 时是多个相关币种同时触发的市场整体异动，整组只做一次 AI 解读和告警。
+    """
+    __slots__ = ("alerts", "market_wide")
+
+    def __init__(self, alerts: dict, market_wide: bool = False):
+        self.alerts = alerts
+        self.market_wide = market_wide
+
+    @property
+    def symbols(self):
+        return list(self.alerts)
+
+    @property
+    def signals(self):
+        """[(signal, previous_signal), ...]，按币种顺序展开"""
+        return [item for items in self.alerts.values() for item in items]
+
+    @property
+    def leader(self) -> str:
+        """Z-Score (或变化幅度) 绝对值最大的信号所属的币种，作为整组的代表"""
+        def strength(item):
+            signal = item[0]
+            value = signal.z_score if signal.z_score is not None else signal.change
+            return abs(value) if value is not None and value == value else 0.0
+        return max(self.signals, key=strength)[0].symbol
+
+    @property
+    def label(self) -> str:
+        if len(self.alerts) == 1:
+            return self.symbols[0]
+        return f"{self.leader} +{len(self.alerts) - 1}"
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def __repr__(self):
+        return f"SignalCluster({', '.join(self.symbols)}, market_wide={self.market_wide})"
@@ -1,8 +1,9 @@
 import time
-import json
-from pathlib import Path
 from config_loader import cfg
 from logger import log
+from state_store import JournalStateStore
+from metrics import Counter
+from signals import Signal
 
 # --- 使用新的配置 ---
 Z_SCORE_CHANGE_THRESHOLD = cfg['trading']['thresholds']['z_score_change']
@@ -10,92 +11,72 @@ PERCENTAGE_CHANGE_THRESHOLD = cfg['trading']['thresholds']['percentage_change']
 RESEND_INTERVAL_MINUTES = cfg['schedule']['resend_interval_minutes']
 STATE_FILE_PATH = cfg['state_file_path']
 
-class SignalStateManager:
-    def __init__(self, state_file=STATE_FILE_PATH):
-        self.state_file = Path(state_file)
-        self.last_triggered_signals = self._load_state()
-
-    def _load_state(self):
-        if self.state_file.exists():
-            try:
-                with open(self.state_file, 'r') as f:
-                    log.info("Loading previous state from file.")
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError) as e:
-                log.error(f"Error loading state file: {e}. Starting with a fresh state.")
-                return {}
-        log.info("No state file found. Starting with a fresh state.")
-        return {}
+signal_decisions = Counter("bot_signals_total", "Signals seen by the dedup check, by outcome (new / resend / changed / suppressed)",
+                           ["indicator", "timeframe", "outcome"])
 
-    def _save_state(self):
-        try:
-            with open(self.state_file, 'w') as f:
-                json.dump(self.last_triggered_signals, f, indent=4)
-                log.debug("Successfully saved state to file.")
-        except IOError as e:
-            log.error(f"Error saving state file: {e}")
+class SignalStateManager:
+    def __init__(self, state_file=STATE_FILE_PATH, store=None, clock=time.time):
+        # 只持久化去重所需的信息 (时间戳 + 主信号)
+        self.store = store if store is not None else JournalStateStore(state_file)
+        # 回测时传入模拟时钟
+        self.clock = clock
 
-    def _get_unique_key(self, symbol, signal):
-        indicator = signal['primary_signal'].get('indicator', 'UnknownIndicator')
-        signal_type = signal['primary_signal'].get('signal_type', 'UnknownType')
-        return f"{symbol}-{indicator}-{signal_type}"
+    def should_send_alert(self, symbol, signal: Signal):
+        """
+        返回 (是否发送, 上一次发送的信号)。
 
-    def should_send_alert(self, symbol, signal):
-        unique_key = self._get_unique_key(symbol, signal)
-        last_signal_info = self.last_triggered_signals.get(unique_key)
+        发送的决定用 put_if 写入：只有该键的状态在判断期间没有被其他进程改写时才生效，
+        否则重新读取并判断，两个进程 (例如分片重新分配期间) 不会发送同一条告警。
+        """
+        unique_key = signal.key
+        while True:
+            last_signal_info = self.store.get(unique_key)
+            outcome, last_signal = self._decide(unique_key, signal, last_signal_info)
+            if outcome == "suppressed":
+                self._count(signal, outcome)
+                return False, last_signal
+            record = {"timestamp": self.clock(), "primary_signal": signal.to_record()}
+            if self.store.put_if(unique_key, last_signal_info, record):
+                self._count(signal, outcome)
+                return True, last_signal
+            log.info(f"State of {unique_key} was updated by another worker, re-checking.")
 
+    def _decide(self, unique_key, signal: Signal, last_signal_info):
+        """返回 (结果, 上一次发送的信号)，结果为 new / resend / changed / suppressed"""
         if not last_signal_info:
             log.info(f"New signal type {unique_key}, allowing send.")
-            self._update_state(unique_key, signal)
-            return True, None
+            return "new", None
 
-        last_signal_data = last_signal_info['signal_data']['primary_signal']
+        last_signal = Signal.from_record(last_signal_info['primary_signal'])
         last_timestamp = last_signal_info.get('timestamp', 0)
-        current_signal_data = signal['primary_signal']
 
         # 检查是否超过了强制重发时间
-        time_since_last_alert = (time.time() - last_timestamp) / 60
+        time_since_last_alert = (self.clock() - last_timestamp) / 60
         if time_since_last_alert > RESEND_INTERVAL_MINUTES:
             log.info(f"Signal {unique_key} has persisted for {time_since_last_alert:.1f} minutes. Resending.")
-            self._update_state(unique_key, signal)
-            return True, last_signal_data
+            return "resend", last_signal
 
         is_significant_change = False
 
         # 检查 Z-Score 变化
-        if 'z_score' in current_signal_data:
-            try:
-                last_z = float(last_signal_data.get('z_score', 0))
-                current_z = float(current_signal_data.get('z_score', 0))
-                if abs(current_z - last_z) > Z_SCORE_CHANGE_THRESHOLD:
-                    log.info(f"Significant Z-Score change for {unique_key} ({last_z:.2f} -> {current_z:.2f}), allowing send.")
-                    is_significant_change = True
-            except (ValueError, TypeError):
-                pass
+        if signal.z_score is not None:
+            last_z = last_signal.z_score if isinstance(last_signal.z_score, (int, float)) else 0.0
+            if abs(signal.z_score - last_z) > Z_SCORE_CHANGE_THRESHOLD:
+                log.info(f"Significant Z-Score change for {unique_key} ({last_z:.2f} -> {signal.z_score:.2f}), allowing send.")
+                is_significant_change = True
         
         # 检查百分比变化 (例如 OI 变化)
-        elif 'change_1_period' in current_signal_data: # 假设这是百分比变化的字段
-            try:
-                last_change_str = last_signal_data.get('change_1_period', '0%').strip('%')
-                current_change_str = current_signal_data.get('change_1_period', '0%').strip('%')
-                last_change = float(last_change_str) / 100
-                current_change = float(current_change_str) / 100
-                if abs(current_change - last_change) > PERCENTAGE_CHANGE_THRESHOLD:
-                    log.info(f"Significant percentage change for {unique_key} ({last_change:.2%} -> {current_change:.2%}), allowing send.")
-                    is_significant_change = True
-            except (ValueError, TypeError):
-                pass
+        elif signal.change is not None:
+            last_change = last_signal.change if isinstance(last_signal.change, (int, float)) else 0.0
+            if abs(signal.change - last_change) > PERCENTAGE_CHANGE_THRESHOLD:
+                log.info(f"Significant percentage change for {unique_key} ({last_change:.2%} -> {signal.change:.2%}), allowing send.")
+                is_significant_change = True
 
         if is_significant_change:
-            self._update_state(unique_key, signal)
-            return True, last_signal_data
+            return "changed", last_signal
 
         log.info(f"Signal {unique_key} has not changed significantly. Suppressed.")
-        return False, last_signal_data
+        return "suppressed", last_signal
 
-    def _update_state(self, unique_key, signal):
-        self.last_triggered_signals[unique_key] = {
-            "timestamp": time.time(),
-            "signal_data": signal
-        }
-        self._save_state()
+    def _count(self, signal: Signal, outcome):
+        signal_decisions.inc(indicator=signal.indicator, timeframe=signal.timeframe, outcome=outcome)
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+from pathlib import Path
+from config_loader import cfg
+from logger import log
+from signals import Signal
+
+# --- 使用新的配置 ---
+_state_cfg = cfg.get('state', {})
+STATE_HISTORY_SIZE = _state_cfg.get('history_size', 5)
+STATE_FLUSH_INTERVAL_SECONDS = _state_cfg.get('flush_interval_seconds', 1)
+STATE_COMPACT_MIN_ENTRIES = _state_cfg.get('compact_min_entries', 1000)
+# 旧版状态文件只有一个周期，键中也不含周期
+LEGACY_TIMEFRAME = cfg['trading']['timeframe']
+
+SNAPSHOT_VERSION = 2
+
+
+def _write_atomic(path: Path, data: str):
+    """先写临时文件并 fsync，再原子替换，保证进程崩溃时不会留下损坏的文件"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JournalStateStore:
+    """
+    去重状态的持久化存储：快照文件 + 追加写日志 (journal)。
+
+    每次 put 只在内存中更新并把一行记录放入待写缓冲，由后台线程批量追加到
+    journal 并 fsync (write-behind)。journal 行数超过键数量的两倍 (且不少于
+    compact_min_entries) 时，把内存状态原子地写成新快照并清空 journal，
+    所以单次写入的代价与币种数量无关。启动时读取快照后重放 journal 即可恢复。
+    每个键只保留最近 history_size 条记录。
+    """
+
+    def __init__(self, path, history_size: int = STATE_HISTORY_SIZE,
+                 flush_interval_seconds: float = STATE_FLUSH_INTERVAL_SECONDS,
+                 compact_min_entries: int = STATE_COMPACT_MIN_ENTRIES):
+        self.path = Path(path)
+        self.journal_path = self.path.with_name(self.path.name + ".journal")
+        self.history_size = history_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.compact_min_entries = compact_min_entries
+
+        self._entries = {}
+        self._pending = []
+        self._journal_lines = 0
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._closed = threading.Event()
+
+        self._load()
+        self._flusher = threading.Thread(target=self._flush_loop, name="state-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # --- 读取与恢复 ---
+
+    def _load(self):
+        start = time.perf_counter()
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict) and data.get('version') == SNAPSHOT_VERSION:
+                    for key, records in data.get('entries', {}).items():
+                        self._entries[key] = deque(records, maxlen=self.history_size)
+                else:
+                    self._load_legacy(data)
+            except (json.JSONDecodeError, IOError) as e:
+                log.error(f"Error loading state file: {e}. Starting with a fresh state.")
+                self._entries = {}
+
+        if self.journal_path.exists():
+            with open(self.journal_path, 'rb+') as f:
+                content = f.read()
+                # 崩溃时最后一行可能没有写完整：截断到最后一个完整行，避免之后追加的记录与它粘连
+                complete = content[:content.rfind(b"\n") + 1]
+                if len(complete) != len(content):
+                    log.warning("Discarding truncated state journal entry.")
+                    f.truncate(len(complete))
+            for line in complete.decode('utf-8').splitlines():
+                try:
+                    key, record = json.loads(line)
+                except (json.JSONDecodeError, ValueError):
+                    log.warning("Ignoring malformed state journal entry.")
+                    continue
+                self._append(key, record)
+                self._journal_lines += 1
+
+        if self._entries:
+            log.info(f"Loaded state for {len(self._entries)} signal keys in {time.perf_counter() - start:.3f}s.")
+        else:
+            log.info("No state file found. Starting with a fresh state.")
+
+    def _load_legacy(self, data: dict):
+        """
+        兼容旧版 bot_state.json ({"币种-指标-类型": {timestamp, signal_data}})，只保留去重所需的字段。
+        键补上周期，与 Signal.key 一致；格式化为字符串的数值转换为原始数值。
+        """
+        log.info("Migrating legacy state file.")
+        for key, info in data.items():
+            symbol, _, rest = key.partition('-')
+            primary_signal = info.get('signal_data', {}).get('primary_signal', {})
+            signal = Signal.from_record({**primary_signal, "symbol": symbol, "timeframe": LEGACY_TIMEFRAME})
+            self._append(f"{symbol}-{LEGACY_TIMEFRAME}-{rest}",
+                         {"timestamp": info.get('timestamp', 0), "primary_signal": signal.to_record()})
+
+    def _append(self, key: str, record: dict):
+        if key not in self._entries:
+            self._entries[key] = deque(maxlen=self.history_size)
+        self._entries[key].append(record)
+
+    def get(self, key: str):
+        """返回某个键最近一条记录，没有时返回 None"""
+        with self._lock:
+            records = self._entries.get(key)
+            return records[-1] if records else None
+
+    def history(self, key: str):
+        with self._lock:
+            return list(self._entries.get(key, []))
+
+    def put(self, key: str, record: dict):
+        with self._lock:
+            self._append(key, record)
+            self._pending.append(json.dumps([key, record], ensure_ascii=False))
+
+    def put_if(self, key: str, expected, record: dict) -> bool:
+        """只有该键最近一条记录仍等于 expected (没有记录时为 None) 时才写入，返回是否写入"""
+        with self._lock:
+            records = self._entries.get(key)
+            if (records[-1] if records else None) != expected:
+                return False
+            self._append(key, record)
+            self._pending.append(json.dumps([key, record], ensure_ascii=False))
+            return True
+
+    # --- 写入 ---
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval_seconds):
+            self.flush()
+
+    def flush(self):
+        """把待写记录追加到 journal，必要时压缩为新的快照"""
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if pending:
+                try:
+                    with open(self.journal_path, 'a', encoding='utf-8') as f:
+                        f.write("\n".join(pending) + "\n")
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._journal_lines += len(pending)
+                except IOError as e:
+                    log.error(f"Error writing state journal: {e}")
+                    with self._lock:
+                        self._pending = pending + self._pending
+                    return
+
+            if self._journal_lines > max(self.compact_min_entries, 2 * len(self._entries)):
+                self._compact()
+
+    def _compact(self):
+        with self._lock:
+            snapshot = {
+                "version": SNAPSHOT_VERSION,
+                "entries": {key: list(records) for key, records in self._entries.items()},
+            }
+            # flush 取走待写记录之后到这里之间 put 的记录已经包含在快照中，
+            # 与快照一起取走，下次 flush 不会再把它们写入 journal (重放时会重复)
+            compacted, self._pending = self._pending, []
+        try:
+            _write_atomic(self.path, json.dumps(snapshot, ensure_ascii=False))
+            # 快照已包含 journal 中的全部记录，可以安全地清空 journal
+            open(self.journal_path, 'w').close()
+            self._journal_lines = 0
+            log.debug("Compacted state journal into snapshot.")
+        except IOError as e:
+            log.error(f"Error compacting state file: {e}")
+            with self._lock:
+                self._pending = compacted + self._pending
+
+    def close(self):
+        if not self._closed.is_set():
+            self._closed.set()
+            self.flush()
+
+
+class MemoryStateStore:
+    """只保存在内存中的状态存储 (用于回测和测试)，接口与 JournalStateStore 相同"""
+
+    def __init__(self, history_size: int = STATE_HISTORY_SIZE):
+        self.history_size = history_size
+        self._entries = {}
+
+    def get(self, key: str):
+        records = self._entries.get(key)
+        return records[-1] if records else None
+
+    def history(self, key: str):
+        return list(self._entries.get(key, []))
+
+    def put(self, key: str, record: dict):
+        self._entries.setdefault(key, deque(maxlen=self.history_size)).append(record)
+
+    def put_if(self, key: str, expected, record: dict) -> bool:
+        if self.get(key) != expected:
+            return False
+        self.put(key, record)
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,210 @@
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import websockets
+from config_loader import cfg
+from logger import log
+from data_fetcher import TIMEFRAME, build_dataframe
+from frame_builder import bars_until
+
+# --- 使用新的配置 ---
+_stream_cfg = cfg.get('streaming', {})
+STREAM_BASE_URL = _stream_cfg.get('base_url', 'wss://fstream.binance.com')
+STREAM_INTRABAR_INTERVAL_SECONDS = _stream_cfg.get('intrabar_interval_seconds', 0)
+STREAM_CLOSE_SETTLE_SECONDS = _stream_cfg.get('close_settle_seconds', 1)
+STREAM_MAX_STREAMS_PER_CONNECTION = _stream_cfg.get('max_streams_per_connection', 200)
+STREAM_RECORD_PATH = _stream_cfg.get('record_path') or None
+
+RECONNECT_MAX_DELAY_SECONDS = 60
+# K 线收盘时需要通过 REST 补齐的接口 (K 线本身已由行情流写入缓存)
+CLOSE_ENDPOINTS = ("oi", "ls")
+
+
+def kline_event_to_row(k: dict):
+    """将 WebSocket kline 事件中的 "k" 字段转换为与 REST /fapi/v1/klines 相同格式的数据行"""
+    return [k['t'], k['o'], k['h'], k['l'], k['c'], k['v'], k['T'], k['q'], k['n'], k['V'], k['Q'], k.get('B', '0')]
+
+
+class StreamEngine:
+    """
+    基于 Binance 合约 WebSocket 组合 K 线流 (<symbol>@kline_<tf>) 的实时驱动引擎。
+
+    收到的 K 线直接写入 MarketDataCache。每根 K 线收盘时，会对收盘的币种
+    增量补齐 OI / 多空比 数据 (不再通过 REST 请求 K 线) 后调用 on_update(symbol, df)，df 截止到
+    收盘的那一根 (等待期间已开始的下一根K线不包括在内)；如果配置了
+    intrabar_interval_seconds，未收盘的 K 线更新也会按该频率触发检查。
+    每一批检查 (同时收盘的币种，或一次盘中检查) 结束后调用 on_batch(symbols)。
+    指标检查在独立的工作线程中执行，不会阻塞行情接收。
+    分片运行时传入 symbol_filter，只有返回 True 的币种会被补齐数据和检查。
+    """
+
+    def __init__(self, symbols, on_update, fetch_engine, base_url: str = STREAM_BASE_URL,
+                 intrabar_interval_seconds: float = STREAM_INTRABAR_INTERVAL_SECONDS,
+                 close_settle_seconds: float = STREAM_CLOSE_SETTLE_SECONDS,
+                 max_streams_per_connection: int = STREAM_MAX_STREAMS_PER_CONNECTION,
+                 record_path: str = STREAM_RECORD_PATH, symbol_filter=None, on_batch=None):
+        self.symbols = list(symbols)
+        self.symbol_filter = symbol_filter
+        self.on_update = on_update
+        self.on_batch = on_batch
+        self.fetch_engine = fetch_engine
+        self.cache = fetch_engine.cache
+        self.base_url = base_url.rstrip('/')
+        self.intrabar_interval_seconds = intrabar_interval_seconds
+        self.close_settle_seconds = close_settle_seconds
+        self.max_streams_per_connection = max_streams_per_connection
+        self.record_path = record_path
+
+        # {symbol: 等待检查的已收盘K线的开盘时间}
+        self._closed_bars = {}
+        self._closed_event = None
+        self._loop = None
+        self._consumers = {}
+        self._last_intrabar_check = {}
+        self._record_lock = threading.Lock()
+        # 指标检查可能涉及 AI 解读和告警发送，放在单独的线程中顺序执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-eval")
+
+    def stream_urls(self):
+        """按每个连接允许的最大流数量拆分组合流地址"""
+        streams = [f"{symbol.lower()}@kline_{TIMEFRAME}" for symbol in self.symbols]
+        size = max(1, self.max_streams_per_connection)
+        return [f"{self.base_url}/stream?streams={'/'.join(streams[i:i + size])}"
+                for i in range(0, len(streams), size)]
+
+    def run_forever(self):
+        asyncio.run(self.run())
+
+    async def run(self):
+        if self.cache is None:
+            raise ValueError("StreamEngine requires a FetchEngine with cache enabled.")
+        self._loop = asyncio.get_running_loop()
+        self._closed_event = asyncio.Event()
+        self._update_consumers()
+        try:
+            await self._dispatch_closed_bars()
+        finally:
+            for task in self._consumers.values():
+                task.cancel()
+            self._executor.shutdown(wait=False)
+
+    def shutdown(self):
+        """停止检查线程: 丢弃尚未开始的检查，等待正在进行的一批完成"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def set_symbols(self, symbols):
+        """运行中更新订阅的币种 (可从其他线程调用)，只有地址变化的连接会重连"""
+        symbols = list(symbols)
+        if symbols == self.symbols:
+            return
+        self.symbols = symbols
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._update_consumers)
+
+    def _update_consumers(self):
+        urls = self.stream_urls()
+        for url in [url for url in self._consumers if url not in urls]:
+            self._consumers.pop(url).cancel()
+        for url in urls:
+            if url not in self._consumers:
+                self._consumers[url] = asyncio.create_task(self._consume(url))
+
+    async def _consume(self, url: str):
+        """保持一个组合流连接，断线后按指数退避重连"""
+        delay = 1
+        while True:
+            try:
+                async with websockets.connect(url) as ws:
+                    log.info(f"已连接 WebSocket 行情流: {url[:120]}")
+                    delay = 1
+                    async for message in ws:
+                        self.handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"WebSocket 连接异常: {e}，{delay}s 后重连。")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY_SECONDS)
+
+    def handle_message(self, message):
+        """处理一条组合流消息 (JSON 字符串或已解析的 dict)"""
+        payload = json.loads(message) if isinstance(message, (str, bytes)) else message
+        if self.record_path:
+            self._record(payload)
+
+        data = payload.get('data', payload)
+        if data.get('e') != 'kline':
+            return
+
+        symbol = data['s']
+        if self.symbol_filter is not None and not self.symbol_filter(symbol):
+            return
+        k = data['k']
+        row = kline_event_to_row(k)
+        self.cache.update(symbol, 'klines', [row], {'start_time': row[0]})
+
+        if k.get('x'):
+            self._closed_bars[symbol] = k['t']
+            if self._closed_event is not None:
+                self._closed_event.set()
+        elif self.intrabar_interval_seconds > 0:
+            now = time.monotonic()
+            if now - self._last_intrabar_check.get(symbol, float('-inf')) >= self.intrabar_interval_seconds:
+                self._last_intrabar_check[symbol] = now
+                self._executor.submit(self._evaluate_intrabar, symbol)
+
+    async def _dispatch_closed_bars(self):
+        """
+        同一时刻收盘的币种会被合并为一批：稍等片刻让交易所生成 OI / 多空比
+        数据后，再并发补齐这一批币种的数据并依次检查。
+        """
+        while True:
+            await self._closed_event.wait()
+            await asyncio.sleep(self.close_settle_seconds)
+            self._closed_event.clear()
+            closed, self._closed_bars = self._closed_bars, {}
+            if closed:
+                self._executor.submit(self._evaluate_closed, closed)
+
+    def _evaluate_closed(self, closed: dict):
+        """closed: {symbol: 收盘K线的开盘时间}；等待期间下一根K线的更新已写入缓存，检查前截掉"""
+        symbols = sorted(closed)
+        try:
+            for symbol, df, elapsed in self.fetch_engine.fetch_all(symbols, endpoints=CLOSE_ENDPOINTS):
+                if df.empty:
+                    log.warning(f"未能获取 {symbol} 的数据，跳过。")
+                    continue
+                self.on_update(symbol, bars_until(df, closed[symbol]))
+        except Exception as e:
+            log.error(f"Error evaluating closed bars for {symbols}: {e}", exc_info=True)
+        finally:
+            self._finish_batch(symbols)
+
+    def _evaluate_intrabar(self, symbol: str):
+        try:
+            df = build_dataframe(symbol, self.cache.rows(symbol, 'klines'),
+                                 self.cache.rows(symbol, 'oi'), self.cache.rows(symbol, 'ls'))
+            if not df.empty:
+                self.on_update(symbol, df)
+        except Exception as e:
+            log.error(f"Error evaluating intrabar update for {symbol}: {e}", exc_info=True)
+        finally:
+            self._finish_batch([symbol])
+
+    def _finish_batch(self, symbols):
+        if self.on_batch is None:
+            return
+        try:
+            self.on_batch(symbols)
+        except Exception as e:
+            log.error(f"Error finishing evaluation batch for {symbols}: {e}", exc_info=True)
+
+    def _record(self, payload: dict):
+        """将收到的原始消息追加写入 JSONL 文件，便于之后用本地 WebSocket 服务回放"""
+        try:
+            with self._record_lock, open(self.record_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(payload) + "\n")
+        except IOError as e:
+            log.error(f"Error recording stream message: {e}")
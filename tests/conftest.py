@@ -0,0 +1,13 @@
+"""
+测试公共设置: 以仓库根目录为导入路径 (模块都在根目录下)，并关闭写入 bot.log 的日志文件，
+测试的日志只输出 WARNING 以上级别到终端。
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from logger import log  # noqa: E402
+
+log.remove()
+log.add(sys.stderr, level="WARNING")
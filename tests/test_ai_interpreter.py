@@ -0,0 +1,70 @@
+import threading
+from types import SimpleNamespace
+import pytest
+
+openai = pytest.importorskip("openai")
+
+import ai_interpreter
+from ai_interpreter import InterpretationService, FAILED_MESSAGE, TIMEOUT_MESSAGE
+from signals import Signal
+from benchmarks.openai_stub import OpenAIStubServer
+
+CONTEXT = SimpleNamespace(key_indicators={"price": 100.0}, technical_indicators={"rsi_14": 55.0}, recent_klines=[])
+
+
+def make_signal(z_score=3.5, symbol="BTCUSDT"):
+    return Signal(symbol, "5m", "Volume", "Volume Spike", value=12345.0, z_score=z_score, price=100.0,
+                  price_change=0.01, context=CONTEXT)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = OpenAIStubServer().start()
+    monkeypatch.setattr(ai_interpreter, "client", openai.OpenAI(api_key="test", base_url=stub.base_url, max_retries=0))
+    yield stub
+    stub.stop()
+
+
+def test_deadline_overrun_falls_back_to_timeout_message(stub):
+    stub.latency_seconds = 0.5
+    service = InterpretationService(deadline_seconds=0.1)
+    assert service.interpret("BTCUSDT", "5m", [make_signal()]) == TIMEOUT_MESSAGE
+    # 超时的请求完成后结果仍进入缓存，之后相同的信号直接使用
+    stub.latency_seconds = 0
+    service.deadline_seconds = 2
+    assert service.interpret("BTCUSDT", "5m", [make_signal()]) == "analysis #1"
+    assert len(stub.requests) == 1
+
+
+def test_repeat_fingerprint_reuses_in_flight_request(stub):
+    stub.latency_seconds = 0.3
+    service = InterpretationService(deadline_seconds=5)
+    results = []
+    # 数值在两位有效数字内相同，指纹一致
+    threads = [threading.Thread(target=lambda z=z: results.append(service.interpret("BTCUSDT", "5m", [make_signal(z)])))
+               for z in (3.51, 3.52, 3.53)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["analysis #1"] * 3
+    assert len(stub.requests) == 1
+
+    assert service.interpret("BTCUSDT", "5m", [make_signal(3.5)]) == "analysis #1"
+    assert service.interpret("BTCUSDT", "5m", [make_signal(4.2)]) == "analysis #2"
+    assert len(stub.requests) == 2
+
+
+def test_failed_request_is_evicted_from_cache(stub):
+    stub.fail_requests = 1
+    service = InterpretationService(deadline_seconds=5)
+    assert service.interpret("BTCUSDT", "5m", [make_signal()]) == FAILED_MESSAGE
+    assert service.interpret("BTCUSDT", "5m", [make_signal()]) == "analysis #2"
+    assert service.interpret("BTCUSDT", "5m", [make_signal()]) == "analysis #2"
+    assert len(stub.requests) == 2
+
+
+def test_expired_entries_are_requested_again(stub):
+    service = InterpretationService(deadline_seconds=5, cache_ttl_seconds=0)
+    assert service.interpret("BTCUSDT", "5m", [make_signal()]) == "analysis #1"
+    assert service.interpret("BTCUSDT", "5m", [make_signal()]) == "analysis #2"
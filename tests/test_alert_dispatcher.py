@@ -0,0 +1,75 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import alerter
+import alert_dispatcher
+from alert_dispatcher import AlertDispatcher, alert_outcomes
+from signals import Signal
+
+SIGNAL = Signal("BTCUSDT", "5m", "Volume", "Spike Alert", value=1e6, z_score=4.0)
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status, body = self.server.responses.pop(0) if self.server.responses else (200, {"code": 0, "msg": "success"})
+        self.server.received += 1
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _WebhookHandler)
+    server.responses = []
+    server.received = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+    monkeypatch.setattr(alerter, "LARK_WEBHOOK_URL", url)
+    monkeypatch.setattr(alert_dispatcher, "get_gemini_interpretation", lambda *args, **kwargs: "【分析】 stub")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def dispatch(server, responses, count):
+    server.responses = list(responses)
+    dispatcher = AlertDispatcher("5m", workers=1, webhook_url=alerter.LARK_WEBHOOK_URL)
+    dispatcher.rate_limiter.min_interval = 0
+    for _ in range(count):
+        dispatcher.submit(SIGNAL.symbol, [(SIGNAL, None)])
+    dispatcher.shutdown()
+    return dispatcher.stats()
+
+
+def test_http_error_counts_as_failed(webhook):
+    failed_before = alert_outcomes.value(outcome="failed")
+    delivered_before = alert_outcomes.value(outcome="delivered")
+    # 400 不会重试，一次请求即失败
+    stats = dispatch(webhook, [(400, {"code": 9499, "msg": "Bad Request"})], 2)
+    assert webhook.received == 2
+    assert (stats["delivered"], stats["failed"]) == (1, 1)
+    assert alert_outcomes.value(outcome="failed") - failed_before == 1
+    assert alert_outcomes.value(outcome="delivered") - delivered_before == 1
+
+
+def test_rejected_by_lark_counts_as_failed(webhook):
+    # Lark 对签名错误、频率限制等返回 HTTP 200，错误信息在 code 中
+    stats = dispatch(webhook, [(200, {"code": 11232, "msg": "frequency limited {psm}"}),
+                               (200, {"StatusCode": 19021, "StatusMessage": "sign match fail"})], 3)
+    assert (stats["delivered"], stats["failed"]) == (1, 2)
+
+
+def test_failed_alerts_excluded_from_latency(webhook):
+    stats = dispatch(webhook, [(400, {"code": 9499})], 1)
+    assert stats["delivered"] == 0
+    assert stats["avg_latency_seconds"] == 0.0 and stats["max_latency_seconds"] == 0.0
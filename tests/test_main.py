@@ -0,0 +1,82 @@
+import os
+import sys
+import subprocess
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# 与 multiprocessing 的 spawn 启动方式相同: 子进程把父进程的主模块作为 __mp_main__ 执行
+_SPAWN_IMPORT = """
+import sys, runpy, threading
+module = runpy.run_path(sys.argv[1], run_name='__mp_main__')
+print(threading.active_count(), module['state_manager'] is None, module['alert_dispatcher'] is None)
+"""
+
+
+def test_spawned_worker_import_creates_no_components(tmp_path):
+    env = {**os.environ, "PYTHONPATH": str(REPO_ROOT)}
+    completed = subprocess.run([sys.executable, "-c", _SPAWN_IMPORT, str(REPO_ROOT / "main.py")], cwd=tmp_path,
+                               env=env, capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr[-2000:]
+    assert completed.stdout.split() == ["1", "True", "True"]
+    # 没有打开状态文件，退出时也不会压缩或截断它
+    assert not list(tmp_path.glob("bot_state.json*"))
+
+
+class FakeFetchEngine:
+    def __init__(self, frames):
+        self.frames = frames
+        self.cache = None
+
+    def fetch_all(self, symbols, endpoints=None):
+        for symbol in symbols:
+            yield symbol, self.frames[symbol], 0.0
+
+
+def scheduled_cycle_frames(now):
+    """调度在 now (K线收盘后 2s) 运行时接口返回的数据: 最后一根是刚开始的K线"""
+    from benchmarks.fixtures import generate_payloads, INTERVAL_MS
+    from frame_builder import build_frame
+    forming_open = (int(now * 1000) // INTERVAL_MS) * INTERVAL_MS
+    klines, oi, ls = generate_payloads("BTCUSDT", 100, end_time_ms=forming_open)
+    return build_frame(klines, oi, ls), forming_open - INTERVAL_MS
+
+
+def test_scheduled_check_evaluates_last_closed_bar(monkeypatch):
+    import pandas as pd
+    import main
+    from scheduler import CycleBudget
+
+    now = 1735689600 + 2
+    df, closed_open = scheduled_cycle_frames(now)
+    evaluated = []
+    monkeypatch.setattr(main, "fetch_engine", FakeFetchEngine({"BTCUSDT": df}))
+    monkeypatch.setattr(main, "evaluate_symbol", lambda symbol, frame: evaluated.append(frame))
+
+    assert main._run_symbol_checks(["BTCUSDT"], CycleBudget(budgets={}, clock=lambda: now)) == []
+    assert len(evaluated) == 1
+    assert evaluated[0].index[-1] == pd.Timestamp(closed_open, unit='ms')
+    assert len(evaluated[0]) == len(df) - 1
+
+
+def test_batch_check_scans_last_closed_bar(monkeypatch):
+    import pandas as pd
+    import main
+    from scheduler import CycleBudget
+
+    now = 1735689600 + 2
+    df, closed_open = scheduled_cycle_frames(now)
+    scanned = {}
+    monkeypatch.setattr(main, "fetch_engine", FakeFetchEngine({"BTCUSDT": df}))
+    monkeypatch.setattr(main, "scan_universe", lambda frames, checkers, pool=None: scanned.update(frames) or [])
+
+    assert main.run_batch_check(["BTCUSDT"], CycleBudget(budgets={}, clock=lambda: now)) == []
+    assert scanned["BTCUSDT"].index[-1] == pd.Timestamp(closed_open, unit='ms')
+
+
+def test_closed_bars_keeps_fully_closed_frame():
+    from frame_builder import closed_bars
+    df, _ = scheduled_cycle_frames(1735689600 + 2)
+    # 下一根K线收盘之后，所有K线都已收盘
+    assert closed_bars(df, int(df['close_time'].iloc[-1]) + 1) is df
+    assert closed_bars(df, int(df['close_time'].iloc[-1])).index[-1] == df.index[-2]
@@ -0,0 +1,59 @@
+from benchmarks.fixtures import generate_payloads, INTERVAL_MS
+from market_archive import ColumnarArchive
+from market_cache import MarketDataCache
+
+SYMBOL = "BTCUSDT"
+NOW_MS = 10 ** 13
+
+
+def klines(bars=40):
+    return generate_payloads(SYMBOL, bars)[0]
+
+
+def test_append_skips_archived_rows_and_survives_reopen(tmp_path):
+    rows = klines()
+    archive = ColumnarArchive(tmp_path, "5m")
+    assert archive.append(SYMBOL, "klines", rows[:20]) == 20
+    assert archive.append(SYMBOL, "klines", rows[10:25]) == 5
+    assert archive.last_timestamp(SYMBOL, "klines") == rows[24][0]
+
+    reopened = ColumnarArchive(tmp_path, "5m")
+    assert reopened.last_timestamp(SYMBOL, "klines") == rows[24][0]
+    assert [row[0] for row in reopened.read_rows(SYMBOL, "klines", 100)] == [row[0] for row in rows[:25]]
+
+
+def test_seeding_stops_at_gap(tmp_path):
+    rows = klines()
+    archive = ColumnarArchive(tmp_path, "5m")
+    archive.append(SYMBOL, "klines", rows[:10])
+    # 停机后完整重新拉取的数据与已归档的数据不相连
+    archive.append(SYMBOL, "klines", rows[25:])
+    assert archive.last_timestamp(SYMBOL, "klines") == rows[-1][0]
+
+    seeded = ColumnarArchive(tmp_path, "5m").read_rows(SYMBOL, "klines", 100)
+    assert [row[0] for row in seeded] == [row[0] for row in rows[25:]]
+    # 只读取缺口之后的部分时结果不变
+    assert len(archive.read_rows(SYMBOL, "klines", 5)) == 5
+
+
+def test_cache_archives_only_closed_bars(tmp_path):
+    rows = klines()
+    calls = []
+    archive = ColumnarArchive(tmp_path, "5m")
+    original_append = archive.append
+    archive.append = lambda *args: calls.append(args) or original_append(*args)
+    cache = MarketDataCache(max_bars=100, fetch_limit=100, interval_ms=INTERVAL_MS, archive=archive)
+
+    now_ms = rows[-1][0] + INTERVAL_MS // 2
+    cache.update(SYMBOL, "klines", rows, {'limit': 100}, now_ms=now_ms)
+    assert archive.last_timestamp(SYMBOL, "klines") == rows[-2][0]
+    assert len(calls) == 1
+
+    # 未收盘K线的实时更新不触发归档
+    for tick in range(5):
+        cache.update(SYMBOL, "klines", [rows[-1]], {'start_time': rows[-1][0]}, now_ms=now_ms + tick)
+    assert len(calls) == 1
+
+    cache.update(SYMBOL, "klines", [rows[-1]], {'start_time': rows[-1][0]}, now_ms=rows[-1][6] + 1)
+    assert len(calls) == 2
+    assert archive.last_timestamp(SYMBOL, "klines") == rows[-1][0]
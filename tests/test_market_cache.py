@@ -0,0 +1,84 @@
+from benchmarks.fixtures import generate_payloads, INTERVAL_MS
+from market_cache import MarketDataCache, SeriesBuffer
+
+SYMBOL = "BTCUSDT"
+
+
+def klines(bars=60):
+    return generate_payloads(SYMBOL, bars)[0]
+
+
+def in_progress(row, volume="1.000"):
+    """同一根K线尚未收盘时的版本"""
+    return row[:5] + [volume] + row[6:]
+
+
+def test_merge_replaces_in_progress_candle():
+    rows = klines()
+    buffer = SeriesBuffer("klines", 100)
+    buffer.replace(rows[:29] + [in_progress(rows[29])])
+    # 下一次拉取从最后一条 (仍在形成中的K线) 开始
+    buffer.merge([rows[29], rows[30]])
+    assert [row[0] for row in buffer.rows] == [row[0] for row in rows[:31]]
+    assert buffer.rows[29] == rows[29]
+
+
+def test_merge_overlapping_rows_is_idempotent():
+    rows = klines()
+    buffer = SeriesBuffer("klines", 100)
+    buffer.replace(rows[:40])
+    buffer.merge(rows[35:40])
+    assert list(buffer.rows) == rows[:40]
+
+
+def test_cache_replaces_in_progress_candle_on_next_fetch():
+    rows = klines()
+    cache = MarketDataCache(max_bars=50, fetch_limit=50, interval_ms=INTERVAL_MS)
+    now_ms = rows[39][0] + INTERVAL_MS // 2
+    cache.update(SYMBOL, "klines", rows[:39] + [in_progress(rows[39])], {'limit': 50}, now_ms=now_ms)
+
+    now_ms = rows[40][0] + INTERVAL_MS // 2
+    params = cache.request_params(SYMBOL, "klines", now_ms)
+    assert params == {'start_time': rows[39][0], 'limit': 3}
+    cached = cache.update(SYMBOL, "klines", [rows[39], in_progress(rows[40])], params, now_ms=now_ms)
+    assert len(cached) == 41
+    assert cached[39] == rows[39]
+    assert [row[0] for row in cached] == [row[0] for row in rows[:41]]
+
+
+def test_buffer_keeps_only_max_bars():
+    rows = klines()
+    cache = MarketDataCache(max_bars=20, fetch_limit=50, interval_ms=INTERVAL_MS)
+    cache.update(SYMBOL, "klines", rows[:20], {'limit': 50})
+    cached = cache.update(SYMBOL, "klines", rows[19:25], {'start_time': rows[19][0]})
+    assert [row[0] for row in cached] == [row[0] for row in rows[5:25]]
+
+
+def test_gap_longer_than_buffer_falls_back_to_full_fetch():
+    rows = klines(200)
+    cache = MarketDataCache(max_bars=30, fetch_limit=100, interval_ms=INTERVAL_MS)
+    cache.update(SYMBOL, "klines", rows[:30], {'limit': 100})
+
+    # 落后的K线数少于缓冲区长度: 增量拉取
+    params = cache.request_params(SYMBOL, "klines", rows[50][0] + 1)
+    assert params == {'start_time': rows[29][0], 'limit': 23}
+
+    # 落后的K线数超过缓冲区长度 (但仍小于单次请求上限): 完整拉取
+    now_ms = rows[-1][0] + 1
+    params = cache.request_params(SYMBOL, "klines", now_ms)
+    assert params == {'limit': 100}
+    cached = cache.update(SYMBOL, "klines", rows[-100:], params, now_ms=now_ms)
+    assert [row[0] for row in cached] == [row[0] for row in rows[-30:]]
+
+
+def test_gap_longer_than_fetch_limit_replaces_stale_rows():
+    rows = klines(300)
+    cache = MarketDataCache(max_bars=100, fetch_limit=100, interval_ms=INTERVAL_MS)
+    cache.update(SYMBOL, "klines", rows[:100], {'limit': 100})
+
+    now_ms = rows[-1][0] + 1
+    params = cache.request_params(SYMBOL, "klines", now_ms)
+    assert params == {'limit': 100}
+    # 完整拉取的数据与旧数据不相连，旧数据全部丢弃 (不会在中间留下缺口)
+    cached = cache.update(SYMBOL, "klines", rows[-100:], params, now_ms=now_ms)
+    assert cached == rows[-100:]
@@ -0,0 +1,64 @@
+import random
+import pandas as pd
+import pytest
+from backtest import ReplayEngine, replay_prefilter
+from prefilter import TickerPrefilter
+from benchmarks.fixtures import generate_payloads, INTERVAL_MS
+
+SYMBOLS = [f"R{i:02d}USDT" for i in range(20)]
+BARS = 1200
+EVENTS_PER_SYMBOL = 6
+
+# 预筛选相对全量扫描至少要保留的告警比例 (包括 refresh_cycles 内延迟发现的)，以及最多允许深度获取的比例
+MIN_VOLUME_RECALL = 0.85
+MIN_RECALL_WITH_DELAYED = 0.8
+MAX_DEEP_FETCH_RATIO = 0.3
+
+
+def synthetic_history(symbol: str) -> pd.DataFrame:
+    """固定种子生成的行情，另外注入若干次放量并伴随价格跳动的异动"""
+    klines, oi, ls = generate_payloads(symbol, BARS)
+    df = pd.DataFrame({
+        "timestamp": [row[0] for row in klines],
+        "open": [float(row[1]) for row in klines],
+        "high": [float(row[2]) for row in klines],
+        "low": [float(row[3]) for row in klines],
+        "close": [float(row[4]) for row in klines],
+        "volume": [float(row[5]) for row in klines],
+        "taker_buy_base_asset_volume": [float(row[9]) for row in klines],
+        "oi": [float(row["sumOpenInterestValue"]) for row in oi],
+        "ls_ratio": [float(row["longShortRatio"]) for row in ls],
+    })
+    rnd = random.Random(symbol)
+    for pos in rnd.sample(range(400, BARS), EVENTS_PER_SYMBOL):
+        df.loc[pos, ["volume", "taker_buy_base_asset_volume"]] *= rnd.uniform(6, 12)
+        df.loc[pos:, ["open", "high", "low", "close"]] *= 1 + rnd.choice((-1, 1)) * rnd.uniform(0.006, 0.02)
+    return df
+
+
+@pytest.fixture(scope="module")
+def replay(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("history")
+    for symbol in SYMBOLS:
+        synthetic_history(symbol).to_csv(data_dir / f"{symbol}.csv", index=False)
+    engine = ReplayEngine()
+    engine.run(sorted(data_dir.iterdir()))
+    return engine
+
+
+def test_prefilter_keeps_recall_with_fewer_deep_fetches(replay):
+    assert replay.counts["sent"] > 0
+    report = replay_prefilter(replay.frames, replay.sent_events, replay.candidates, TickerPrefilter(),
+                              interval_ms=INTERVAL_MS)
+    assert report["deep_fetch_ratio"] <= MAX_DEEP_FETCH_RATIO
+    assert report["per_indicator"]["Volume"]["recall"] >= MIN_VOLUME_RECALL
+    assert report["recall_with_delayed"] >= MIN_RECALL_WITH_DELAYED
+    assert report["api_weight"]["reduction"] > 1
+
+
+def test_exhaustive_prefilter_selects_everything(replay):
+    # refresh_cycles=1 时每个周期都深度获取，与全量扫描完全一致
+    prefilter = TickerPrefilter(refresh_cycles=1)
+    report = replay_prefilter(replay.frames, replay.sent_events, replay.candidates, prefilter, interval_ms=INTERVAL_MS)
+    assert report["deep_fetch_ratio"] == 1.0
+    assert report["recall"] == 1.0
@@ -0,0 +1,152 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from rolling_stats import (RollingStats, SeriesZScoreTracker, ExponentialMovingAverage, RelativeStrengthIndex,
+                           rolling_z_score, latest_z_score)
+from indicators import TechnicalIndicatorState
+
+WINDOW = 48
+
+
+def random_series(n=600, seed=7, nan_fraction=0.05):
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(5, 1, n)
+    values[rng.random(n) < nan_fraction] = np.nan
+    return values
+
+
+def reference_z_scores(values, window=WINDOW, min_periods=None):
+    """pandas rolling 的参考实现: 样本不足时 NaN，标准差为 0 时按 1 处理"""
+    min_periods = window // 2 if min_periods is None else min_periods
+    series = pd.Series(values)
+    rolling = series.rolling(window, min_periods=min_periods)
+    std = rolling.std().replace(0, 1.0)
+    return ((series - rolling.mean()) / std).to_numpy()
+
+
+def reference_ema(closes, length):
+    """pandas_ta.ema 的参考实现: 前 length 个值的简单均值作为初始值，之后 ewm(span=length, adjust=False)"""
+    series = pd.Series(closes, dtype=float)
+    seeded = series.copy()
+    seeded.iloc[:length - 1] = np.nan
+    seeded.iloc[length - 1] = series.iloc[:length].mean()
+    return seeded.ewm(span=length, adjust=False).mean().to_numpy()
+
+
+def reference_rsi(closes, length):
+    """pandas_ta.rsi 的参考实现: 涨跌幅分别做 ewm(alpha=1/length, min_periods=length)"""
+    change = pd.Series(closes, dtype=float).diff()
+    gain = change.clip(lower=0).ewm(alpha=1 / length, min_periods=length).mean()
+    loss = (-change.clip(upper=0)).ewm(alpha=1 / length, min_periods=length).mean()
+    return (100 * gain / (gain + loss)).to_numpy()
+
+
+def test_rolling_stats_matches_pandas_rolling():
+    values = random_series()
+    expected_mean = pd.Series(values).rolling(WINDOW, min_periods=WINDOW // 2).mean().to_numpy()
+    expected_std = pd.Series(values).rolling(WINDOW, min_periods=WINDOW // 2).std().to_numpy()
+    stats = RollingStats(WINDOW)
+    for i, value in enumerate(values):
+        stats.push(value)
+        np.testing.assert_allclose(stats.mean, expected_mean[i], rtol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(stats.std, expected_std[i], rtol=1e-9, equal_nan=True)
+
+
+def test_rolling_stats_pop_restores_previous_window():
+    values = random_series(200)
+    stats = RollingStats(WINDOW)
+    for value in values:
+        stats.push(value)
+    for _ in range(3):
+        stats.pop()
+    expected = pd.Series(values[:-3]).rolling(WINDOW, min_periods=WINDOW // 2)
+    np.testing.assert_allclose(stats.mean, expected.mean().iloc[-1], rtol=1e-9)
+    np.testing.assert_allclose(stats.std, expected.std().iloc[-1], rtol=1e-9)
+
+
+def test_rolling_stats_constant_window_has_zero_std():
+    stats = RollingStats(10, 5)
+    for _ in range(30):
+        stats.push(1e6 + 0.1)
+    assert stats.std == 0.0
+    assert stats.zscore() == 0.0
+
+
+def test_vectorized_z_scores_match_pandas():
+    values = random_series()
+    expected = reference_z_scores(values)
+    np.testing.assert_allclose(rolling_z_score(values, WINDOW), expected, rtol=1e-7, atol=1e-9, equal_nan=True)
+    panel = np.vstack([values, random_series(seed=8)])
+    np.testing.assert_allclose(latest_z_score(panel, WINDOW),
+                               [expected[-1], reference_z_scores(panel[1])[-1]], rtol=1e-9)
+
+
+def test_tracker_follows_cached_window_with_revised_tail():
+    """模拟每轮从缓存取最近的数据窗口: 每轮前进 1-2 根K线，最后 3 根在下一轮之前被修正"""
+    rng = np.random.default_rng(3)
+    values = random_series(900)
+    timestamps = np.arange(len(values), dtype=np.int64) * 300_000
+    tracker = SeriesZScoreTracker(WINDOW)
+    end = 100
+    while end < len(values):
+        # 尾部最多 3 根K线的值与上一轮不同 (仍在形成中的K线、被插值修正的 OI / 多空比)
+        values[end - 3:end] *= rng.uniform(0.8, 1.2, 3)
+        window_values = values[max(0, end - 300):end]
+        window_timestamps = timestamps[max(0, end - 300):end]
+        z_score = tracker.update(window_timestamps, window_values)
+        np.testing.assert_allclose(z_score, reference_z_scores(values[:end])[-1], rtol=1e-7, equal_nan=True)
+        end += int(rng.integers(1, 3))
+
+
+def test_tracker_reseeds_on_gap():
+    values = random_series(400, nan_fraction=0)
+    timestamps = np.arange(len(values), dtype=np.int64) * 300_000
+    tracker = SeriesZScoreTracker(WINDOW)
+    tracker.update(timestamps[:200], values[:200])
+    # 缓存完整重新拉取后与上次的数据不相连
+    z_score = tracker.update(timestamps[300:], values[300:])
+    np.testing.assert_allclose(z_score, reference_z_scores(values[300:])[-1], rtol=1e-9)
+
+
+def test_tracker_nan_last_value():
+    values = random_series(200, nan_fraction=0)
+    values[-1] = np.nan
+    timestamps = np.arange(len(values), dtype=np.int64)
+    assert math.isnan(SeriesZScoreTracker(WINDOW).update(timestamps, values))
+
+
+@pytest.mark.parametrize("length", [12, 26])
+def test_ema_matches_reference(length):
+    closes = 100 * np.exp(np.cumsum(np.random.default_rng(1).normal(0, 0.003, 400)))
+    expected = reference_ema(closes, length)
+    ema = ExponentialMovingAverage(length)
+    for i, close in enumerate(closes):
+        np.testing.assert_allclose(ema.peek(close), expected[i], rtol=1e-12, equal_nan=True)
+        np.testing.assert_allclose(ema.update(close), expected[i], rtol=1e-12, equal_nan=True)
+
+
+def test_rsi_matches_reference():
+    closes = 100 * np.exp(np.cumsum(np.random.default_rng(2).normal(0, 0.003, 400)))
+    expected = reference_rsi(closes, 14)
+    rsi = RelativeStrengthIndex(14)
+    for i, close in enumerate(closes):
+        np.testing.assert_allclose(rsi.peek(close), expected[i], rtol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(rsi.update(close), expected[i], rtol=1e-9, equal_nan=True)
+
+
+def test_technical_state_resyncs_in_progress_bar():
+    """最后一根K线每轮都会变化，只有已收盘的K线进入增量状态"""
+    rng = np.random.default_rng(4)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, 700)))
+    index = pd.date_range("2025-01-01", periods=len(closes), freq="5min")
+    state = TechnicalIndicatorState()
+    for end in range(300, len(closes), 3):
+        revised = closes[:end].copy()
+        revised[-1] *= 1 + rng.normal(0, 0.002)
+        frame = pd.DataFrame({"close": revised[-300:]}, index=index[end - 300:end])
+        latest = state.latest(frame)
+        window = revised[-300:]
+        np.testing.assert_allclose(latest["rsi_14"], reference_rsi(window, 14)[-1], rtol=1e-9)
+        np.testing.assert_allclose(latest["ema_12"], reference_ema(window, 12)[-1], rtol=1e-9)
+        np.testing.assert_allclose(latest["ema_26"], reference_ema(window, 26)[-1], rtol=1e-9)
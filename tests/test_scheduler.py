@@ -0,0 +1,146 @@
+import pytest
+from scheduler import CycleBudget, CycleScheduler, aligned_interval_seconds, cycles_skipped
+
+INTERVAL = 300
+SETTLE = 2
+# 2025-01-01 00:00:00 UTC，是 5 分钟K线的收盘时间
+EPOCH = 1735689600
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FakeStopEvent:
+    """代替调度器的停止事件: 等待时直接拨快时钟"""
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.stopped = False
+
+    def is_set(self):
+        return self.stopped
+
+    def set(self):
+        self.stopped = True
+
+    def wait(self, seconds: float):
+        self.clock.advance(seconds)
+        return self.stopped
+
+
+def run_scheduler(clock, durations):
+    """依次运行耗时为 durations 的任务，返回每次运行的 (开始时间, deadline)"""
+    runs = []
+    durations = list(durations)
+
+    def job(deadline):
+        runs.append((clock(), deadline))
+        clock.advance(durations.pop(0))
+        if not durations:
+            scheduler.stop()
+
+    scheduler = CycleScheduler(job, INTERVAL, SETTLE, clock=clock)
+    scheduler._stopped = FakeStopEvent(clock)
+    scheduler.run_forever()
+    return runs
+
+
+def test_aligned_interval_rounds_up_to_bar_multiple():
+    assert aligned_interval_seconds(5, "5m") == 300
+    assert aligned_interval_seconds(7, "5m") == 600
+    assert aligned_interval_seconds(0.5, "5m") == 300
+    assert aligned_interval_seconds(60, "15m") == 3600
+
+
+@pytest.mark.parametrize("now, expected", [
+    (EPOCH - 100, EPOCH + SETTLE),
+    (EPOCH, EPOCH + SETTLE),
+    (EPOCH + SETTLE - 0.001, EPOCH + SETTLE),
+    # 正好在调度时间点上时取下一个
+    (EPOCH + SETTLE, EPOCH + INTERVAL + SETTLE),
+    (EPOCH + 150, EPOCH + INTERVAL + SETTLE),
+])
+def test_next_run_aligns_to_bar_close(now, expected):
+    scheduler = CycleScheduler(lambda deadline: None, INTERVAL, SETTLE)
+    assert scheduler.next_run(now) == expected
+
+
+def test_runs_are_aligned_and_deadline_is_next_run():
+    clock = FakeClock(EPOCH + 37.5)
+    runs = run_scheduler(clock, [10, 10, 10])
+    assert runs == [
+        (EPOCH + INTERVAL + SETTLE, EPOCH + 2 * INTERVAL + SETTLE),
+        (EPOCH + 2 * INTERVAL + SETTLE, EPOCH + 3 * INTERVAL + SETTLE),
+        (EPOCH + 3 * INTERVAL + SETTLE, EPOCH + 4 * INTERVAL + SETTLE),
+    ]
+
+
+def test_overrun_skips_missed_runs_instead_of_catching_up():
+    clock = FakeClock(EPOCH)
+    skipped_before = cycles_skipped.value()
+    # 第一轮运行了 2.5 个周期
+    runs = run_scheduler(clock, [2.5 * INTERVAL, 10])
+    assert [start for start, _ in runs] == [EPOCH + SETTLE, EPOCH + 3 * INTERVAL + SETTLE]
+    assert cycles_skipped.value() - skipped_before == 2
+
+
+def test_job_error_does_not_stop_schedule():
+    clock = FakeClock(EPOCH)
+    runs = []
+
+    def job(deadline):
+        runs.append(clock())
+        if len(runs) == 1:
+            raise RuntimeError("boom {not a format field}")
+        scheduler.stop()
+
+    scheduler = CycleScheduler(job, INTERVAL, SETTLE, clock=clock)
+    scheduler._stopped = FakeStopEvent(clock)
+    scheduler.run_forever()
+    assert runs == [EPOCH + SETTLE, EPOCH + INTERVAL + SETTLE]
+
+
+def test_budget_exhausted_at_deadline():
+    clock = FakeClock(EPOCH)
+    budget = CycleBudget(deadline=EPOCH + 60, budgets={}, clock=clock)
+    assert not budget.exhausted("fetch")
+    clock.advance(59.9)
+    assert not budget.exhausted("fetch")
+    clock.advance(0.1)
+    assert budget.exhausted("fetch")
+    assert budget.exhausted("evaluate")
+
+
+def test_stage_budget_overrun():
+    clock = FakeClock(EPOCH)
+    budget = CycleBudget(deadline=None, budgets={"fetch": 30}, clock=clock)
+    with budget.stage("fetch"):
+        clock.advance(20)
+    assert not budget.exhausted("fetch")
+    # 同一阶段的耗时累计
+    with budget.stage("fetch"):
+        clock.advance(15)
+    assert budget.spent["fetch"] == 35
+    assert budget.exhausted("fetch")
+    # 没有预算的阶段不受影响
+    with budget.stage("evaluate"):
+        clock.advance(1000)
+    assert not budget.exhausted("evaluate")
+
+
+def test_stage_time_counted_when_stage_raises():
+    clock = FakeClock(EPOCH)
+    budget = CycleBudget(budgets={"evaluate": 5}, clock=clock)
+    with pytest.raises(ValueError):
+        with budget.stage("evaluate"):
+            clock.advance(6)
+            raise ValueError
+    assert budget.exhausted("evaluate")
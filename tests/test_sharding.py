@@ -0,0 +1,94 @@
+import threading
+import pytest
+from sharding import CoordinationBackend, SqliteCoordinationBackend
+from state_store import JournalStateStore, MemoryStateStore
+from state_manager import SignalStateManager
+from signals import Signal
+
+NOW = 1735689600
+SIGNAL = Signal("BTCUSDT", "5m", "Volume", "Spike Alert", value=1e6, z_score=4.0)
+
+
+@pytest.fixture(params=["sqlite", "journal", "memory"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SqliteCoordinationBackend(tmp_path / "coordination.db", history_size=5)
+    elif request.param == "journal":
+        store = JournalStateStore(tmp_path / "bot_state.json", history_size=5, flush_interval_seconds=3600)
+    else:
+        store = MemoryStateStore(history_size=5)
+    yield store
+    store.close()
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        CoordinationBackend()
+
+    class Incomplete(CoordinationBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_put_if_only_writes_over_expected_record(store):
+    first = {"timestamp": 1, "primary_signal": {"z_score": 3.0}}
+    second = {"timestamp": 2, "primary_signal": {"z_score": 4.0}}
+    assert store.put_if("a", None, first)
+    assert not store.put_if("a", None, second)
+    assert store.get("a") == first
+    assert store.put_if("a", store.get("a"), second)
+    assert not store.put_if("a", first, {"timestamp": 3, "primary_signal": {}})
+    assert store.history("a") == [first, second]
+
+
+def test_stale_decision_is_rechecked(tmp_path):
+    """worker A 读取状态之后、写入之前，worker B 发送了同一条告警"""
+    path = tmp_path / "coordination.db"
+    backend_a = SqliteCoordinationBackend(path)
+    backend_b = SqliteCoordinationBackend(path)
+    manager_a = SignalStateManager(store=backend_a, clock=lambda: NOW)
+    manager_b = SignalStateManager(store=backend_b, clock=lambda: NOW)
+
+    results = {}
+    get = backend_a.get
+
+    def racing_get(key):
+        record = get(key)
+        if "b" not in results:
+            results["b"] = manager_b.should_send_alert(SIGNAL.symbol, SIGNAL)
+        return record
+
+    backend_a.get = racing_get
+    should_send_a, last_a = manager_a.should_send_alert(SIGNAL.symbol, SIGNAL)
+    assert results["b"] == (True, None)
+    assert not should_send_a
+    assert last_a == SIGNAL
+    assert len(backend_a.history(SIGNAL.key)) == 1
+    backend_a.close()
+    backend_b.close()
+
+
+def test_concurrent_workers_send_alert_once(tmp_path):
+    path = tmp_path / "coordination.db"
+    workers = 8
+    backends = [SqliteCoordinationBackend(path) for _ in range(workers)]
+    barrier = threading.Barrier(workers)
+    decisions = []
+
+    def run(backend):
+        manager = SignalStateManager(store=backend, clock=lambda: NOW)
+        barrier.wait()
+        decisions.append(manager.should_send_alert(SIGNAL.symbol, SIGNAL)[0])
+
+    threads = [threading.Thread(target=run, args=(backend,)) for backend in backends]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(decisions) == [False] * (workers - 1) + [True]
+    assert len(backends[0].history(SIGNAL.key)) == 1
+    for backend in backends:
+        backend.close()
@@ -0,0 +1,109 @@
+import json
+from signals import Signal
+from state_store import JournalStateStore, LEGACY_TIMEFRAME
+from state_manager import SignalStateManager
+
+NOW = 1735689600
+
+# 旧版 (baseline) 状态管理器写出的 bot_state.json: 键不含周期，数值为格式化后的字符串，
+# 并附带发送时的市场背景
+BASELINE_STATE = {
+    "BTCUSDT-Volume-Spike Alert": {
+        "timestamp": NOW - 600,
+        "signal_data": {
+            "primary_signal": {"indicator": "Volume", "signal_type": "Spike Alert", "value": "12,345,678",
+                               "z_score": "4.21", "price_change": "1.25%"},
+            "market_context": {"recent_klines": [{"open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0}],
+                               "key_indicators": {"oi": "$1,000", "price": "1.00"},
+                               "technical_indicators": {"rsi_14": "55.00"}},
+        },
+    },
+    "ETHUSDT-Open Interest-Sudden Change Alert": {
+        "timestamp": NOW - 300,
+        "signal_data": {
+            "primary_signal": {"indicator": "Open Interest", "signal_type": "Sudden Change Alert",
+                               "value": "$1,234,567,890", "change_1_period": "-3.50%", "price": "3456.78"},
+        },
+    },
+    "SOLUSDT-Long/Short Ratio-Sentiment Extreme Alert": {
+        "timestamp": NOW - 60,
+        "signal_data": {
+            "primary_signal": {"indicator": "Long/Short Ratio", "signal_type": "Sentiment Extreme Alert",
+                               "value": "2.345", "z_score": "-3.10",
+                               "sentiment": "Extremely Bearish (Contrarian Bullish)"},
+        },
+    },
+}
+
+EXPECTED = {
+    f"BTCUSDT-{LEGACY_TIMEFRAME}-Volume-Spike Alert": Signal(
+        "BTCUSDT", LEGACY_TIMEFRAME, "Volume", "Spike Alert", value=12345678.0, z_score=4.21, price_change=0.0125),
+    f"ETHUSDT-{LEGACY_TIMEFRAME}-Open Interest-Sudden Change Alert": Signal(
+        "ETHUSDT", LEGACY_TIMEFRAME, "Open Interest", "Sudden Change Alert", value=1234567890.0, change=-0.035,
+        price=3456.78),
+    f"SOLUSDT-{LEGACY_TIMEFRAME}-Long/Short Ratio-Sentiment Extreme Alert": Signal(
+        "SOLUSDT", LEGACY_TIMEFRAME, "Long/Short Ratio", "Sentiment Extreme Alert", value=2.345, z_score=-3.1,
+        sentiment="Extremely Bearish (Contrarian Bullish)"),
+}
+
+
+def open_store(path):
+    return JournalStateStore(path, history_size=5, flush_interval_seconds=3600, compact_min_entries=0)
+
+
+def write_baseline_state(tmp_path):
+    path = tmp_path / "bot_state.json"
+    path.write_text(json.dumps(BASELINE_STATE, indent=4))
+    return path
+
+
+def test_from_record_parses_baseline_primary_signal():
+    record = BASELINE_STATE["ETHUSDT-Open Interest-Sudden Change Alert"]["signal_data"]["primary_signal"]
+    signal = Signal.from_record({**record, "symbol": "ETHUSDT", "timeframe": "5m"})
+    assert signal.change == -0.035
+    assert signal.value == 1234567890.0
+    # 显示格式与旧版告警一致
+    assert dict(signal.display_fields()) == {"value": "$1,234,567,890", "change_1_period": "-3.50%",
+                                             "price": "3456.78"}
+
+
+def test_baseline_state_migrates_and_round_trips(tmp_path):
+    store = open_store(write_baseline_state(tmp_path))
+    for key, expected in EXPECTED.items():
+        record = store.get(key)
+        signal = Signal.from_record(record["primary_signal"])
+        assert signal == expected
+        assert signal.key == key
+        assert Signal.from_record(signal.to_record()) == signal
+        # 持久化的记录只包含原始数值
+        assert json.loads(json.dumps(record["primary_signal"])) == signal.to_record()
+    store.close()
+
+
+def test_migrated_state_survives_compaction(tmp_path):
+    path = write_baseline_state(tmp_path)
+    store = open_store(path)
+    store.put("XRPUSDT-5m-Volume-Spike Alert", {"timestamp": NOW, "primary_signal": {"z_score": 3.0}})
+    store.flush()
+    store._compact()
+    store.close()
+    # 压缩后旧版文件被新格式的快照替换
+    assert json.loads(path.read_text())["version"] == 2
+
+    reloaded = open_store(path)
+    for key, expected in EXPECTED.items():
+        assert Signal.from_record(reloaded.get(key)["primary_signal"]) == expected
+        assert reloaded.get(key)["timestamp"] == BASELINE_STATE[
+            key.replace(f"-{LEGACY_TIMEFRAME}-", "-", 1)]["timestamp"]
+    reloaded.close()
+
+
+def test_dedup_continues_from_baseline_state(tmp_path):
+    store = open_store(write_baseline_state(tmp_path))
+    manager = SignalStateManager(store=store, clock=lambda: NOW)
+    unchanged = Signal("BTCUSDT", LEGACY_TIMEFRAME, "Volume", "Spike Alert", value=12000000.0, z_score=4.3,
+                       price_change=0.01)
+    should_send, last = manager.should_send_alert("BTCUSDT", unchanged)
+    assert not should_send
+    assert last == EXPECTED[unchanged.key]
+    store.close()
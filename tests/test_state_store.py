@@ -0,0 +1,42 @@
+from state_store import JournalStateStore
+
+
+def open_store(path):
+    # 不依赖后台线程的定时 flush，测试中手动调用
+    return JournalStateStore(path, history_size=5, flush_interval_seconds=3600, compact_min_entries=0)
+
+
+def test_journal_replay_restores_history(tmp_path):
+    path = tmp_path / "bot_state.json"
+    store = open_store(path)
+    for i in range(3):
+        store.put("BTCUSDT-5m-Volume-Volume Spike", {"timestamp": i, "primary_signal": {"z_score": 3.0 + i}})
+    store.close()
+
+    reloaded = open_store(path)
+    assert [record["timestamp"] for record in reloaded.history("BTCUSDT-5m-Volume-Volume Spike")] == [0, 1, 2]
+    reloaded.close()
+
+
+def test_put_during_compaction_is_not_replayed_twice(tmp_path):
+    path = tmp_path / "bot_state.json"
+    store = open_store(path)
+    for i in range(3):
+        store.put("a", {"timestamp": i, "primary_signal": {}})
+
+    # 在 flush 取走待写记录之后、压缩生成快照之前写入一条记录
+    compact = store._compact
+    def racing_compact():
+        store.put("b", {"timestamp": 10, "primary_signal": {}})
+        compact()
+    store._compact = racing_compact
+    store.flush()
+    store._compact = compact
+
+    store.put("b", {"timestamp": 11, "primary_signal": {}})
+    store.close()
+
+    reloaded = open_store(path)
+    assert [record["timestamp"] for record in reloaded.history("b")] == [10, 11]
+    assert [record["timestamp"] for record in reloaded.history("a")] == [0, 1, 2]
+    reloaded.close()
@@ -0,0 +1,123 @@
+import asyncio
+import time
+import pytest
+
+pytest.importorskip("websockets")
+
+import data_fetcher
+from fetch_engine import FetchEngine
+from market_cache import MarketDataCache
+from stream_engine import StreamEngine
+from benchmarks.stub_server import BinanceStubServer
+from benchmarks.stream_replay import StreamReplayServer, kline_frames
+
+SYMBOLS = ["AAAUSDT", "BBBUSDT"]
+STREAM_BARS = 3
+
+
+@pytest.fixture
+def rest_stub(monkeypatch):
+    stub = BinanceStubServer(SYMBOLS, bars=400).start()
+    monkeypatch.setattr(data_fetcher, "BASE_URL", stub.base_url)
+    yield stub
+    stub.stop()
+
+
+def _replay(engine, server, until, timeout=10.0):
+    """运行 engine 直到 until() 为真且所有消息都已发送，再多等一会儿确认没有多余的检查"""
+    async def run():
+        task = asyncio.create_task(engine.run())
+        deadline = time.monotonic() + timeout
+        while (server.sent < len(server.frames) or not until()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(run())
+
+
+def test_checks_run_once_per_closed_bar(rest_stub):
+    # 最新的几根K线先不通过 REST 提供，之后由行情流送达
+    rest_stub.hidden_bars = STREAM_BARS
+    fetch_engine = FetchEngine(max_concurrency=4, cache=MarketDataCache())
+    assert all(not df.empty for _, df, _ in fetch_engine.fetch_all(SYMBOLS))
+    rest_stub.hidden_bars = 0
+
+    per_symbol = [kline_frames(symbol, rest_stub.payloads[symbol]["klines"][0][-STREAM_BARS:]) for symbol in SYMBOLS]
+    frames = [frame for ticks in zip(*per_symbol) for frame in ticks]
+    closes = [frame["data"]["k"]["t"] for frame in per_symbol[0] if frame["data"]["k"]["x"]]
+
+    klines_requests = rest_stub.requests.get("/fapi/v1/klines", 0)
+    oi_requests = rest_stub.requests.get("/futures/data/openInterestHist", 0)
+
+    updates, batches = [], []
+    server = StreamReplayServer(frames, interval_ms=50).start()
+    try:
+        engine = StreamEngine(SYMBOLS, lambda symbol, df: updates.append((symbol, df)), fetch_engine,
+                              base_url=server.base_url, intrabar_interval_seconds=0, close_settle_seconds=0,
+                              on_batch=batches.append)
+        _replay(engine, server, until=lambda: len(updates) >= len(SYMBOLS) * STREAM_BARS)
+    finally:
+        server.stop()
+
+    assert server.sent == len(frames)
+    # 每根收盘的K线触发一次检查，未收盘的更新不触发
+    for symbol in SYMBOLS:
+        seen = [df.index[-1].value // 1_000_000 for updated, df in updates if updated == symbol]
+        assert seen == closes
+    assert sorted(symbol for batch in batches for symbol in batch) == sorted(SYMBOLS * STREAM_BARS)
+    # 收盘时只补齐 OI 和多空比，K线来自行情流
+    assert rest_stub.requests.get("/fapi/v1/klines", 0) == klines_requests
+    assert rest_stub.requests["/futures/data/openInterestHist"] == oi_requests + len(SYMBOLS) * STREAM_BARS
+
+
+def test_intrabar_ticks_do_not_trigger_checks(rest_stub):
+    fetch_engine = FetchEngine(max_concurrency=4, cache=MarketDataCache())
+    list(fetch_engine.fetch_all(SYMBOLS))
+    last_bar = rest_stub.payloads[SYMBOLS[0]]["klines"][0][-1]
+    # 只有未收盘的更新 (去掉每根K线的收盘消息)
+    frames = [frame for frame in kline_frames(SYMBOLS[0], [last_bar], ticks_per_bar=5) if not frame["data"]["k"]["x"]]
+
+    updates, batches = [], []
+    server = StreamReplayServer(frames).start()
+    try:
+        engine = StreamEngine(SYMBOLS, lambda symbol, df: updates.append(symbol), fetch_engine,
+                              base_url=server.base_url, intrabar_interval_seconds=0, close_settle_seconds=0,
+                              on_batch=batches.append)
+        _replay(engine, server, until=lambda: True)
+    finally:
+        server.stop()
+
+    assert server.sent == len(frames)
+    assert updates == [] and batches == []
+
+
+def test_closed_bar_is_evaluated_when_next_bar_already_ticking(rest_stub):
+    # 收盘后等待 OI / 多空比 生成期间，下一根K线的更新已经到达并写入缓存
+    rest_stub.hidden_bars = 2
+    fetch_engine = FetchEngine(max_concurrency=4, cache=MarketDataCache())
+    list(fetch_engine.fetch_all(SYMBOLS))
+    rest_stub.hidden_bars = 0
+
+    frames = []
+    for symbol in SYMBOLS:
+        closed_bar, next_bar = rest_stub.payloads[symbol]["klines"][0][-2:]
+        next_ticks = [frame for frame in kline_frames(symbol, [next_bar]) if not frame["data"]["k"]["x"]]
+        frames += kline_frames(symbol, [closed_bar]) + next_ticks
+
+    updates = []
+    server = StreamReplayServer(frames, interval_ms=10).start()
+    try:
+        engine = StreamEngine(SYMBOLS, lambda symbol, df: updates.append((symbol, df)), fetch_engine,
+                              base_url=server.base_url, intrabar_interval_seconds=0, close_settle_seconds=0.5)
+        _replay(engine, server, until=lambda: len(updates) >= len(SYMBOLS))
+    finally:
+        server.stop()
+
+    assert sorted(symbol for symbol, _ in updates) == SYMBOLS
+    for symbol, df in updates:
+        closed_bar, next_bar = rest_stub.payloads[symbol]["klines"][0][-2:]
+        # 缓存中已有下一根K线，检查的仍是刚收盘的那一根
+        assert fetch_engine.cache.rows(symbol, "klines")[-1][0] == next_bar[0]
+        assert df.index[-1].value // 1_000_000 == closed_bar[0]
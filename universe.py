@@ -0,0 +1,159 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config_loader import cfg
+from logger import log
+from data_fetcher import fetch_exchange_info, fetch_24hr_tickers
+
+# --- 使用新的配置 ---
+_universe_cfg = cfg.get('universe', {})
+UNIVERSE_ENABLED = _universe_cfg.get('enabled', False)
+UNIVERSE_TOP_N = _universe_cfg.get('top_n', 50)
+UNIVERSE_QUOTE_ASSET = _universe_cfg.get('quote_asset', 'USDT')
+UNIVERSE_MIN_QUOTE_VOLUME = _universe_cfg.get('min_quote_volume', 0)
+UNIVERSE_REFRESH_MINUTES = _universe_cfg.get('refresh_minutes', 60)
+UNIVERSE_WARMUP_BATCH_SIZE = _universe_cfg.get('warmup_batch_size', 20)
+
+
+def rank_symbols(exchange_info: dict, tickers, top_n: int = UNIVERSE_TOP_N,
+                 quote_asset: str = UNIVERSE_QUOTE_ASSET, min_quote_volume: float = UNIVERSE_MIN_QUOTE_VOLUME):
+    """从 exchangeInfo 和 24hr 行情中选出正在交易的永续合约，按24小时成交额从高到低取前 top_n 个"""
+    tradable = {
+        item['symbol'] for item in exchange_info.get('symbols', [])
+        if item.get('contractType') == 'PERPETUAL' and item.get('status') == 'TRADING'
+        and item.get('quoteAsset') == quote_asset
+    }
+    volumes = []
+    for ticker in tickers:
+        symbol = ticker.get('symbol')
+        if symbol not in tradable:
+            continue
+        quote_volume = float(ticker.get('quoteVolume') or 0)
+        if quote_volume >= min_quote_volume:
+            volumes.append((quote_volume, symbol))
+    volumes.sort(reverse=True)
+    return [symbol for _, symbol in volumes[:top_n]]
+
+
+class UniverseManager:
+    """
+    维护监控的币种列表。
+
+    启用自动发现时，后台线程每 refresh_minutes 分钟批量请求一次 exchangeInfo 和
+    ticker/24hr (所有币种一次请求)，取成交额前 top_n 的永续合约，再加上固定的
+    pinned 币种 (配置中的 trading.symbols)。
+
+    sync(symbols) 把给定列表同步到获取/指标流程中：新加入的币种先在后台线程中
+    获取完整历史 (预热)，完成后才出现在返回的列表里，所以主检查周期不会被新币种
+    的全量请求拖慢；被移除的币种通过 on_remove 回调释放缓存和指标状态。
+    第一次 sync 的币种直接视为就绪 (启动时的第一轮检查本来就会获取完整历史)。
+    """
+
+    def __init__(self, fetch_engine, pinned=(), enabled: bool = UNIVERSE_ENABLED, top_n: int = UNIVERSE_TOP_N,
+                 refresh_minutes: float = UNIVERSE_REFRESH_MINUTES,
+                 warmup_batch_size: int = UNIVERSE_WARMUP_BATCH_SIZE, on_remove=None):
+        self.fetch_engine = fetch_engine
+        self.pinned = list(pinned)
+        self.enabled = enabled
+        self.top_n = top_n
+        self.refresh_minutes = refresh_minutes
+        self.warmup_batch_size = max(1, warmup_batch_size)
+        self.on_remove = on_remove
+
+        self._discovered = []
+        self._ready = None
+        self._warming = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._warmup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="universe-warmup")
+
+    def symbols(self):
+        """固定币种在前，之后是按成交额排序的自动发现币种"""
+        with self._lock:
+            discovered = list(self._discovered)
+        return self.pinned + [symbol for symbol in discovered if symbol not in self.pinned]
+
+    def refresh(self):
+        """重新获取成交额排名，失败时保留之前的列表"""
+        if not self.enabled:
+            return self.symbols()
+        try:
+            discovered = rank_symbols(fetch_exchange_info(), fetch_24hr_tickers(), self.top_n)
+        except Exception as e:
+            log.error(f"Error refreshing symbol universe: {e}")
+            return self.symbols()
+        with self._lock:
+            added = [symbol for symbol in discovered if symbol not in self._discovered]
+            removed = [symbol for symbol in self._discovered if symbol not in discovered]
+            self._discovered = discovered
+        if added or removed:
+            log.info(f"币种列表已更新: 共 {len(discovered)} 个自动发现币种，新增 {added}，移除 {removed}")
+        return self.symbols()
+
+    def start(self, should_discover=None, on_refresh=None):
+        """
+        启动后台刷新线程。should_discover() 返回 False 时跳过排名请求
+        (分片模式下只有 leader 需要)，每次刷新后调用 on_refresh()。
+        """
+        if self.enabled and (should_discover is None or should_discover()):
+            self.refresh()
+        self._thread = threading.Thread(target=self._run, args=(should_discover, on_refresh),
+                                        name="universe-refresh", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self, should_discover, on_refresh):
+        while not self._stopped.wait(self.refresh_minutes * 60):
+            try:
+                if should_discover is None or should_discover():
+                    self.refresh()
+                if on_refresh is not None:
+                    on_refresh()
+            except Exception as e:
+                log.error(f"Error in universe refresh: {e}", exc_info=True)
+
+    # --- 同步到获取/指标流程 ---
+
+    def sync(self, symbols):
+        """返回 symbols 中已就绪的币种 (保持原顺序)，为新币种安排预热，释放已移除的币种"""
+        symbols = list(symbols)
+        wanted = set(symbols)
+        with self._lock:
+            if self._ready is None:
+                self._ready = set(wanted)
+            removed = self._ready - wanted
+            self._ready &= wanted
+            pending = [symbol for symbol in symbols if symbol not in self._ready and symbol not in self._warming]
+            self._warming.update(pending)
+            ready = [symbol for symbol in symbols if symbol in self._ready]
+
+        if removed and self.on_remove is not None:
+            self.on_remove(removed)
+        for i in range(0, len(pending), self.warmup_batch_size):
+            self._warmup_executor.submit(self._warm_up, pending[i:i + self.warmup_batch_size])
+        return ready
+
+    def is_ready(self, symbol: str) -> bool:
+        with self._lock:
+            return self._ready is not None and symbol in self._ready
+
+    def _warm_up(self, symbols):
+        warmed = []
+        try:
+            for symbol, df, elapsed in self.fetch_engine.fetch_all(symbols):
+                if df.empty:
+                    log.warning(f"{symbol} 预热失败，将在下次同步时重试。")
+                    continue
+                warmed.append(symbol)
+        except Exception as e:
+            log.error(f"Error warming up {symbols}: {e}", exc_info=True)
+        with self._lock:
+            self._warming.difference_update(symbols)
+            if self._ready is not None:
+                self._ready.update(warmed)
+        if warmed:
+            log.info(f"已完成 {len(warmed)} 个新币种的历史数据预热: {', '.join(warmed)}")
+
+    def stop(self):
+        self._stopped.set()
+        self._warmup_executor.shutdown(wait=False)
@@ -0,0 +1,102 @@
+"""
+热启动快照。
+
+运行中每隔 interval_seconds (以及进程退出时) 把行情缓存和各指标的增量状态用 pickle
+写入一个二进制文件；下次启动时先恢复快照，第一轮检查只需要补齐快照之后缺少的K线，
+不必为每个币种重新拉取完整历史和重建 Z-Score / RSI / EMA 状态。
+
+快照记录了生成它的配置指纹 (周期、回看周期、缓存长度等)，这些配置变化后旧快照不会被使用；
+超过 max_age_seconds 的快照也会被忽略。快照只由本进程写入和读取，不要加载来源不明的文件。
+"""
+import os
+import json
+import time
+import pickle
+import hashlib
+from config_loader import cfg
+from logger import log
+from metrics import span
+
+# --- 使用新的配置 ---
+_warm_state_cfg = cfg.get('warm_state', {})
+WARM_STATE_ENABLED = _warm_state_cfg.get('enabled', False)
+WARM_STATE_PATH = _warm_state_cfg.get('path', 'warm_state.pkl')
+WARM_STATE_INTERVAL_SECONDS = _warm_state_cfg.get('interval_seconds', 900)
+WARM_STATE_MAX_AGE_SECONDS = _warm_state_cfg.get('max_age_seconds', 86400)
+
+SNAPSHOT_VERSION = 1
+
+
+def config_fingerprint(config: dict = cfg) -> str:
+    """影响增量状态含义的配置的指纹"""
+    relevant = {
+        "trading": config.get('trading'),
+        "cache": config.get('cache'),
+        "market_structure": config.get('market_structure'),
+        "prefilter": config.get('prefilter'),
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+class WarmStateStore:
+    """
+    快照文件的读写。save 先写临时文件再替换，写入过程中退出不会留下损坏的快照。
+    components 为 {组件名: 该组件 export_state() 的结果}。
+    """
+
+    def __init__(self, path: str = WARM_STATE_PATH, interval_seconds: float = WARM_STATE_INTERVAL_SECONDS,
+                 max_age_seconds: float = WARM_STATE_MAX_AGE_SECONDS, fingerprint: str = None, clock=time.time):
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self.max_age_seconds = max_age_seconds
+        self.fingerprint = fingerprint or config_fingerprint()
+        self.clock = clock
+        self._last_saved = clock()
+
+    def save(self, components: dict):
+        start = time.perf_counter()
+        payload = {
+            "version": SNAPSHOT_VERSION,
+            "fingerprint": self.fingerprint,
+            "created_at": self.clock(),
+            "components": components,
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with span("warm_state_save"), open(tmp_path, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            # 其他线程仍在修改状态时 (例如退出过程中) 序列化可能失败，下次再保存
+            log.error(f"Error saving warm state snapshot to {self.path}: {e}")
+            return
+        self._last_saved = self.clock()
+        log.info(f"热启动快照已保存: {self.path} ({os.path.getsize(self.path) / 1024 / 1024:.1f} MiB, "
+                 f"{time.perf_counter() - start:.2f}s)")
+
+    def save_if_due(self, collect):
+        """距离上次保存超过 interval_seconds 时调用 collect() 获取组件状态并保存"""
+        if self.interval_seconds and self.clock() - self._last_saved >= self.interval_seconds:
+            self.save(collect())
+
+    def load(self):
+        """读取快照，返回 components；文件不存在、已损坏、过期或配置不一致时返回 None"""
+        if not os.path.exists(self.path):
+            return None
+        start = time.perf_counter()
+        try:
+            with span("warm_state_load"), open(self.path, 'rb') as f:
+                payload = pickle.load(f)
+        except Exception as e:
+            log.warning(f"热启动快照 {self.path} 无法读取，将完整拉取历史数据: {e}")
+            return None
+
+        if payload.get('version') != SNAPSHOT_VERSION or payload.get('fingerprint') != self.fingerprint:
+            log.info("热启动快照的版本或配置与当前不一致，忽略。")
+            return None
+        age = self.clock() - payload.get('created_at', 0)
+        if self.max_age_seconds and age > self.max_age_seconds:
+            log.info(f"热启动快照已过期 ({age / 3600:.1f} 小时)，忽略。")
+            return None
+        log.info(f"已读取热启动快照 ({age / 60:.1f} 分钟前保存，{time.perf_counter() - start:.2f}s)")
+        return payload['components']